@@ -1,16 +1,66 @@
+from etcd import EtcdException
 from etcd import EtcdKeyNotFound
 import gevent
+import gevent.pool
+import json
+import math
+import socket
 from tendrl.commons.event import Event
 from tendrl.commons.message import ExceptionMessage
+from tendrl.performance_monitoring import constants as \
+    pm_consts
+from tendrl.performance_monitoring.exceptions \
+    import TendrlPerformanceMonitoringException
+from tendrl.performance_monitoring import instrumentation
 from tendrl.performance_monitoring.objects.cluster_summary \
     import ClusterSummary
 from tendrl.performance_monitoring.utils import read as etcd_read
 
+CYCLE_SECONDS = instrumentation.histogram(
+    'tendrl_pm_cluster_summary_cycle_seconds',
+    'Duration of a ClusterSummarise cycle over all clusters'
+)
+CYCLE_CLUSTERS = instrumentation.gauge(
+    'tendrl_pm_cluster_summary_clusters',
+    'Clusters summarised in the last ClusterSummarise cycle'
+)
 
-class ClusterSummarise(gevent.greenlet.Greenlet):
-    def __init__(self):
-        super(ClusterSummarise, self).__init__()
-        self._complete = gevent.event.Event()
+# Node summary fields rolled up per cluster, and their resource names
+NODE_UTILIZATIONS = (
+    ('cpu_usage', 'cpu'),
+    ('memory_usage', 'memory'),
+    ('storage_usage', 'storage'),
+)
+# Nearest rank percentiles of the nodes' percent used pushed per cluster
+PERCENTILES = (
+    (pm_consts.PERCENTILE_50, 50),
+    (pm_consts.PERCENTILE_90, 90),
+    (pm_consts.PERCENTILE_99, 99),
+    (pm_consts.MAX, 100),
+)
+
+
+def percentiles(values):
+    # All the PERCENTILES of values, from a single sort
+    values = sorted(values)
+    return dict(
+        (
+            name,
+            values[max(int(math.ceil(rank * len(values) / 100.0)) - 1, 0)]
+        )
+        for name, rank in PERCENTILES
+    )
+
+
+class ClusterSummarise(object):
+    def __init__(self, throttle=0.1, concurrency=1):
+        # Pause between clusters, letting other greenlets run
+        self.throttle = throttle
+        # Clusters summarised at once, worth raising when the plugins'
+        # summaries are computed by a process pool
+        self.pool = gevent.pool.Pool(concurrency)
+        # Clusters whose embedded node summaries were deleted
+        self.dropped = set()
 
     def parse_host_count(self, cluster_nodes):
         status_wise_count = {
@@ -40,17 +90,102 @@ class ClusterSummarise(gevent.greenlet.Greenlet):
         return status_wise_count
 
     def cluster_nodes_summary(self, node_ids):
+        # The summaries of the nodes published by the node summariser,
+        # read from etcd only for those it has not published
+        published = NS.central_store_thread.get_snapshot_summary(
+            'nodes'
+        ) or {}
         node_summaries = []
-        try:
-            for node_id in node_ids:
-                node_summary = etcd_read(
-                    '/monitoring/summary/nodes/%s' % node_id
+        for node_id in node_ids:
+            if node_id in published:
+                node_summaries.append(published[node_id])
+                continue
+            try:
+                node_summaries.append(
+                    etcd_read('/monitoring/summary/nodes/%s' % node_id)
                 )
-                node_summaries.append(node_summary)
-        except EtcdKeyNotFound:
-            return node_summaries
+            except EtcdKeyNotFound:
+                # Not summarised yet
+                continue
         return node_summaries
 
+    def drop_node_summaries(self, cluster_id):
+        # Cluster summaries used to embed their nodes' summaries, deleted
+        # once so that reads of the cluster summary from etcd do not get
+        # them stale
+        if cluster_id in self.dropped:
+            return
+        try:
+            NS.etcd_orm.client.delete(
+                '/monitoring/summary/clusters/%s/node_summaries' % cluster_id
+            )
+        except EtcdKeyNotFound:
+            pass
+        except EtcdException as ex:
+            Event(
+                ExceptionMessage(
+                    priority="debug",
+                    publisher=NS.publisher_id,
+                    payload={
+                        "message": 'Failed to delete the node summaries '
+                                   'of cluster %s.' % cluster_id,
+                        "exception": ex
+                        }
+                )
+            )
+            return
+        self.dropped.add(cluster_id)
+
+    def node_utilization_rollups(self, node_summaries):
+        # resource -> percentile -> percent used, over the cluster's nodes
+        # with a summary of the resource
+        rollups = {}
+        for field, resource in NODE_UTILIZATIONS:
+            values = []
+            for node_summary in node_summaries:
+                usage = node_summary.get(field)
+                try:
+                    if isinstance(usage, basestring):
+                        usage = json.loads(usage)
+                    value = float(usage['percent_used'])
+                except (ValueError, TypeError, KeyError):
+                    # Not summarised yet
+                    continue
+                if not math.isnan(value):
+                    values.append(value)
+            if values:
+                rollups[resource] = percentiles(values)
+        return rollups
+
+    def push_node_utilization_rollups(self, cluster_id, rollups):
+        # A few series per cluster for the dashboards, rather than one
+        # per node
+        time_series_db = NS.time_series_db_manager
+        try:
+            for resource, values in rollups.iteritems():
+                for percentile, value in values.iteritems():
+                    time_series_db.get_plugin().push_metrics(
+                        time_series_db.get_timeseriesnamefromresource(
+                            cluster_id=cluster_id,
+                            node_resource=resource,
+                            utilization_type=percentile,
+                            resource_name=pm_consts.CLUSTER_NODE_UTILIZATION
+                        ),
+                        value
+                    )
+        except (socket.error, TendrlPerformanceMonitoringException) as ex:
+            Event(
+                ExceptionMessage(
+                    priority="error",
+                    publisher=NS.publisher_id,
+                    payload={
+                        "message": 'Failed to push the node utilization '
+                                   'rollups of cluster %s.' % cluster_id,
+                        "exception": ex
+                        }
+                )
+            )
+
     def parse_cluster(self, cluster_id, cluster_det):
         utilization = cluster_det.get('Utilization', {})
         used = 0
@@ -66,6 +201,7 @@ class ClusterSummarise(gevent.greenlet.Greenlet):
             total = utilization.get('total')
         if utilization.get('pcnt_used'):
             percent_used = utilization.get('pcnt_used')
+        node_ids = sorted(cluster_det.get('nodes') or {})
         return ClusterSummary(
             utilization={
                 'total': int(total),
@@ -74,8 +210,9 @@ class ClusterSummarise(gevent.greenlet.Greenlet):
             },
             hosts_count=self.parse_host_count(cluster_det.get('nodes')),
             sds_type=cluster_det.get('TendrlContext', {}).get('sds_name'),
-            node_summaries=self.cluster_nodes_summary(
-                cluster_det.get('nodes', {}).keys()
+            node_ids=node_ids,
+            node_utilization=self.node_utilization_rollups(
+                self.cluster_nodes_summary(node_ids)
             ),
             sds_det=NS.sds_monitoring_manager.get_cluster_summary(
                 cluster_id,
@@ -84,35 +221,61 @@ class ClusterSummarise(gevent.greenlet.Greenlet):
             cluster_id=cluster_id,
         )
 
-    def _run(self):
-        while not self._complete.is_set():
-            cluster_summaries = []
-            try:
-                clusters = etcd_read('/clusters')
-                for clusterid, cluster_det in clusters.iteritems():
-                    gevent.sleep(0.1)
-                    cluster_summary = self.parse_cluster(clusterid,
-                                                         cluster_det)
-                    cluster_summaries.append(cluster_summary.copy())
-                    cluster_summary.save(update=False)
-                NS.sds_monitoring_manager.compute_system_summary(
-                    cluster_summaries,
-                    clusters
-                )
-            except EtcdKeyNotFound:
-                pass
-            except Exception as ex:
-                Event(
-                    ExceptionMessage(
-                        priority="error",
-                        publisher=NS.publisher_id,
-                        payload={
-                            "message": 'Error caught computing summary.',
-                            "exception": ex
-                            }
-                    )
+    def summarise_cluster(self, cluster):
+        clusterid, cluster_det = cluster
+        gevent.sleep(self.throttle)
+        try:
+            return clusterid, self.parse_cluster(clusterid, cluster_det)
+        except TendrlPerformanceMonitoringException as ex:
+            # The process pool failed or timed out on this cluster
+            Event(
+                ExceptionMessage(
+                    priority="error",
+                    publisher=NS.publisher_id,
+                    payload={
+                        "message": 'Failed to summarise cluster %s.' %
+                                   clusterid,
+                        "exception": ex
+                        }
                 )
-            gevent.sleep(60)
+            )
+            return clusterid, None
 
-    def stop(self):
-        self._complete.set()
+    @CYCLE_SECONDS.time()
+    def summarise_clusters(self):
+        cluster_summaries = []
+        clusters = etcd_read('/clusters')
+        NS.sds_monitoring_manager.refresh_service_index()
+        for clusterid, cluster_summary in self.pool.imap(
+            self.summarise_cluster,
+            clusters.items()
+        ):
+            if cluster_summary is None:
+                continue
+            self.push_node_utilization_rollups(
+                clusterid,
+                cluster_summary.node_utilization
+            )
+            cluster_summaries.append(cluster_summary.copy())
+            NS.central_store_thread.snapshot_summary(
+                'clusters',
+                clusterid,
+                cluster_summaries[-1].to_json()
+            )
+            cluster_summary.save(update=False)
+            self.drop_node_summaries(clusterid)
+        NS.sds_monitoring_manager.compute_system_summary(
+            cluster_summaries,
+            clusters
+        )
+        NS.central_store_thread.retain_summaries('clusters', clusters.keys())
+        NS.central_store_thread.flush_summaries()
+        NS.central_store_thread.publish_summaries()
+        CYCLE_CLUSTERS.set(len(cluster_summaries))
+
+    def run_cycle(self):
+        try:
+            self.summarise_clusters()
+        except EtcdKeyNotFound:
+            # No clusters yet
+            pass
@@ -0,0 +1,215 @@
+import calendar
+import datetime
+from etcd import EtcdConnectionFailed
+from etcd import EtcdEventIndexCleared
+from etcd import EtcdException
+from etcd import EtcdKeyNotFound
+from etcd import EtcdWatchTimedOut
+import gevent
+import gevent.event
+import gevent.greenlet
+import math
+import time
+
+from tendrl.commons.event import Event
+from tendrl.commons.message import ExceptionMessage
+from tendrl.performance_monitoring import constants as \
+    pm_consts
+
+LAST_SEEN_ROOT = '/monitoring/nodes'
+
+
+def parse_last_seen_at(last_seen_at):
+    # last_seen_at is an isoformat utc timestamp with a +00:00 suffix
+    seen_at = datetime.datetime.strptime(
+        last_seen_at[:-6],
+        "%Y-%m-%dT%H:%M:%S.%f"
+    )
+    return calendar.timegm(seen_at.utctimetuple()) + \
+        seen_at.microsecond / 1000000.0
+
+
+class TimerWheel(object):
+    """Hashed timer wheel of per node deadlines
+
+    Scheduling and rescheduling a node is O(1). Each tick only looks at the
+    nodes hashed into the current slot, and a node whose deadline lies more
+    than one revolution ahead simply stays in its slot for another turn.
+    """
+
+    def __init__(self, slots, tick):
+        self.tick = tick
+        self.slots = [set() for _ in range(slots)]
+        self.cursor = 0
+        self.deadlines = {}
+        self.node_slots = {}
+
+    def schedule(self, node_id, deadline, now):
+        self.cancel(node_id)
+        ticks = max(int(math.ceil((deadline - now) / self.tick)), 0)
+        slot = (self.cursor + ticks) % len(self.slots)
+        self.slots[slot].add(node_id)
+        self.node_slots[node_id] = slot
+        self.deadlines[node_id] = deadline
+
+    def cancel(self, node_id):
+        slot = self.node_slots.pop(node_id, None)
+        if slot is not None:
+            self.slots[slot].discard(node_id)
+        self.deadlines.pop(node_id, None)
+
+    def advance(self, now):
+        expired = []
+        slot = self.slots[self.cursor]
+        for node_id in list(slot):
+            if self.deadlines[node_id] <= now:
+                slot.discard(node_id)
+                del self.node_slots[node_id]
+                del self.deadlines[node_id]
+                expired.append(node_id)
+        self.cursor = (self.cursor + 1) % len(self.slots)
+        return expired
+
+
+class NodeLivenessTracker(gevent.greenlet.Greenlet):
+    """Keeps node status current from last_seen_at watch events
+
+    Every last_seen_at update pushes the node's deadline forward on a
+    timer wheel, and expiry of the deadline marks the node down. Status
+    transitions are written to the node summary right away, and
+    get_status answers from memory. With publish off, transitions are
+    only kept in memory; API worker processes track liveness that way,
+    leaving the writes to the main process.
+    """
+
+    def __init__(self, timeout=5, tick=1, watch_timeout=60, publish=True):
+        super(NodeLivenessTracker, self).__init__()
+        self.timeout = timeout
+        self.publish = publish
+        self.watch_timeout = watch_timeout
+        self.wheel = TimerWheel(int(math.ceil(timeout / tick)) + 1, tick)
+        self.node_status = {}
+        self._ticker = None
+        self._complete = gevent.event.Event()
+
+    def get_status(self, node_id):
+        return self.node_status.get(node_id, pm_consts.STATUS_NOT_MONITORED)
+
+    def seen(self, node_id, last_seen_at):
+        now = time.time()
+        deadline = parse_last_seen_at(last_seen_at) + self.timeout
+        if deadline <= now:
+            self.wheel.cancel(node_id)
+            self.set_status(node_id, pm_consts.STATUS_DOWN)
+            return
+        self.wheel.schedule(node_id, deadline, now)
+        self.set_status(node_id, pm_consts.STATUS_UP)
+
+    def set_status(self, node_id, status):
+        if self.node_status.get(node_id) == status:
+            return
+        self.node_status[node_id] = status
+        if not self.publish:
+            return
+        try:
+            NS.etcd_orm.client.write(
+                '/monitoring/summary/nodes/%s/status' % node_id,
+                status
+            )
+        except (EtcdConnectionFailed, EtcdException) as ex:
+            Event(
+                ExceptionMessage(
+                    priority="debug",
+                    publisher=NS.publisher_id,
+                    payload={"message": 'Failed to update status of node %s '
+                                        'in its summary.' % node_id,
+                             "exception": ex
+                             }
+                )
+            )
+
+    def forget(self, node_id):
+        # The node is gone from etcd, stop tracking it without writing its
+        # status again.
+        self.wheel.cancel(node_id)
+        self.node_status.pop(node_id, None)
+
+    def on_last_seen_at(self, key, value, action=None):
+        # /monitoring/nodes/<node_id>/last_seen_at
+        key_contents = key.split('/')
+        if action in ('delete', 'expire'):
+            # Either the last_seen_at key or the node's whole directory
+            if len(key_contents) == 4 or (
+                len(key_contents) == 5 and key_contents[4] == 'last_seen_at'
+            ):
+                self.forget(key_contents[3])
+            return
+        if len(key_contents) != 5 or key_contents[4] != 'last_seen_at':
+            return
+        if not value:
+            return
+        try:
+            self.seen(key_contents[3], value)
+        except ValueError:
+            pass
+
+    def sync(self):
+        try:
+            nodes = NS.etcd_orm.client.read(LAST_SEEN_ROOT, recursive=True)
+        except EtcdKeyNotFound:
+            return None
+        for leaf in nodes.leaves:
+            self.on_last_seen_at(leaf.key, leaf.value)
+        return nodes.etcd_index + 1
+
+    def _tick(self):
+        while not self._complete.is_set():
+            for node_id in self.wheel.advance(time.time()):
+                self.set_status(node_id, pm_consts.STATUS_DOWN)
+            gevent.sleep(self.wheel.tick)
+
+    def _run(self):
+        self._ticker = gevent.spawn(self._tick)
+        index = None
+        while not self._complete.is_set():
+            try:
+                if index is None:
+                    index = self.sync()
+                    if index is None:
+                        gevent.sleep(self.timeout)
+                        continue
+                result = NS.etcd_orm.client.watch(
+                    LAST_SEEN_ROOT,
+                    index=index,
+                    recursive=True,
+                    timeout=self.watch_timeout
+                )
+                index = result.modifiedIndex + 1
+                self.on_last_seen_at(
+                    result.key,
+                    result.value,
+                    result.action
+                )
+            except EtcdWatchTimedOut:
+                continue
+            except EtcdEventIndexCleared:
+                # Missed too many events, resync from a fresh read
+                index = None
+            except (EtcdConnectionFailed, EtcdException) as ex:
+                Event(
+                    ExceptionMessage(
+                        priority="error",
+                        publisher=NS.publisher_id,
+                        payload={"message": 'Exception caught while watching '
+                                            'node last_seen_at updates.',
+                                 "exception": ex
+                                 }
+                    )
+                )
+                index = None
+                gevent.sleep(self.timeout)
+
+    def stop(self):
+        self._complete.set()
+        if self._ticker is not None:
+            self._ticker.kill()
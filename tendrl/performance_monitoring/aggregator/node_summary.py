@@ -2,38 +2,119 @@ import datetime
 from etcd import EtcdConnectionFailed
 from etcd import EtcdKeyNotFound
 import gevent
+import json
 import math
-from pytz import utc
 import re
+import time
 
 from tendrl.commons.event import Event
 from tendrl.commons.message import ExceptionMessage
-from tendrl.commons.utils.time_utils import now as tendrl_now
 
-from tendrl.performance_monitoring import constants as \
-    pm_consts
 from tendrl.performance_monitoring.exceptions \
     import TendrlPerformanceMonitoringException
+from tendrl.performance_monitoring import instrumentation
 from tendrl.performance_monitoring.objects.node_summary \
     import NodeSummary
 
+SWEEP_SECONDS = instrumentation.histogram(
+    'tendrl_pm_node_summary_sweep_seconds',
+    'Duration of a NodeSummarise sweep over all nodes'
+)
+SWEEP_NODES = instrumentation.gauge(
+    'tendrl_pm_node_summary_nodes',
+    'Nodes summarised in the last NodeSummarise sweep'
+)
+LATEST_STAT_LOOKUPS = instrumentation.counter(
+    'tendrl_pm_node_summary_lookups_total',
+    'Latest stats NodeSummarise fetched from the time series db, read '
+    'from the carbon relay, skipped as no newer datapoint could exist '
+    'yet, or aggregated by the time series db for all the nodes at once',
+    ['result']
+)
+# Resources whose series the time series db sums per node for the storage
+# utilization
+STORAGE_RESOURCES = ('df-*.df_complex-used', 'df-*.df_complex-free')
+# Seconds of datapoints the storage utilization is aggregated over, the
+# latest of which is current
+STORAGE_RANGE = 3600
 
-class NodeSummarise(gevent.greenlet.Greenlet):
-    def __init__(self):
-        super(NodeSummarise, self).__init__()
-        self._complete = gevent.event.Event()
+
+def newest_timestamp(stats):
+    # Timestamp of the newest datapoint in a render response, None when
+    # it has none
+    try:
+        series = json.loads(stats)
+    except ValueError:
+        return None
+    timestamps = [
+        timestamp
+        for target in series
+        for value, timestamp in target.get('datapoints', [])
+        if value is not None
+    ]
+    return max(timestamps) if timestamps else None
+
+
+class NodeSummarise(object):
+    def __init__(self, throttle=0.1, interval=0, relay=None):
+        # Pause between nodes, letting other greenlets run
+        self.throttle = throttle
+        # Seconds between the datapoints collectd reports, 0 to fetch the
+        # latest stats every sweep
+        self.interval = interval
+        # (node, resource) -> time a newer datapoint may exist from, and
+        # the stats fetched
+        self.latest = {}
+        # CarbonRelay keeping the latest values collectd sent, if enabled
+        self.relay = relay
+        # (node, resource) -> sum of the latest values of the resource's
+        # series, aggregated for all the nodes at the start of a sweep
+        self.storage = {}
+        self.storage_due = 0
+
+    def get_relayed_stats(self, node, resource):
+        if self.relay is None:
+            return None
+        values = self.relay.latest(
+            NS.central_store_thread.get_node_name_from_id(node),
+            resource
+        )
+        if values is not None:
+            LATEST_STAT_LOOKUPS.inc(result='relayed')
+        return values
+
+    def fetch_latest(self, node, resource):
+        # collectd reports every interval seconds, so the time series db
+        # has nothing newer than the last datapoint fetched until then.
+        # Sweeps in between reuse the stats; the summary's status and
+        # alert count are still refreshed every sweep.
+        cached = self.latest.get((node, resource))
+        if cached is not None and time.time() < cached[0]:
+            LATEST_STAT_LOOKUPS.inc(result='skipped')
+            return cached[1]
+        node_name = NS.central_store_thread.get_node_name_from_id(node)
+        stats = NS.time_series_db_manager.get_plugin().get_metric_stats(
+            node_name,
+            resource,
+            'latest'
+        )
+        LATEST_STAT_LOOKUPS.inc(result='fetched')
+        newest = None
+        if self.interval and stats:
+            newest = newest_timestamp(stats)
+        if newest is None:
+            self.latest.pop((node, resource), None)
+        else:
+            self.latest[(node, resource)] = (newest + self.interval, stats)
+        return stats
 
     ''' Get latest stats of resource as in param resource'''
     def get_latest_stat(self, node, resource):
+        relayed = self.get_relayed_stats(node, resource)
+        if relayed is not None and not math.isnan(relayed[0]):
+            return relayed[0]
         try:
-            node_name = NS.central_store_thread.get_node_name_from_id(
-                node
-            )
-            stats = NS.time_series_db_manager.get_plugin().get_metric_stats(
-                node_name,
-                resource,
-                'latest'
-            )
+            stats = self.fetch_latest(node, resource)
             if stats == "[]" or not stats:
                 raise TendrlPerformanceMonitoringException(
                     'Stats not yet available in time series db'
@@ -72,13 +153,11 @@ class NodeSummarise(gevent.greenlet.Greenlet):
 
     ''' Get latest stats of resources matching wild cards in param resource'''
     def get_latest_stats(self, node, resource):
+        relayed = self.get_relayed_stats(node, resource)
+        if relayed is not None:
+            return relayed
         try:
-            node_name = NS.central_store_thread.get_node_name_from_id(node)
-            stats = NS.time_series_db_manager.get_plugin().get_metric_stats(
-                node_name,
-                resource,
-                'latest'
-            )
+            stats = self.fetch_latest(node, resource)
             if stats == "[]" or not stats:
                 raise TendrlPerformanceMonitoringException(
                     'Stats not yet available in time series db'
@@ -125,18 +204,71 @@ class NodeSummarise(gevent.greenlet.Greenlet):
             # Exception already handled
             return None
 
+    def prefetch_storage(self, nodes):
+        # The used and free bytes of every node, summed per node by the
+        # time series db in a render request per resource for all the
+        # nodes rather than two per node. Nodes the carbon relay has the
+        # latest values of are left to it.
+        if time.time() < self.storage_due:
+            return
+        self.storage = {}
+        node_names = NS.central_store_thread.get_node_names(nodes)
+        node_ids = dict(
+            (node_name, node_id)
+            for node_id, node_name in node_names.iteritems()
+            if self.relay is None or any(
+                self.relay.latest(node_name, resource) is None
+                for resource in STORAGE_RESOURCES
+            )
+        )
+        if not node_ids:
+            return
+        try:
+            for resource in STORAGE_RESOURCES:
+                stats = NS.time_series_db_manager.get_plugin().\
+                    get_aggregated_metric_stats(
+                        node_ids.keys(),
+                        resource,
+                        fill=True,
+                        from_time=int(time.time()) - STORAGE_RANGE
+                    )
+                LATEST_STAT_LOOKUPS.inc(result='fetched')
+                for series in stats:
+                    if series['target'] in node_ids and \
+                            series['datapoints']:
+                        self.storage[
+                            (node_ids[series['target']], resource)
+                        ] = series['datapoints'][-1][0]
+        except TendrlPerformanceMonitoringException as ex:
+            # The nodes missing are fetched one at a time
+            Event(
+                ExceptionMessage(
+                    priority="debug",
+                    publisher=NS.publisher_id,
+                    payload={"message": 'Failed to aggregate the storage '
+                                        'utilization of the nodes.',
+                             "exception": ex
+                             }
+                )
+            )
+            return
+        self.storage_due = time.time() + self.interval
+
+    def get_storage_stat(self, node, resource):
+        # Sum of the latest values of the resource's series
+        if (node, resource) in self.storage:
+            LATEST_STAT_LOOKUPS.inc(result='aggregated')
+            return self.storage[(node, resource)]
+        total = 0.0
+        for stat in self.get_latest_stats(node, resource):
+            if not math.isnan(float(stat)):
+                total = total + float(stat)
+        return total
+
     def get_net_storage_utilization(self, node):
         try:
-            used_stats = self.get_latest_stats(node, 'df-*.df_complex-used')
-            used = 0.0
-            for stat in used_stats:
-                if not math.isnan(float(stat)):
-                    used = used + float(stat)
-            free_stats = self.get_latest_stats(node, 'df-*.df_complex-free')
-            free = 0.0
-            for stat in free_stats:
-                if not math.isnan(float(stat)):
-                    free = free + float(stat)
+            used = self.get_storage_stat(node, 'df-*.df_complex-used')
+            free = self.get_storage_stat(node, 'df-*.df_complex-free')
             if free + used == 0:
                 return None
             percent_used = float(used * 100) / float(free + used)
@@ -158,7 +290,7 @@ class NodeSummarise(gevent.greenlet.Greenlet):
             return 0
 
     def calculate_host_summary(self, node):
-        gevent.sleep(0.1)
+        gevent.sleep(self.throttle)
         cpu_usage = self.get_net_host_cpu_utilization(node)
         memory_usage = self.get_net_host_memory_utilization(node)
         storage_usage = self.get_net_storage_utilization(node)
@@ -224,6 +356,11 @@ class NodeSummarise(gevent.greenlet.Greenlet):
                 alert_count=alert_count
             )
             summary.save(update=False)
+            NS.central_store_thread.snapshot_summary(
+                'nodes',
+                node,
+                summary.to_json()
+            )
         except Exception as ex:
             Event(
                 ExceptionMessage(
@@ -237,30 +374,19 @@ class NodeSummarise(gevent.greenlet.Greenlet):
             )
 
     def get_node_status(self, node_id):
-        last_seen_at = NS.central_store_thread.get_node_last_seen_at(node_id)
-        if last_seen_at:
-            interval = (
-                tendrl_now() -
-                datetime.datetime.strptime(
-                    last_seen_at[:-6],
-                    "%Y-%m-%dT%H:%M:%S.%f"
-                ).replace(tzinfo=utc)
-            ).total_seconds()
-            if interval < 5:
-                return pm_consts.STATUS_UP
-            else:
-                return pm_consts.STATUS_DOWN
-        return pm_consts.STATUS_NOT_MONITORED
+        return NS.node_liveness.get_status(node_id)
 
+    @SWEEP_SECONDS.time()
     def calculate_host_summaries(self):
         nodes = NS.central_store_thread.get_node_ids()
+        self.prefetch_storage(nodes)
         for node in nodes:
             self.calculate_host_summary(node)
-
-    def _run(self):
-        while not self._complete.is_set():
-            self.calculate_host_summaries()
-            gevent.sleep(60)
-
-    def stop(self):
-        self._complete.set()
+        # Forget the nodes gone since
+        for key in self.latest.keys():
+            if key[0] not in nodes:
+                del self.latest[key]
+        NS.central_store_thread.retain_summaries('nodes', nodes)
+        NS.central_store_thread.flush_summaries()
+        NS.central_store_thread.publish_summaries(node_ids=nodes)
+        SWEEP_NODES.set(len(nodes))
@@ -0,0 +1,21 @@
+"""Fleet scale benchmarks of the summary computations and the API
+
+Run with::
+
+    python -m tendrl.performance_monitoring.benchmarks.summary \\
+        --nodes 10,100,1000,5000 --clusters 1,10,50
+
+Every benchmark runs against a synthetic etcd tree held in memory (see
+fixtures.build_fleet) and a synthetic time series db, so results only
+depend on this code base. One JSON document per benchmark and fleet size
+is written to stdout.
+
+End to end load tests run the API against loopback stand-ins of etcd
+(etcd_http), carbon and graphite-web (graphite_standin)::
+
+    python -m tendrl.performance_monitoring.benchmarks.load \\
+        --nodes 500 --requests 5000 --etcd-latency lognormal:0.002,0.5 \\
+        --graphite-error-rate 0.01
+
+and report per route p50/p99 latencies with the upstream call counts.
+"""
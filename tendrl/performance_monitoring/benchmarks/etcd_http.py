@@ -0,0 +1,177 @@
+from etcd import EtcdDirNotEmpty
+from etcd import EtcdEventIndexCleared
+from etcd import EtcdKeyNotFound
+from etcd import EtcdNotFile
+from etcd import EtcdWatchTimedOut
+from gevent.pywsgi import WSGIServer
+import json
+import urlparse
+
+from tendrl.performance_monitoring.benchmarks.etcd_store import MemoryEtcd
+from tendrl.performance_monitoring.benchmarks.faults import FaultInjector
+
+KEYS_PREFIX = '/v2/keys'
+
+# exception -> (http status, etcd v2 error code)
+ERROR_CODES = {
+    EtcdKeyNotFound: (404, 100),
+    EtcdNotFile: (403, 102),
+    EtcdDirNotEmpty: (403, 108),
+    EtcdEventIndexCleared: (400, 401),
+}
+
+
+def is_true(params, name):
+    return params.get(name, ['false'])[0] == 'true'
+
+
+class EtcdHTTPServer(object):
+    """Loopback server speaking the subset of the etcd v2 keys API in use
+
+    Serves GET (plain, recursive and wait=true watches), PUT and DELETE
+    on /v2/keys over a MemoryEtcd, so that python-etcd clients can be
+    pointed at it unchanged. Every request goes through the fault
+    injector first; injected failures are answered like a raft internal
+    error.
+    """
+
+    def __init__(self, store=None, host='127.0.0.1', port=0, latency=None,
+                 error_rate=0.0, watch_timeout=300, seed=None):
+        self.store = store or MemoryEtcd()
+        self.faults = FaultInjector(latency, error_rate, seed)
+        self.watch_timeout = watch_timeout
+        self.requests = {}
+        self.server = WSGIServer((host, port), self.handle, log=None)
+
+    @property
+    def address(self):
+        return self.server.address
+
+    def start(self):
+        self.server.start()
+
+    def stop(self):
+        self.server.stop()
+
+    def respond(self, start_response, status, body, index=None):
+        headers = [
+            ('Content-Type', 'application/json'),
+            ('X-Etcd-Cluster-Id', 'bench'),
+            ('X-Etcd-Index', str(index or self.store.index)),
+            ('X-Raft-Index', str(self.store.index)),
+            ('X-Raft-Term', '1'),
+        ]
+        start_response('%d %s' % (status, 'OK' if status < 300 else 'ERROR'),
+                       headers)
+        return [json.dumps(body)]
+
+    def error(self, start_response, ex, key):
+        status, code = ERROR_CODES.get(type(ex), (500, 300))
+        return self.respond(
+            start_response,
+            status,
+            {
+                'errorCode': code,
+                'message': str(ex).split(' : ')[0],
+                'cause': key,
+                'index': self.store.index,
+            }
+        )
+
+    def params(self, environ):
+        params = urlparse.parse_qs(
+            environ.get('QUERY_STRING', ''),
+            keep_blank_values=True
+        )
+        if environ['REQUEST_METHOD'] in ('PUT', 'POST'):
+            length = int(environ.get('CONTENT_LENGTH') or 0)
+            params.update(urlparse.parse_qs(
+                environ['wsgi.input'].read(length),
+                keep_blank_values=True
+            ))
+        return params
+
+    def handle(self, environ, start_response):
+        path = environ['PATH_INFO']
+        method = environ['REQUEST_METHOD']
+        if path == '/version':
+            return self.respond(
+                start_response,
+                200,
+                {'etcdserver': '2.3.7', 'etcdcluster': '2.3.0'}
+            )
+        if not path.startswith(KEYS_PREFIX):
+            return self.respond(start_response, 404, {'message': 'Not found'})
+        key = path[len(KEYS_PREFIX):] or '/'
+        params = self.params(environ)
+        action = method
+        if method == 'GET' and is_true(params, 'wait'):
+            action = 'WATCH'
+        self.requests[action] = self.requests.get(action, 0) + 1
+        if self.faults.inject():
+            return self.error(start_response, Exception('Raft Internal Error'),
+                              key)
+        try:
+            if action == 'WATCH':
+                wait_index = params.get('waitIndex', [None])[0]
+                try:
+                    response = self.store.wait(
+                        key,
+                        int(wait_index) if wait_index else None,
+                        recursive=is_true(params, 'recursive'),
+                        timeout=self.watch_timeout
+                    )
+                except EtcdWatchTimedOut:
+                    # etcd ends a long poll by closing an empty response
+                    start_response('200 OK', [
+                        ('Content-Type', 'application/json')
+                    ])
+                    return ['']
+                return self.respond(
+                    start_response,
+                    200,
+                    response,
+                    response['node']['modifiedIndex']
+                )
+            if method == 'GET':
+                return self.respond(
+                    start_response,
+                    200,
+                    self.store.get(key, is_true(params, 'recursive'))
+                )
+            if method == 'PUT':
+                ttl = params.get('ttl', [''])[0]
+                response = self.store.set(
+                    key,
+                    params.get('value', [None])[0],
+                    dir=is_true(params, 'dir'),
+                    ttl=int(ttl) if ttl else None
+                )
+                return self.respond(
+                    start_response,
+                    201 if response['action'] == 'set' else 200,
+                    response
+                )
+            if method == 'DELETE':
+                return self.respond(
+                    start_response,
+                    200,
+                    self.store.delete(key, is_true(params, 'recursive'))
+                )
+        except (EtcdKeyNotFound, EtcdNotFile, EtcdDirNotEmpty,
+                EtcdEventIndexCleared) as ex:
+            return self.error(start_response, ex, key)
+        return self.respond(
+            start_response,
+            405,
+            {'message': 'Method %s not allowed' % method}
+        )
+
+    def stats(self):
+        stats = self.faults.stats()
+        stats['requests'] = dict(self.requests)
+        return stats
+
+    def reset(self):
+        self.faults.reset()
+        self.requests = {}
@@ -0,0 +1,207 @@
+from etcd import EtcdDirNotEmpty
+from etcd import EtcdEventIndexCleared
+from etcd import EtcdKeyNotFound
+from etcd import EtcdNotFile
+from etcd import EtcdResult
+from etcd import EtcdWatchTimedOut
+import gevent.event
+import time
+
+
+class _Node(object):
+    __slots__ = ('key', 'value', 'dir', 'children', 'created', 'modified',
+                 'expires')
+
+    def __init__(self, key, value=None, dir=False, index=0):
+        self.key = key
+        self.value = value
+        self.dir = dir
+        self.children = {} if dir else None
+        self.created = index
+        self.modified = index
+        self.expires = None
+
+    def to_json(self, recursive=False, depth=0):
+        node = {
+            'key': self.key,
+            'createdIndex': self.created,
+            'modifiedIndex': self.modified,
+        }
+        if self.dir:
+            node['dir'] = True
+            # Like etcd, a plain read lists a directory's immediate
+            # children, but not their contents.
+            if depth == 0 or recursive:
+                node['nodes'] = [
+                    child.to_json(recursive, depth + 1)
+                    for _, child in sorted(self.children.items())
+                ]
+        else:
+            node['value'] = self.value
+        return node
+
+
+class MemoryEtcd(object):
+    """In-memory keyspace with the etcd v2 read/write/watch semantics
+
+    Results are plain dicts shaped like the etcd v2 JSON API responses, so
+    they can be served over HTTP as is or wrapped in python-etcd's
+    EtcdResult.
+    """
+
+    def __init__(self, history=1000):
+        self.index = 1
+        self.root = _Node('/', dir=True)
+        self.history = []
+        self.history_size = history
+        # Index of the newest event dropped from the history
+        self.cleared_index = 0
+        self._changed = gevent.event.Event()
+
+    def _parts(self, key):
+        return [part for part in key.split('/') if part]
+
+    def _find(self, key):
+        node = self.root
+        for part in self._parts(key):
+            if not node.dir or part not in node.children:
+                raise EtcdKeyNotFound('Key not found : %s' % key)
+            node = node.children[part]
+            if node.expires is not None and node.expires <= time.time():
+                raise EtcdKeyNotFound('Key not found : %s' % key)
+        return node
+
+    def _record(self, action, node, prev_node=None):
+        event = {'action': action, 'node': node.to_json()}
+        if prev_node is not None:
+            event['prevNode'] = prev_node
+        self.history.append((self.index, node.key, event))
+        if len(self.history) > self.history_size:
+            self.cleared_index = self.history[-self.history_size - 1][0]
+            del self.history[:-self.history_size]
+        # Wake every watcher waiting on the current event, and give later
+        # watchers a fresh one.
+        changed, self._changed = self._changed, gevent.event.Event()
+        changed.set()
+        return event
+
+    def get(self, key, recursive=False):
+        return {
+            'action': 'get',
+            'node': self._find(key).to_json(recursive=recursive)
+        }
+
+    def set(self, key, value=None, dir=False, ttl=None):
+        self.index += 1
+        node = self.root
+        path = ''
+        parts = self._parts(key)
+        for part in parts[:-1]:
+            path = '%s/%s' % (path, part)
+            if part not in node.children:
+                node.children[part] = _Node(path, dir=True, index=self.index)
+            node = node.children[part]
+            if not node.dir:
+                raise EtcdNotFile('Not a directory : %s' % path)
+        path = '%s/%s' % (path, parts[-1])
+        previous = node.children.get(parts[-1])
+        prev_node = previous.to_json() if previous is not None else None
+        if previous is not None and previous.dir and not dir:
+            raise EtcdNotFile('Not a file : %s' % path)
+        child = _Node(path, value=value, dir=dir, index=self.index)
+        if previous is not None:
+            child.created = previous.created
+            if dir:
+                child.children = previous.children
+        if ttl:
+            child.expires = time.time() + int(ttl)
+        node.children[parts[-1]] = child
+        return self._record(
+            'update' if previous is not None else 'set',
+            child,
+            prev_node
+        )
+
+    def delete(self, key, recursive=False):
+        node = self._find(key)
+        parent = self._find(key.rsplit('/', 1)[0] or '/')
+        if node.dir and node.children and not recursive:
+            raise EtcdDirNotEmpty('Directory not empty : %s' % key)
+        self.index += 1
+        del parent.children[node.key.rsplit('/', 1)[1]]
+        node.modified = self.index
+        return self._record('delete', node, node.to_json())
+
+    def wait(self, key, index=None, recursive=False, timeout=None):
+        prefix = '/%s' % '/'.join(self._parts(key))
+        deadline = time.time() + timeout if timeout else None
+        index = index or self.index + 1
+        if index <= self.cleared_index:
+            raise EtcdEventIndexCleared(
+                'The event in requested index is outdated and cleared',
+                payload={'index': self.index}
+            )
+        while True:
+            changed = self._changed
+            for event_index, event_key, event in self.history:
+                if event_index < index:
+                    continue
+                if event_key == prefix or (
+                    recursive and event_key.startswith(prefix + '/')
+                ):
+                    return event
+            remaining = None
+            if deadline is not None:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise EtcdWatchTimedOut('Watch timed out', payload={})
+            changed.wait(remaining)
+
+    def load(self, tree, prefix=''):
+        # Bulk populate from nested dicts, leaves as string values
+        for name, value in tree.iteritems():
+            key = '%s/%s' % (prefix, name)
+            if isinstance(value, dict):
+                self.load(value, key)
+            else:
+                self.set(key, str(value))
+
+
+class MemoryEtcdClient(object):
+    """The subset of python-etcd's Client used here, over MemoryEtcd"""
+
+    def __init__(self, store=None):
+        self.store = store or MemoryEtcd()
+        self.reads = 0
+        self.writes = 0
+
+    def _result(self, response):
+        result = EtcdResult(**response)
+        result.etcd_index = self.store.index
+        return result
+
+    def read(self, key, recursive=False, wait=False, waitIndex=None,
+             timeout=None, **kwdargs):
+        self.reads += 1
+        if wait:
+            return self._result(
+                self.store.wait(key, waitIndex, recursive, timeout)
+            )
+        return self._result(self.store.get(key, recursive=recursive))
+
+    def watch(self, key, index=None, timeout=None, recursive=None):
+        return self.read(
+            key,
+            wait=True,
+            waitIndex=index,
+            timeout=timeout,
+            recursive=recursive
+        )
+
+    def write(self, key, value, ttl=None, dir=False, **kwdargs):
+        self.writes += 1
+        return self._result(self.store.set(key, value, dir=dir, ttl=ttl))
+
+    def delete(self, key, recursive=None, dir=None, **kwdargs):
+        self.writes += 1
+        return self._result(self.store.delete(key, recursive=recursive))
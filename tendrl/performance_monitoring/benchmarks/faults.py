@@ -0,0 +1,68 @@
+import gevent
+import random
+
+
+class Latency(object):
+    """Latency distribution, built from a spec string
+
+    Specs are 'fixed:<seconds>', 'uniform:<low>,<high>',
+    'exponential:<mean>' and 'lognormal:<median>,<sigma>'. An empty spec
+    means no added latency.
+    """
+
+    def __init__(self, spec=None, rng=None):
+        self.spec = spec or 'fixed:0'
+        self.rng = rng or random.Random()
+        name, _, args = self.spec.partition(':')
+        args = [float(arg) for arg in args.split(',') if arg]
+        if name == 'fixed':
+            self.sample = lambda: args[0]
+        elif name == 'uniform':
+            self.sample = lambda: self.rng.uniform(args[0], args[1])
+        elif name == 'exponential':
+            self.sample = lambda: self.rng.expovariate(1.0 / args[0])
+        elif name == 'lognormal':
+            # Parameterised by the median rather than mu, which is easier
+            # to relate to observed latencies.
+            self.sample = lambda: args[0] * self.rng.lognormvariate(
+                0,
+                args[1]
+            )
+        else:
+            raise ValueError('Unknown latency distribution %s' % self.spec)
+
+
+class FaultInjector(object):
+    """Delays calls and fails a fraction of them
+
+    A stand-in calls inject() before serving each request; it sleeps for
+    a sampled latency and returns True when the request should fail.
+    """
+
+    def __init__(self, latency=None, error_rate=0.0, seed=None):
+        self.rng = random.Random(seed)
+        self.latency = Latency(latency, self.rng)
+        self.error_rate = error_rate
+        # Lets a stand-in be set up before faults are switched on
+        self.enabled = True
+        self.calls = 0
+        self.errors = 0
+
+    def inject(self):
+        self.calls += 1
+        if not self.enabled:
+            return False
+        delay = self.latency.sample()
+        if delay > 0:
+            gevent.sleep(delay)
+        if self.error_rate and self.rng.random() < self.error_rate:
+            self.errors += 1
+            return True
+        return False
+
+    def stats(self):
+        return {'calls': self.calls, 'errors': self.errors}
+
+    def reset(self):
+        self.calls = 0
+        self.errors = 0
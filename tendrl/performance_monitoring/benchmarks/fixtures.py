@@ -0,0 +1,210 @@
+import datetime
+import json
+import random
+import uuid
+
+from tendrl.performance_monitoring.time_series_db.manager \
+    import TimeSeriesDBManager
+
+COMMON_SERVICES = ['tendrl-node-agent', 'etcd', 'collectd']
+SDS_SERVICES = {
+    'ceph': ['tendrl-ceph-integration', 'ceph-mon', 'ceph-osd'],
+    'gluster': ['tendrl-gluster-integration', 'glusterd'],
+}
+
+
+def node_id(index):
+    return str(uuid.UUID(int=index + 1, version=4))
+
+
+def cluster_id(index):
+    return str(uuid.UUID(int=(1 << 64) + index + 1, version=4))
+
+
+def node_fqdn(index):
+    return 'node%05d.bench.example.com' % index
+
+
+def build_fleet(nodes, clusters, seed=0, pools=8, rbds=8, osds_per_node=4,
+                volumes=8, alerts=2):
+    """Synthetic etcd tree of a fleet, as nested dicts
+
+    Nodes are spread round robin over the clusters, which alternate
+    between ceph and gluster. Random values come from a seeded generator
+    so that runs are comparable.
+    """
+    rng = random.Random(seed)
+    last_seen_at = '%s+00:00' % datetime.datetime.utcnow().isoformat()
+    tree = {
+        'nodes': {},
+        'clusters': {},
+        'monitoring': {'nodes': {}},
+        'alerting': {'nodes': {}},
+    }
+    cluster_nodes = [[] for _ in range(clusters)]
+    for index in range(nodes):
+        cluster_nodes[index % clusters].append(index)
+    for c_index in range(clusters):
+        sds_name = 'ceph' if c_index % 2 == 0 else 'gluster'
+        c_id = cluster_id(c_index)
+        cluster = {
+            'TendrlContext': {
+                'sds_name': sds_name,
+                'integration_id': c_id,
+                'cluster_name': 'cluster%d' % c_index,
+            },
+            'GlobalDetails': {
+                'status': rng.choice(['HEALTH_OK', 'HEALTH_WARN']),
+            },
+            'nodes': {},
+        }
+        total = rng.randint(1 << 40, 1 << 44)
+        used = rng.randint(0, total)
+        if sds_name == 'ceph':
+            cluster['Utilization'] = {
+                'raw_capacity': total,
+                'used_capacity': used,
+                'pcnt_used': used * 100.0 / total,
+            }
+            cluster['Pools'] = {}
+            for p_index in range(pools):
+                pool = {
+                    'pool_id': p_index,
+                    'pool_name': 'pool%d' % p_index,
+                    'percent_used': rng.uniform(0, 100),
+                    'Rbds': {},
+                }
+                for r_index in range(rbds):
+                    provisioned = rng.randint(1 << 30, 1 << 40)
+                    pool['Rbds']['rbd%d' % r_index] = {
+                        'name': 'rbd%d' % r_index,
+                        'provisioned': provisioned,
+                        'used': rng.randint(0, provisioned),
+                    }
+                cluster['Pools'][str(p_index)] = pool
+            osds = [
+                {
+                    'osd': osd,
+                    'state': ['up', 'in'] if rng.random() > 0.02 else
+                    ['down', 'out'],
+                }
+                for osd in range(len(cluster_nodes[c_index]) * osds_per_node)
+            ]
+            mons = [{'rank': rank} for rank in range(3)]
+            cluster['maps'] = {
+                'osd_map': {'data': {'osds': osds}},
+                'mon_status': {'data': {'outside_quorum': []}},
+                'mon_map': {'data': {'mons': mons}},
+            }
+        else:
+            cluster['Utilization'] = {
+                'total': total,
+                'used': used,
+                'pcnt_used': used * 100.0 / total,
+            }
+            cluster['Volumes'] = {}
+            for v_index in range(volumes):
+                cluster['Volumes']['vol%d' % v_index] = {
+                    'name': 'vol%d' % v_index,
+                    'status': rng.choice(['Started', 'Started', 'Stopped']),
+                    'pcnt_used': rng.uniform(0, 100),
+                }
+        for index in cluster_nodes[c_index]:
+            n_id = node_id(index)
+            tags = '["%s"]' % ('ceph/mon' if index % 10 == 0 else sds_name)
+            node_context = {
+                'node_id': n_id,
+                'fqdn': node_fqdn(index),
+                'tags': tags,
+                'status': 'UP',
+            }
+            cluster['nodes'][n_id] = {'NodeContext': dict(node_context)}
+            services = {}
+            for service in COMMON_SERVICES + SDS_SERVICES[sds_name]:
+                services[service] = {
+                    'exists': 'True',
+                    'running': str(rng.random() > 0.05),
+                }
+            tree['nodes'][n_id] = {
+                'NodeContext': node_context,
+                'TendrlContext': {
+                    'cluster_name': 'cluster%d' % c_index,
+                    'integration_id': c_id,
+                    'sds_name': sds_name,
+                },
+                'Service': services,
+            }
+            tree['monitoring']['nodes'][n_id] = {
+                'last_seen_at': last_seen_at,
+            }
+            tree['alerting']['nodes'][n_id] = dict(
+                (
+                    'alert%d' % a_index,
+                    {'severity': rng.choice(['WARNING', 'CRITICAL'])}
+                ) for a_index in range(rng.randint(0, alerts))
+            )
+        tree['clusters'][c_id] = cluster
+    return tree
+
+
+class SyntheticTimeSeriesPlugin(object):
+    """Answers metric queries with generated series instead of graphite"""
+
+    def __init__(self, seed=0):
+        self.rng = random.Random(seed)
+        self.queries = 0
+        self.pushes = 0
+
+    def _series(self, target, time_interval):
+        value = self.rng.uniform(0, 100)
+        if time_interval == 'latest':
+            target = '%s Current:%f Max:%f Min:%f' % (
+                target, value, value, value
+            )
+        return {'target': target, 'datapoints': [[value, 0]]}
+
+    def get_metric_stats(self, entity_name, metric_name, time_interval=None):
+        self.queries += 1
+        target = 'collectd.%s.%s' % (
+            entity_name.replace('.', '_'),
+            metric_name
+        )
+        targets = [target]
+        if '*' in target:
+            targets = [target.replace('*', part) for part in ['root', 'var']]
+        return json.dumps([
+            self._series(series, time_interval) for series in targets
+        ])
+
+    def get_aggregated_metric_stats(self, entity_names, metric_name,
+                                    aggregate=None, top=None, fill=False,
+                                    from_time=None, until_time=None):
+        # A series per entity, as the per entity sums graphite returns
+        self.queries += 1
+        return [
+            {'target': entity_name, 'datapoints': [
+                [self.rng.uniform(0, 100), 0]
+            ]}
+            for entity_name in entity_names
+        ]
+
+    def get_metrics(self, entity_name):
+        return str([])
+
+    def push_metrics(self, metric_name, metric_value):
+        self.pushes += 1
+
+    def get_utilizationtype(self, resource_name, utilization_type):
+        return utilization_type
+
+    def get_delimeter(self):
+        return '.'
+
+    def destroy(self):
+        pass
+
+
+class SyntheticTimeSeriesDBManager(TimeSeriesDBManager):
+    def __init__(self, plugin=None):
+        self.time_series_db = 'synthetic'
+        self.plugin = plugin or SyntheticTimeSeriesPlugin()
@@ -0,0 +1,377 @@
+import bisect
+from collections import OrderedDict
+import cPickle
+import cStringIO
+import fnmatch
+import itertools
+import json
+import re
+import struct
+import time
+import urlparse
+
+from gevent.pywsgi import WSGIServer
+from gevent.server import StreamServer
+
+from tendrl.performance_monitoring.benchmarks.faults import FaultInjector
+
+# Seconds per point, like a carbon storage schema of 60s:1d
+STEP = 60
+RETENTION = 24 * 60 * 60
+PICKLE_HEADER = struct.Struct('!L')
+FROM_UNITS = {
+    's': 1,
+    'min': 60,
+    'h': 3600,
+    'd': 86400,
+}
+
+
+def expand_braces(pattern):
+    # 'a.{b,c}.d' -> ['a.b.d', 'a.c.d']
+    parts = re.split(r'\{([^{}]*)\}', pattern)
+    choices = [
+        part.split(',') if index % 2 else [part]
+        for index, part in enumerate(parts)
+    ]
+    return [''.join(choice) for choice in itertools.product(*choices)]
+
+
+def split_arguments(arguments):
+    # The arguments of a function call, split on the top level commas
+    parts = []
+    depth = 0
+    start = 0
+    for index, char in enumerate(arguments):
+        if char in '({':
+            depth += 1
+        elif char in ')}':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            parts.append(arguments[start:index].strip())
+            start = index + 1
+    parts.append(arguments[start:].strip())
+    return parts
+
+
+def combine(name, series_list, reduce_values):
+    # A series of reduce_values over the values at each timestamp, None
+    # where no series has a value, as graphite's safe functions
+    if not series_list:
+        return []
+    datapoints = []
+    for points in zip(*[series['datapoints'] for series in series_list]):
+        values = [value for value, _ in points if value is not None]
+        datapoints.append(
+            [reduce_values(values) if values else None, points[0][1]]
+        )
+    return [{'target': name, 'datapoints': datapoints}]
+
+
+def current(series):
+    values = [
+        value for value, _ in series['datapoints'] if value is not None
+    ]
+    return values[-1] if values else None
+
+
+AGGREGATORS = {
+    'sumSeries': sum,
+    'averageSeries': lambda values: float(sum(values)) / len(values),
+    'maxSeries': max,
+    'minSeries': min,
+}
+
+
+def parse_from(value, now):
+    # graphite's relative 'from', e.g. -24h, -30min, -7d
+    if not value:
+        return now - RETENTION
+    match = re.match(r'^-(\d+)(s|min|h|d)$', value)
+    if match is None:
+        return int(value)
+    return now - int(match.group(1)) * FROM_UNITS[match.group(2)]
+
+
+class MetricStore(object):
+    """Datapoints received by carbon, at a fixed step per series"""
+
+    def __init__(self, step=STEP, retention=RETENTION):
+        self.step = step
+        self.retention = retention
+        self.series = {}
+
+    def add(self, name, value, timestamp):
+        timestamp = int(timestamp) - int(timestamp) % self.step
+        points = self.series.setdefault(name, [])
+        index = bisect.bisect_left(points, (timestamp,))
+        if index < len(points) and points[index][0] == timestamp:
+            points[index] = (timestamp, value)
+        else:
+            points.insert(index, (timestamp, value))
+        horizon = timestamp - self.retention
+        if points[0][0] <= horizon:
+            del points[:bisect.bisect_right(points, (horizon, float('inf')))]
+
+    def names(self):
+        return sorted(self.series)
+
+    def match(self, pattern):
+        matched = set()
+        for expanded in expand_braces(pattern):
+            nodes = expanded.split('.')
+            for name in self.series:
+                parts = name.split('.')
+                if len(parts) == len(nodes) and all(
+                    fnmatch.fnmatchcase(part, node)
+                    for part, node in zip(parts, nodes)
+                ):
+                    matched.add(name)
+        return sorted(matched)
+
+    def fetch(self, name, start, end):
+        # One point per step, None where nothing was received
+        points = dict(self.series.get(name, []))
+        start = start - start % self.step + self.step
+        return [
+            [points.get(timestamp), timestamp]
+            for timestamp in range(start, end + 1, self.step)
+        ]
+
+
+class CarbonReceiver(object):
+    """carbon-cache's plaintext and pickle receivers, into a MetricStore"""
+
+    def __init__(self, store=None, host='127.0.0.1', line_port=0,
+                 pickle_port=0, latency=None, error_rate=0.0, seed=None):
+        self.store = store or MetricStore()
+        # Latency delays reading a batch; an error drops the connection
+        self.faults = FaultInjector(latency, error_rate, seed)
+        self.datapoints = 0
+        self.line_server = StreamServer((host, line_port), self.handle_line)
+        self.pickle_server = StreamServer(
+            (host, pickle_port),
+            self.handle_pickle
+        )
+
+    @property
+    def line_address(self):
+        return self.line_server.address
+
+    @property
+    def pickle_address(self):
+        return self.pickle_server.address
+
+    def start(self):
+        self.line_server.start()
+        self.pickle_server.start()
+
+    def stop(self):
+        self.line_server.stop()
+        self.pickle_server.stop()
+
+    def add(self, name, value, timestamp):
+        self.datapoints += 1
+        self.store.add(name, float(value), timestamp)
+
+    def handle_line(self, sock, address):
+        sock_file = sock.makefile()
+        try:
+            for line in sock_file:
+                if self.faults.inject():
+                    return
+                try:
+                    name, value, timestamp = line.split()
+                    self.add(name, value, float(timestamp))
+                except ValueError:
+                    # carbon logs and skips malformed lines
+                    continue
+        finally:
+            sock_file.close()
+            sock.close()
+
+    def read_exactly(self, sock, size):
+        data = ''
+        while len(data) < size:
+            chunk = sock.recv(size - len(data))
+            if not chunk:
+                return None
+            data += chunk
+        return data
+
+    def handle_pickle(self, sock, address):
+        try:
+            while True:
+                header = self.read_exactly(sock, PICKLE_HEADER.size)
+                if header is None:
+                    return
+                payload = self.read_exactly(
+                    sock,
+                    PICKLE_HEADER.unpack(header)[0]
+                )
+                if payload is None or self.faults.inject():
+                    return
+                unpickler = cPickle.Unpickler(cStringIO.StringIO(payload))
+                # Plain lists, tuples and numbers only, like carbon's
+                # safe unpickler.
+                unpickler.find_global = None
+                try:
+                    datapoints = unpickler.load()
+                except cPickle.UnpicklingError:
+                    return
+                for name, (timestamp, value) in datapoints:
+                    self.add(name, value, timestamp)
+        finally:
+            sock.close()
+
+    def stats(self):
+        stats = self.faults.stats()
+        stats['datapoints'] = self.datapoints
+        return stats
+
+    def reset(self):
+        self.faults.reset()
+        self.datapoints = 0
+
+
+class GraphiteWebServer(object):
+    """graphite-web's /render (json) and /metrics/index.json
+
+    Supports plain, wildcard and brace targets, optionally wrapped in
+    cactiStyle(), group(), alias(), keepLastValue(), groupByNode(),
+    highestCurrent() and the sumSeries() family. Missing points are
+    rendered as nulls, as graphite-web does.
+    """
+
+    def __init__(self, store=None, host='127.0.0.1', port=0, latency=None,
+                 error_rate=0.0, seed=None):
+        self.store = store or MetricStore()
+        self.faults = FaultInjector(latency, error_rate, seed)
+        self.requests = {}
+        self.server = WSGIServer((host, port), self.handle, log=None)
+
+    @property
+    def address(self):
+        return self.server.address
+
+    def start(self):
+        self.server.start()
+
+    def stop(self):
+        self.server.stop()
+
+    def respond(self, start_response, status, body):
+        start_response(
+            '%d %s' % (status, 'OK' if status < 300 else 'ERROR'),
+            [('Content-Type', 'application/json')]
+        )
+        return [body]
+
+    def cacti_style(self, series):
+        values = [
+            value for value, _ in series['datapoints'] if value is not None
+        ]
+        current = values[-1] if values else float('nan')
+        series['target'] = '%s Current:%.2f Max:%.2f Min:%.2f' % (
+            series['target'],
+            current,
+            max(values) if values else float('nan'),
+            min(values) if values else float('nan')
+        )
+        return series
+
+    def evaluate(self, target, start, now):
+        match = re.match(r'^(\w+)\((.*)\)$', target)
+        if match is None:
+            return [
+                {
+                    'target': name,
+                    'datapoints': self.store.fetch(name, start, now),
+                }
+                for name in self.store.match(target)
+            ]
+        function = match.group(1)
+        arguments = split_arguments(match.group(2))
+        series_list = self.evaluate(arguments[0], start, now)
+        if function == 'cactiStyle':
+            return [self.cacti_style(series) for series in series_list]
+        if function in AGGREGATORS or function == 'group':
+            for argument in arguments[1:]:
+                series_list += self.evaluate(argument, start, now)
+            if function == 'group':
+                return series_list
+            return combine(
+                '%s(%s)' % (function, ','.join(arguments)),
+                series_list,
+                AGGREGATORS[function]
+            )
+        if function == 'alias':
+            for series in series_list:
+                series['target'] = arguments[1].strip('\'"')
+            return series_list
+        if function == 'keepLastValue':
+            for series in series_list:
+                last = None
+                for point in series['datapoints']:
+                    if point[0] is None:
+                        point[0] = last
+                    last = point[0]
+            return series_list
+        if function == 'groupByNode':
+            groups = OrderedDict()
+            for series in series_list:
+                groups.setdefault(
+                    series['target'].split('.')[int(arguments[1])],
+                    []
+                ).append(series)
+            return [
+                combine(
+                    key,
+                    group,
+                    AGGREGATORS[arguments[2].strip('\'"')]
+                )[0]
+                for key, group in groups.iteritems()
+            ]
+        if function == 'highestCurrent':
+            return sorted(
+                series_list,
+                key=current,
+                reverse=True
+            )[:int(arguments[1])]
+        raise ValueError('Unsupported function %s' % function)
+
+    def render(self, params):
+        now = int(time.time())
+        start = parse_from(params.get('from', [None])[0], now)
+        result = []
+        for target in params.get('target', []):
+            result.extend(self.evaluate(target, start, now))
+        return json.dumps(result)
+
+    def handle(self, environ, start_response):
+        path = environ['PATH_INFO']
+        self.requests[path] = self.requests.get(path, 0) + 1
+        if self.faults.inject():
+            return self.respond(start_response, 500, 'Internal Server Error')
+        params = urlparse.parse_qs(environ.get('QUERY_STRING', ''))
+        if path == '/render':
+            try:
+                return self.respond(start_response, 200, self.render(params))
+            except (ValueError, KeyError, IndexError):
+                return self.respond(start_response, 400, 'Bad Request')
+        if path == '/metrics/index.json':
+            return self.respond(
+                start_response,
+                200,
+                json.dumps(self.store.names())
+            )
+        return self.respond(start_response, 404, 'Not Found')
+
+    def stats(self):
+        stats = self.faults.stats()
+        stats['requests'] = dict(self.requests)
+        return stats
+
+    def reset(self):
+        self.faults.reset()
+        self.requests = {}
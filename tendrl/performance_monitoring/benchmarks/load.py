@@ -0,0 +1,317 @@
+import __builtin__
+import argparse
+import json
+import math
+import random
+import sys
+import time
+
+import etcd
+from gevent.pool import Pool
+from gevent.pywsgi import WSGIServer
+import urllib3
+
+from tendrl.commons.etcdobj import Server as EtcdServer
+from tendrl.performance_monitoring.aggregator.cluster_summary \
+    import ClusterSummarise
+from tendrl.performance_monitoring.aggregator.node_liveness \
+    import NodeLivenessTracker
+from tendrl.performance_monitoring.aggregator.node_summary \
+    import NodeSummarise
+from tendrl.performance_monitoring.benchmarks.etcd_http import EtcdHTTPServer
+from tendrl.performance_monitoring.benchmarks.etcd_store import MemoryEtcd
+from tendrl.performance_monitoring.benchmarks import fixtures
+from tendrl.performance_monitoring.benchmarks.graphite_standin \
+    import CarbonReceiver
+from tendrl.performance_monitoring.benchmarks.graphite_standin \
+    import GraphiteWebServer
+from tendrl.performance_monitoring.benchmarks.graphite_standin \
+    import MetricStore
+from tendrl.performance_monitoring.benchmarks.summary import Namespace
+from tendrl.performance_monitoring.central_store \
+    import PerformanceMonitoringEtcdCentralStore
+from tendrl.performance_monitoring.manager import app
+from tendrl.performance_monitoring.sds import SDSMonitoringManager
+from tendrl.performance_monitoring.time_series_db.manager \
+    import TimeSeriesDBManager
+
+# Series collectd reports per node, as read by NodeSummarise
+NODE_METRICS = {
+    'cpu.percent-user': (0, 50),
+    'cpu.percent-system': (0, 20),
+    'memory.memory-used': (1 << 30, 1 << 34),
+    'memory.percent-used': (0, 100),
+    'aggregation-memory-sum.memory': (1 << 34, 1 << 34),
+    'df-root.df_complex-used': (1 << 30, 1 << 36),
+    'df-root.df_complex-free': (1 << 30, 1 << 36),
+    'df-var.df_complex-used': (1 << 30, 1 << 36),
+    'df-var.df_complex-free': (1 << 30, 1 << 36),
+}
+UTILIZATION_METRICS = ['gauge-used', 'gauge-total', 'percent-percent_bytes']
+
+# Dashboard traffic: (route, weight, url builder)
+ROUTES = [
+    ('/monitoring/nodes/summary', 4,
+     lambda fleet, rng: '/monitoring/nodes/summary'),
+    ('/monitoring/nodes/summary?node_ids', 2,
+     lambda fleet, rng: '/monitoring/nodes/summary?node_ids=%s' % ','.join(
+         rng.sample(fleet['nodes'], min(5, len(fleet['nodes'])))
+     )),
+    ('/monitoring/clusters/<cluster_id>/summary', 3,
+     lambda fleet, rng: '/monitoring/clusters/%s/summary' % rng.choice(
+         fleet['clusters']
+     )),
+    ('/monitoring/system/<cluster_type>/summary', 2,
+     lambda fleet, rng: '/monitoring/system/%s/summary' % rng.choice(
+         fleet['sds']
+     )),
+    ('/monitoring/nodes/<node_id>/<resource_name>/stats', 4,
+     lambda fleet, rng: '/monitoring/nodes/%s/%s/stats' % (
+         rng.choice(fleet['nodes']),
+         rng.choice(['cpu.percent-user', 'memory.percent-used'])
+     )),
+    ('/monitoring/clusters/<cluster_id>/utilization/<utiliation_type>/stats',
+     2,
+     lambda fleet, rng:
+     '/monitoring/clusters/%s/utilization/percent_used/stats' % rng.choice(
+         fleet['clusters']
+     )),
+    ('/monitoring/system/<sds_type>/utilization/<utiliation_type>/stats', 1,
+     lambda fleet, rng:
+     '/monitoring/system/%s/utilization/percent_used/stats' % rng.choice(
+         fleet['sds']
+     )),
+    ('/monitoring/nodes/<node_id>/monitored_types', 1,
+     lambda fleet, rng: '/monitoring/nodes/%s/monitored_types' % rng.choice(
+         fleet['nodes']
+     )),
+]
+
+
+def percentile(values, percent):
+    # Nearest rank
+    if not values:
+        return None
+    index = int(math.ceil(percent / 100.0 * len(values))) - 1
+    return values[max(0, min(index, len(values) - 1))]
+
+
+def seed_metrics(metric_store, tree, rng, points=60):
+    now = int(time.time())
+    for n_id, node in tree['nodes'].iteritems():
+        prefix = 'collectd.%s' % node['NodeContext']['fqdn'].replace('.', '_')
+        for metric, (low, high) in NODE_METRICS.iteritems():
+            for step in range(points):
+                metric_store.add(
+                    '%s.%s' % (prefix, metric),
+                    rng.uniform(low, high),
+                    now - step * metric_store.step
+                )
+    for c_id, cluster in tree['clusters'].iteritems():
+        sds_name = cluster['TendrlContext']['sds_name']
+        for metric in UTILIZATION_METRICS:
+            for name in [
+                'collectd.cluster_%s.cluster_utilization.%s' % (c_id, metric),
+                'collectd.%s.utilization.%s' % (sds_name, metric),
+            ]:
+                for step in range(points):
+                    metric_store.add(
+                        name,
+                        rng.uniform(0, 100),
+                        now - step * metric_store.step
+                    )
+
+
+class StandIns(object):
+    """etcd, carbon and graphite-web stand-ins on loopback ports"""
+
+    def __init__(self, args):
+        self.etcd_store = MemoryEtcd()
+        self.metric_store = MetricStore()
+        self.etcd = EtcdHTTPServer(
+            self.etcd_store,
+            latency=args.etcd_latency,
+            error_rate=args.etcd_error_rate,
+            seed=args.seed
+        )
+        self.carbon = CarbonReceiver(
+            self.metric_store,
+            latency=args.carbon_latency,
+            error_rate=args.carbon_error_rate,
+            seed=args.seed
+        )
+        self.graphite = GraphiteWebServer(
+            self.metric_store,
+            latency=args.graphite_latency,
+            error_rate=args.graphite_error_rate,
+            seed=args.seed
+        )
+
+    def start(self):
+        self.etcd.start()
+        self.carbon.start()
+        self.graphite.start()
+
+    def stop(self):
+        self.graphite.stop()
+        self.carbon.stop()
+        self.etcd.stop()
+
+    def reset(self):
+        self.etcd.reset()
+        self.carbon.reset()
+        self.graphite.reset()
+
+    def inject_faults(self, enabled):
+        for stand_in in [self.etcd, self.carbon, self.graphite]:
+            stand_in.faults.enabled = enabled
+
+    def stats(self):
+        return {
+            'etcd': self.etcd.stats(),
+            'carbon': self.carbon.stats(),
+            'graphite': self.graphite.stats(),
+        }
+
+
+def setup_namespace(stand_ins):
+    # Point NS at the stand-ins, as manager.main does for real services.
+    # The time series db plugins connect to carbon when they are loaded.
+    etcd_host, etcd_port = stand_ins.etcd.address
+    graphite_host, graphite_port = stand_ins.graphite.address
+    __builtin__.NS = Namespace(
+        publisher_id='performance_monitoring',
+        etcd_orm=EtcdServer(etcd.Client(host=etcd_host, port=etcd_port)),
+        performance_monitoring=Namespace(config=Namespace(data={
+            'time_series_db': 'graphite',
+            'time_series_db_server': graphite_host,
+            'time_series_db_port': graphite_port,
+            'carbon_port': stand_ins.carbon.line_address[1],
+        })),
+    )
+    NS.central_store_thread = PerformanceMonitoringEtcdCentralStore()
+    NS.time_series_db_manager = TimeSeriesDBManager()
+    NS.sds_monitoring_manager = SDSMonitoringManager()
+    NS.node_liveness = NodeLivenessTracker()
+    NS.node_liveness.sync()
+
+
+def summarise():
+    # One cycle of each summariser, so summaries exist before traffic
+    NodeSummarise(throttle=0).calculate_host_summaries()
+    ClusterSummarise(throttle=0).summarise_clusters()
+
+
+def drive(base_url, fleet, args):
+    rng = random.Random(args.seed)
+    http = urllib3.PoolManager(maxsize=args.concurrency)
+    weighted = []
+    for route, weight, build in ROUTES:
+        weighted.extend([(route, build)] * weight)
+    latencies = dict((route, []) for route, _, _ in ROUTES)
+    errors = dict((route, 0) for route, _, _ in ROUTES)
+
+    def request(route, url):
+        start = time.time()
+        try:
+            response = http.request('GET', base_url + url, timeout=60)
+            failed = response.status >= 500
+        except urllib3.exceptions.HTTPError:
+            failed = True
+        latencies[route].append(time.time() - start)
+        if failed:
+            errors[route] += 1
+
+    pool = Pool(args.concurrency)
+    start = time.time()
+    for _ in range(args.requests):
+        route, build = rng.choice(weighted)
+        pool.spawn(request, route, build(fleet, rng))
+    pool.join()
+    elapsed = time.time() - start
+    routes = {}
+    for route, values in latencies.iteritems():
+        if not values:
+            continue
+        values.sort()
+        routes[route] = {
+            'requests': len(values),
+            'errors': errors[route],
+            'p50': percentile(values, 50),
+            'p99': percentile(values, 99),
+            'max': values[-1],
+        }
+    return elapsed, routes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Replay dashboard API traffic against stand-ins of '
+                    'etcd, carbon and graphite-web'
+    )
+    parser.add_argument('--nodes', type=int, default=100)
+    parser.add_argument('--clusters', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    for upstream in ['etcd', 'carbon', 'graphite']:
+        parser.add_argument(
+            '--%s-latency' % upstream,
+            default=None,
+            help='fixed:<s>, uniform:<low>,<high>, exponential:<mean> or '
+                 'lognormal:<median>,<sigma>'
+        )
+        parser.add_argument(
+            '--%s-error-rate' % upstream,
+            type=float,
+            default=0.0
+        )
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    tree = fixtures.build_fleet(args.nodes, args.clusters, seed=args.seed)
+    stand_ins = StandIns(args)
+    stand_ins.etcd_store.load(tree)
+    seed_metrics(stand_ins.metric_store, tree, rng)
+    stand_ins.inject_faults(False)
+    stand_ins.start()
+    setup_namespace(stand_ins)
+    summarise()
+
+    api_server = WSGIServer(('127.0.0.1', 0), app, log=None)
+    api_server.start()
+    fleet = {
+        'nodes': sorted(tree['nodes']),
+        'clusters': sorted(tree['clusters']),
+        'sds': sorted(set(
+            cluster['TendrlContext']['sds_name']
+            for cluster in tree['clusters'].itervalues()
+        )),
+    }
+    stand_ins.reset()
+    stand_ins.inject_faults(True)
+    try:
+        elapsed, routes = drive(
+            'http://%s:%s' % api_server.address,
+            fleet,
+            args
+        )
+    finally:
+        api_server.stop()
+        NS.node_liveness.stop()
+        stand_ins.stop()
+    result = {
+        'nodes': args.nodes,
+        'clusters': args.clusters,
+        'requests': args.requests,
+        'concurrency': args.concurrency,
+        'seconds': elapsed,
+        'requests_per_second': args.requests / elapsed,
+        'routes': routes,
+        'upstream': stand_ins.stats(),
+    }
+    sys.stdout.write(json.dumps(result, indent=4, sort_keys=True) + '\n')
+
+
+if __name__ == '__main__':
+    main()
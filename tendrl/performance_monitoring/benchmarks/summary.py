@@ -0,0 +1,183 @@
+import __builtin__
+import argparse
+import json
+import sys
+import timeit
+
+from tendrl.commons.etcdobj import Server as EtcdServer
+from tendrl.performance_monitoring.aggregator.cluster_summary \
+    import ClusterSummarise
+from tendrl.performance_monitoring.aggregator.node_liveness \
+    import NodeLivenessTracker
+from tendrl.performance_monitoring.aggregator.node_summary \
+    import NodeSummarise
+from tendrl.performance_monitoring.benchmarks.etcd_store \
+    import MemoryEtcd
+from tendrl.performance_monitoring.benchmarks.etcd_store \
+    import MemoryEtcdClient
+from tendrl.performance_monitoring.benchmarks.fixtures import build_fleet
+from tendrl.performance_monitoring.benchmarks.fixtures \
+    import SyntheticTimeSeriesDBManager
+from tendrl.performance_monitoring.central_store \
+    import PerformanceMonitoringEtcdCentralStore
+from tendrl.performance_monitoring.sds import SDSMonitoringManager
+from tendrl.performance_monitoring.utils import read as etcd_read
+
+
+class Namespace(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+def setup_namespace(nodes, clusters, seed):
+    store = MemoryEtcd()
+    store.load(build_fleet(nodes, clusters, seed=seed))
+    client = MemoryEtcdClient(store)
+    __builtin__.NS = Namespace(
+        publisher_id='performance_monitoring',
+        etcd_orm=EtcdServer(client),
+        performance_monitoring=Namespace(config=Namespace(data={})),
+    )
+    NS.central_store_thread = PerformanceMonitoringEtcdCentralStore()
+    NS.time_series_db_manager = SyntheticTimeSeriesDBManager()
+    NS.sds_monitoring_manager = SDSMonitoringManager()
+    NS.node_liveness = NodeLivenessTracker()
+    NS.node_liveness.sync()
+    return client
+
+
+def bench_calculate_host_summaries(throttle):
+    node_summariser = NodeSummarise(throttle=throttle)
+    return node_summariser.calculate_host_summaries
+
+
+def bench_parse_cluster(throttle):
+    cluster_summariser = ClusterSummarise(throttle=throttle)
+    clusters = etcd_read('/clusters')
+    NS.sds_monitoring_manager.refresh_service_index()
+
+    def run():
+        for cluster_id, cluster_det in clusters.iteritems():
+            cluster_summariser.parse_cluster(cluster_id, cluster_det)
+    return run
+
+
+def bench_get_cluster_summary(throttle):
+    clusters = etcd_read('/clusters')
+    NS.sds_monitoring_manager.refresh_service_index()
+
+    def run():
+        for cluster_id, cluster_det in clusters.iteritems():
+            NS.sds_monitoring_manager.get_cluster_summary(
+                cluster_id,
+                cluster_det
+            )
+    return run
+
+
+def bench_compute_system_summary(throttle):
+    cluster_summariser = ClusterSummarise(throttle=throttle)
+    clusters = etcd_read('/clusters')
+    NS.sds_monitoring_manager.refresh_service_index()
+    cluster_summaries = [
+        cluster_summariser.parse_cluster(cluster_id, cluster_det).copy()
+        for cluster_id, cluster_det in clusters.iteritems()
+    ]
+
+    def run():
+        NS.sds_monitoring_manager.compute_system_summary(
+            cluster_summaries,
+            clusters
+        )
+    return run
+
+
+BENCHMARKS = [
+    ('NodeSummarise.calculate_host_summaries',
+     bench_calculate_host_summaries),
+    ('ClusterSummarise.parse_cluster', bench_parse_cluster),
+    ('SDSPlugin.get_cluster_summary', bench_get_cluster_summary),
+    ('SDSMonitoringManager.compute_system_summary',
+     bench_compute_system_summary),
+]
+
+
+def run_benchmark(name, setup, nodes, clusters, repeat, throttle, seed):
+    client = setup_namespace(nodes, clusters, seed)
+    func = setup(throttle)
+    timings = []
+    reads = client.reads
+    writes = client.writes
+    queries = NS.time_series_db_manager.get_plugin().queries
+    for _ in range(repeat):
+        start = timeit.default_timer()
+        func()
+        timings.append(timeit.default_timer() - start)
+    timings.sort()
+    return {
+        'benchmark': name,
+        'nodes': nodes,
+        'clusters': clusters,
+        'repeat': repeat,
+        'throttle': throttle,
+        'min': timings[0],
+        'median': timings[len(timings) // 2],
+        'max': timings[-1],
+        # Per run upstream cost
+        'etcd_reads': float(client.reads - reads) / repeat,
+        'etcd_writes': float(client.writes - writes) / repeat,
+        'time_series_queries': float(
+            NS.time_series_db_manager.get_plugin().queries - queries
+        ) / repeat,
+    }
+
+
+def int_list(value):
+    return [int(item) for item in value.split(',')]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark summary computation at fleet scale'
+    )
+    parser.add_argument('--nodes', type=int_list, default=[10, 100, 1000,
+                                                           5000])
+    parser.add_argument('--clusters', type=int_list, default=[1, 10, 50])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument(
+        '--throttle',
+        type=float,
+        default=0,
+        help='Pause between nodes/clusters, as in production (0.1)'
+    )
+    parser.add_argument(
+        '--benchmark',
+        action='append',
+        help='Only run benchmarks whose name contains this'
+    )
+    args = parser.parse_args(argv)
+    for nodes in args.nodes:
+        for clusters in args.clusters:
+            if clusters > nodes:
+                continue
+            for name, setup in BENCHMARKS:
+                if args.benchmark and not any(
+                    selected in name for selected in args.benchmark
+                ):
+                    continue
+                result = run_benchmark(
+                    name,
+                    setup,
+                    nodes,
+                    clusters,
+                    args.repeat,
+                    args.throttle,
+                    args.seed
+                )
+                sys.stdout.write(json.dumps(result, sort_keys=True) + '\n')
+                sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,7 @@
 from etcd import EtcdConnectionFailed
 from etcd import EtcdException
 from etcd import EtcdKeyNotFound
+import gevent.pool
 from ruamel import yaml
 
 from tendrl.commons import central_store
@@ -14,12 +15,106 @@ from tendrl.performance_monitoring.objects.node_summary \
     import NodeSummary
 from tendrl.performance_monitoring.objects.system_summary \
     import SystemSummary
+from tendrl.performance_monitoring.central_store.changelog \
+    import changes_since
+from tendrl.performance_monitoring.central_store.changelog \
+    import NodeChangeLog
+from tendrl.performance_monitoring.central_store.ranking \
+    import NodeRanking
+from tendrl.performance_monitoring.central_store.ranking import top_of
+from tendrl.performance_monitoring.central_store.snapshot \
+    import summary_fields
+from tendrl.performance_monitoring.central_store.writer \
+    import SummaryWriter
 from tendrl.performance_monitoring.utils import read as etcd_read
 
+# etcd reads of node fqdns in flight in get_node_names
+NODE_NAME_READS = 20
+
 
 class PerformanceMonitoringEtcdCentralStore(central_store.EtcdCentralStore):
     def __init__(self):
         super(PerformanceMonitoringEtcdCentralStore, self).__init__()
+        # SummarySnapshot the summaries are published to and read from,
+        # when enabled. The get_*_summary methods fall back to etcd for
+        # what it does not have.
+        self.summary_snapshot = None
+        # The nodes ordered by utilization and alert count, following the
+        # node summaries computed in this process
+        self.node_ranking = NodeRanking()
+        # Versions of the node summaries and their recent changes
+        self.node_changes = NodeChangeLog()
+        # The summaries' keys last written to etcd and those to write
+        self.summary_writer = SummaryWriter()
+
+    def snapshot_summary(self, section, key, summary):
+        if section == 'nodes':
+            summary = dict(
+                summary,
+                version=self.node_changes.record(key, summary)
+            )
+            self.node_ranking.update(key, summary)
+        if self.summary_snapshot is not None:
+            self.summary_snapshot.update(section, key, summary)
+
+    def retain_summaries(self, section, keys):
+        if section == 'nodes':
+            self.node_changes.retain(keys)
+            self.node_ranking.retain(keys)
+        self.summary_writer.retain(section, keys)
+        if self.summary_snapshot is not None:
+            self.summary_snapshot.retain(section, keys)
+
+    def publish_summaries(self, node_ids=None):
+        if self.summary_snapshot is None:
+            return
+        try:
+            if node_ids is not None:
+                self.summary_snapshot.set('node_ids', node_ids)
+            self.summary_snapshot.set(
+                'node_ranking',
+                self.node_ranking.to_json()
+            )
+            self.summary_snapshot.set(
+                'node_changes',
+                self.node_changes.to_json()
+            )
+            self.summary_snapshot.publish()
+        except (EnvironmentError, ValueError, TypeError) as ex:
+            Event(
+                ExceptionMessage(
+                    priority="error",
+                    publisher=NS.publisher_id,
+                    payload={"message": 'Failed to publish the summary '
+                                        'snapshot.',
+                             "exception": ex
+                             }
+                )
+            )
+
+    def save_summary(self, path, summary):
+        self.summary_writer.save(path, summary)
+
+    def flush_summaries(self):
+        self.summary_writer.flush()
+
+    def get_snapshot_summary(self, section, key=None):
+        if self.summary_snapshot is None:
+            return None
+        try:
+            return self.summary_snapshot.get(section, key)
+        except (TendrlPerformanceMonitoringException, ValueError) as ex:
+            Event(
+                ExceptionMessage(
+                    priority="debug",
+                    publisher=NS.publisher_id,
+                    payload={"message": 'Failed to read the summary '
+                                        'snapshot, reading etcd instead.',
+                             "exception": ex
+                             }
+                )
+            )
+            return None
 
     def save_config(self, config):
         NS.etcd_orm.save(config)
@@ -75,6 +170,30 @@ class PerformanceMonitoringEtcdCentralStore(central_store.EtcdCentralStore):
         ) as ex:
             raise TendrlPerformanceMonitoringException(str(ex))
 
+    def get_node_names(self, node_ids):
+        # {node_id: fqdn} of the nodes of node_ids found, reading only
+        # their fqdn keys, NODE_NAME_READS at once
+        def read_fqdn(node_id):
+            try:
+                return node_id, NS.etcd_orm.client.read(
+                    '/nodes/%s/NodeContext/fqdn' % node_id
+                ).value
+            except EtcdKeyNotFound:
+                return node_id, None
+            except (
+                EtcdConnectionFailed,
+                EtcdException
+            ) as ex:
+                raise TendrlPerformanceMonitoringException(str(ex))
+        node_names = gevent.pool.Pool(NODE_NAME_READS).map(
+            read_fqdn,
+            sorted(set(node_ids))
+        )
+        return dict(
+            (node_id, fqdn) for node_id, fqdn in node_names
+            if fqdn is not None
+        )
+
     def get_node_role(self, node_id):
         try:
             return NS.etcd_orm.client.read(
@@ -120,6 +239,33 @@ class PerformanceMonitoringEtcdCentralStore(central_store.EtcdCentralStore):
         ) as ex:
             raise TendrlPerformanceMonitoringException(str(ex))
 
+    def get_node_services(self, service_names):
+        # A single recursive read of /nodes replaces a read per node, per
+        # service. Only the services in service_names are indexed.
+        node_services = {}
+        try:
+            nodes = NS.etcd_orm.client.read('/nodes', recursive=True)
+        except EtcdKeyNotFound:
+            return node_services
+        except (
+            EtcdConnectionFailed,
+            EtcdException
+        ) as ex:
+            raise TendrlPerformanceMonitoringException(str(ex))
+        for leaf in nodes.leaves:
+            # /nodes/<node_id>/Service/<service_name>/<attribute>
+            key_contents = leaf.key.split('/')
+            if len(key_contents) != 6:
+                continue
+            _, _, node_id, kind, service_name, attribute = key_contents
+            if kind != 'Service' or service_name not in service_names:
+                continue
+            node_service = node_services.setdefault(
+                node_id, {}
+            ).setdefault(service_name, {})
+            node_service[attribute] = leaf.value
+        return node_services
+
     def get_node_alert_ids(self, node_id=None):
         alert_ids = []
         try:
@@ -150,6 +296,9 @@ class PerformanceMonitoringEtcdCentralStore(central_store.EtcdCentralStore):
         return node_alerts_arr
 
     def get_cluster_summary(self, cluster_id):
+        summary = self.get_snapshot_summary('clusters', cluster_id)
+        if summary is not None:
+            return summary
         try:
             summary = ClusterSummary(
                 cluster_id=cluster_id
@@ -167,6 +316,9 @@ class PerformanceMonitoringEtcdCentralStore(central_store.EtcdCentralStore):
             TendrlPerformanceMonitoringException(str(ex))
 
     def get_system_summary(self, cluster_type):
+        summary = self.get_snapshot_summary('systems', cluster_type)
+        if summary is not None:
+            return summary
         try:
             summary = SystemSummary(
                 sds_type=cluster_type
@@ -186,21 +338,21 @@ class PerformanceMonitoringEtcdCentralStore(central_store.EtcdCentralStore):
     def get_node_summary(self, node_ids=None):
         summary = []
         exs = ''
+        snapshot_summaries = self.get_snapshot_summary('nodes') or {}
         if node_ids is None:
-            node_ids = self.get_node_ids()
+            node_ids = self.get_snapshot_summary('node_ids')
+            if node_ids is None:
+                node_ids = self.get_node_ids()
         for node_id in node_ids:
             try:
-                current_node_summary = etcd_read(
-                    '/monitoring/summary/nodes/%s' % node_id
-                )
-                if '_etcd_cls' in current_node_summary:
-                    del current_node_summary['_etcd_cls']
-                if 'value' in current_node_summary:
-                    del current_node_summary['value']
-                if '_defs' in current_node_summary:
-                    del current_node_summary['_defs']
-                if 'list' in current_node_summary:
-                    del current_node_summary['list']
+                if node_id in snapshot_summaries:
+                    current_node_summary = dict(snapshot_summaries[node_id])
+                else:
+                    current_node_summary = summary_fields(etcd_read(
+                        '/monitoring/summary/nodes/%s' % node_id
+                    ))
+                current_node_summary['status'] = \
+                    NS.node_liveness.get_status(node_id)
                 summary.append(current_node_summary)
             except EtcdKeyNotFound:
                 exs = "%s.Failed to fetch summary for node with id: %s" % (
@@ -216,6 +368,43 @@ class PerformanceMonitoringEtcdCentralStore(central_store.EtcdCentralStore):
             else:
                 return summary, 206, exs
 
+    def get_node_summary_changes(self, since):
+        # {'version', 'full', 'changed': [summary, ...], 'removed':
+        # [node_id, ...]} of the node summaries after version since, all
+        # the summaries as changed when the log no longer goes back to it
+        published = self.get_snapshot_summary('node_changes')
+        if published is None:
+            published = self.node_changes.to_json()
+        changes = changes_since(published, since)
+        if changes is None:
+            summary, ret_code, exs = self.get_node_summary()
+            removed = []
+        else:
+            summary, ret_code, exs = self.get_node_summary(changes[0])
+            removed = changes[1]
+        return {
+            'version': published['version'],
+            'full': changes is None,
+            'changed': summary,
+            'removed': removed,
+        }, ret_code, exs
+
+    def get_top_nodes(self, by, n, cluster=None):
+        # Summaries of the n nodes ranked highest by, highest first, from
+        # the ranking published by the summariser. A process with neither
+        # ranks the summaries read from etcd.
+        indexes = self.get_snapshot_summary('node_ranking')
+        if indexes is not None:
+            ranked = top_of(indexes.get(by, {}).get(cluster or '', []), n)
+        elif self.node_ranking.entries:
+            ranked = self.node_ranking.top(by, n, cluster)
+        else:
+            ranking = NodeRanking()
+            for summary in self.get_node_summary()[0]:
+                ranking.update(summary.get('node_id'), summary)
+            ranked = ranking.top(by, n, cluster)
+        return self.get_node_summary([node_id for _, node_id in ranked])
+
     def get_nodes_details(self):
         nodes_dets = []
         try:
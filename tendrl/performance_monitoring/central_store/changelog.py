@@ -0,0 +1,99 @@
+from collections import deque
+import json
+import time
+
+from tendrl.performance_monitoring.central_store.snapshot \
+    import summary_fields
+
+# Changes kept for the clients polling with ?since=
+DEFAULT_SIZE = 4096
+
+
+def fingerprint(summary):
+    # The summary without its version and the updated_at times, which
+    # move every cycle whether or not anything else did
+    fields = {}
+    for name, value in summary_fields(summary).iteritems():
+        if name == 'version':
+            continue
+        if isinstance(value, dict):
+            value = dict(
+                (key, item) for key, item in value.iteritems()
+                if key != 'updated_at'
+            )
+        fields[name] = value
+    return json.dumps(fields, sort_keys=True, default=str)
+
+
+def changes_since(published, since):
+    """Node ids changed and removed after version since
+
+    published is NodeChangeLog.to_json(), possibly read back from the
+    summary snapshot. None when the changes after since are no longer
+    all in the log, or since is not a version of this log, and a full
+    snapshot has to be sent instead.
+    """
+    if since < published['floor'] or since > published['version']:
+        return None
+    # The latest change of each node, newest first
+    changed = {}
+    for version, node_id, removed in reversed(published['log']):
+        if version <= since:
+            break
+        changed.setdefault(node_id, removed)
+    return (
+        sorted(node_id for node_id, removed in changed.iteritems()
+               if not removed),
+        sorted(node_id for node_id, removed in changed.iteritems()
+               if removed)
+    )
+
+
+class NodeChangeLog(object):
+    """Versions of the node summaries and the last size changes to them
+
+    Every summary that differs from the node's previous one, other than
+    in its updated_at times, and every node removed gets the next version
+    and an entry in the log. Versions start at the process start time in
+    milliseconds, so they keep increasing across restarts and versions a
+    client got from a previous process fall below the floor.
+    """
+
+    def __init__(self, size=DEFAULT_SIZE):
+        self.version = int(time.time() * 1000)
+        # Changes after floor are all in the log
+        self.floor = self.version
+        # [version, node_id, removed], oldest first
+        self.log = deque()
+        self.size = size
+        # node_id -> (version, fingerprint) of its current summary
+        self.nodes = {}
+
+    def append(self, node_id, removed):
+        self.version += 1
+        self.log.append([self.version, node_id, removed])
+        while len(self.log) > self.size:
+            self.floor = self.log.popleft()[0]
+        return self.version
+
+    def record(self, node_id, summary):
+        # The version of the node's summary, a new one if it changed
+        current = fingerprint(summary)
+        version, previous = self.nodes.get(node_id, (None, None))
+        if current != previous:
+            version = self.append(node_id, False)
+            self.nodes[node_id] = (version, current)
+        return version
+
+    def retain(self, node_ids):
+        node_ids = set(node_ids)
+        for node_id in sorted(set(self.nodes) - node_ids):
+            del self.nodes[node_id]
+            self.append(node_id, True)
+
+    def to_json(self):
+        return {
+            'version': self.version,
+            'floor': self.floor,
+            'log': list(self.log),
+        }
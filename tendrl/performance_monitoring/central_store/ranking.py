@@ -0,0 +1,91 @@
+import bisect
+import json
+import math
+
+# Rankings of the nodes: name -> node summary field and the key of its
+# value, None when the field is the value
+RANKINGS = {
+    'cpu': ('cpu_usage', 'percent_used'),
+    'memory': ('memory_usage', 'percent_used'),
+    'storage': ('storage_usage', 'percent_used'),
+    'alerts': ('alert_count', None),
+}
+
+
+def ranked_value(summary, by):
+    # The node's value in ranking by, None when not summarised yet
+    field, key = RANKINGS[by]
+    value = summary.get(field)
+    try:
+        if key is not None:
+            if isinstance(value, basestring):
+                value = json.loads(value)
+            value = value[key]
+        value = float(value)
+    except (ValueError, TypeError, KeyError):
+        return None
+    if math.isnan(value):
+        return None
+    return value
+
+
+def top_of(index, n):
+    # The n highest [value, node_id] pairs of a sorted index, highest
+    # first
+    return index[:-n - 1:-1] if n else []
+
+
+class NodeRanking(object):
+    """The nodes sorted by each of RANKINGS, fleet wide and per cluster
+
+    Each index is a list of [value, node_id] kept sorted as node summaries
+    change: bisect finds a node's old entry and its new place in
+    O(log n), and the n highest nodes are the last n entries. The
+    indexes are plain lists so that they are published to the api
+    workers as they are.
+    """
+
+    def __init__(self, indexes=None):
+        # by -> cluster name, '' for all the nodes -> [[value, node_id]]
+        self.indexes = indexes or dict((by, {}) for by in RANKINGS)
+        # node_id -> [(by, cluster name, value), ...] the node is indexed
+        # at, for the rankings maintained in this process
+        self.entries = {}
+
+    def update(self, node_id, summary):
+        entries = []
+        for by in RANKINGS:
+            value = ranked_value(summary, by)
+            if value is None:
+                continue
+            entries.append((by, '', value))
+            if summary.get('cluster_name'):
+                entries.append((by, summary['cluster_name'], value))
+        if entries == self.entries.get(node_id):
+            return
+        self.remove(node_id)
+        for by, cluster, value in entries:
+            bisect.insort(
+                self.indexes[by].setdefault(cluster, []),
+                [value, node_id]
+            )
+        self.entries[node_id] = entries
+
+    def remove(self, node_id):
+        for by, cluster, value in self.entries.pop(node_id, []):
+            index = self.indexes[by][cluster]
+            del index[bisect.bisect_left(index, [value, node_id])]
+            if not index:
+                del self.indexes[by][cluster]
+
+    def retain(self, node_ids):
+        node_ids = set(node_ids)
+        for node_id in set(self.entries) - node_ids:
+            self.remove(node_id)
+
+    def top(self, by, n, cluster=None):
+        # [[value, node_id], ...] of the n nodes ranked highest by
+        return top_of(self.indexes[by].get(cluster or '', []), n)
+
+    def to_json(self):
+        return self.indexes
@@ -0,0 +1,137 @@
+import gevent
+import json
+import mmap
+import os
+import struct
+import time
+
+from tendrl.performance_monitoring.exceptions \
+    import TendrlPerformanceMonitoringException
+
+# Sequence number, odd while a snapshot is being written, and the length
+# of the serialized snapshot that follows the header
+HEADER = struct.Struct('=QQ')
+DEFAULT_SIZE = 4 * 1024 * 1024
+READ_ATTEMPTS = 100
+# Attributes of the summary objects that are not part of a summary
+INTERNAL_FIELDS = ['_etcd_cls', 'value', '_defs', 'list']
+
+
+def summary_fields(summary):
+    return dict(
+        (name, value) for name, value in summary.iteritems()
+        if name not in INTERNAL_FIELDS
+    )
+
+
+class SummarySnapshot(object):
+    """Summaries shared with the api workers through a memory-mapped file
+
+    The process running the summarisers creates the file, collects the
+    summaries they compute and publishes them as one serialized snapshot
+    at the end of each cycle. The api workers map the same file read only.
+    Writes are guarded by a seqlock: the writer makes the sequence number
+    odd, rewrites the snapshot and makes it even again, and a reader that
+    saw it odd or changed while copying the snapshot out reads it again.
+    Readers decode a snapshot once and serve it until the sequence number
+    moves, so most reads only look at the header.
+    """
+
+    def __init__(self, path, create=False, size=DEFAULT_SIZE):
+        self.path = path
+        self.writable = create
+        if create:
+            self.fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+            # A zero filled header reads as never published
+            os.ftruncate(self.fd, max(size, HEADER.size))
+        else:
+            self.fd = os.open(path, os.O_RDONLY)
+        self.mmap = None
+        self._map()
+        self.data = {
+            'node_ids': [],
+            'nodes': {},
+            'clusters': {},
+            'systems': {},
+        }
+        self._seq = 0
+        self._snapshot = None
+
+    def _map(self):
+        if self.mmap is not None:
+            self.mmap.close()
+        if self.writable:
+            prot = mmap.PROT_READ | mmap.PROT_WRITE
+        else:
+            prot = mmap.PROT_READ
+        self.mmap = mmap.mmap(self.fd, 0, mmap.MAP_SHARED, prot)
+
+    def set(self, name, value):
+        self.data[name] = value
+
+    def update(self, section, key, summary):
+        self.data[section][key] = summary_fields(summary)
+
+    def retain(self, section, keys):
+        keys = set(keys)
+        for key in set(self.data[section]) - keys:
+            del self.data[section][key]
+
+    def publish(self):
+        seq = HEADER.unpack_from(self.mmap, 0)[0]
+        payload = json.dumps(
+            {
+                'generation': seq // 2 + 1,
+                'published_at': time.time(),
+                'summaries': self.data,
+            },
+            default=str
+        )
+        HEADER.pack_into(self.mmap, 0, seq + 1, 0)
+        end = HEADER.size + len(payload)
+        if end > len(self.mmap):
+            # Readers remap when the length outgrows their mapping
+            self.mmap.resize(max(end, 2 * len(self.mmap)))
+        self.mmap[HEADER.size:end] = payload
+        HEADER.pack_into(self.mmap, 0, seq + 1, len(payload))
+        HEADER.pack_into(self.mmap, 0, seq + 2, len(payload))
+        self._seq = seq + 2
+        self._snapshot = json.loads(payload)
+
+    def read(self):
+        """Return the last published snapshot, None if there is none yet"""
+        for _ in range(READ_ATTEMPTS):
+            seq, length = HEADER.unpack_from(self.mmap, 0)
+            if seq == self._seq:
+                return self._snapshot
+            if seq % 2:
+                # Being written
+                gevent.sleep(0.001)
+                continue
+            end = HEADER.size + length
+            if end > len(self.mmap):
+                self._map()
+                continue
+            payload = self.mmap[HEADER.size:end]
+            if HEADER.unpack_from(self.mmap, 0)[0] != seq:
+                continue
+            self._snapshot = json.loads(payload)
+            self._seq = seq
+            return self._snapshot
+        raise TendrlPerformanceMonitoringException(
+            'Summary snapshot %s is being rewritten' % self.path
+        )
+
+    def get(self, name, key=None):
+        # None when nothing was published, or the key is not in it
+        snapshot = self.read()
+        if snapshot is None:
+            return None
+        value = snapshot['summaries'].get(name)
+        if key is None or value is None:
+            return value
+        return value.get(key)
+
+    def close(self):
+        self.mmap.close()
+        os.close(self.fd)
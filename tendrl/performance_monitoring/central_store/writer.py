@@ -0,0 +1,137 @@
+from etcd import EtcdException
+import time
+
+from tendrl.commons.event import Event
+from tendrl.commons.message import ExceptionMessage
+from tendrl.performance_monitoring.central_store.snapshot \
+    import summary_fields
+from tendrl.performance_monitoring import instrumentation
+
+# Summary section -> etcd path of a summary
+SUMMARY_PATHS = {
+    'nodes': 'monitoring/summary/nodes/%s',
+    'clusters': 'monitoring/summary/clusters/%s',
+    'systems': 'monitoring/summary/system/%s',
+}
+
+SUMMARY_SAVES = instrumentation.counter(
+    'tendrl_pm_summary_saves_total',
+    'Summaries saved, by whether any of their keys had to be written',
+    ['outcome']
+)
+SUMMARY_KEYS = instrumentation.counter(
+    'tendrl_pm_summary_keys_total',
+    'Keys of the saved summaries written to etcd, skipped as unchanged '
+    'since last written, or failed to be written',
+    ['outcome']
+)
+
+
+def flatten(fields, prefix=''):
+    # {etcd key relative to the summary: value}, a key per leaf of the
+    # nested dicts, as utils.read reads them back
+    keys = {}
+    for name, value in fields.iteritems():
+        if name.startswith('_'):
+            continue
+        if isinstance(value, dict):
+            keys.update(flatten(value, '%s%s/' % (prefix, name)))
+        else:
+            keys['%s%s' % (prefix, name)] = value
+    return keys
+
+
+def changed_keys(current, persisted):
+    # The keys of current whose values differ from persisted. An
+    # updated_at only counts along with another key next to it, so that
+    # recomputing an unchanged value does not rewrite its time.
+    changed = {}
+    for key, value in current.iteritems():
+        if key.rpartition('/')[2] == 'updated_at':
+            continue
+        if key not in persisted or persisted[key] != value:
+            changed[key] = value
+    parents = set(key.rpartition('/')[0] for key in changed)
+    for key, value in current.iteritems():
+        parent, _, name = key.rpartition('/')
+        if name == 'updated_at' and (
+            key not in persisted or parent in parents
+        ):
+            changed[key] = value
+    return changed
+
+
+class SummaryWriter(object):
+    """Writes the summaries to etcd, only their keys changed since written
+
+    The summary objects' save() hands their fields here. Each summary's
+    keys are compared to those last written for it, the changed ones are
+    kept until flush(), called at the end of each summary cycle, and a
+    summary saved unchanged costs no write at all. A summary is written
+    whole again once rewrite_interval seconds have passed since it last
+    was, so that keys lost from etcd are restored and its updated_at
+    times are no older than that.
+    """
+
+    def __init__(self, rewrite_interval=3600):
+        self.rewrite_interval = rewrite_interval
+        # path -> {key: value} last written
+        self.persisted = {}
+        # path -> time it was last written whole
+        self.written_at = {}
+        # path -> {key: value} to write at the next flush
+        self.pending = {}
+
+    def save(self, path, summary):
+        current = flatten(summary_fields(summary))
+        persisted = self.persisted.get(path, {})
+        if time.time() - self.written_at.get(path, 0) >= \
+                self.rewrite_interval:
+            persisted = {}
+        changed = changed_keys(current, persisted)
+        SUMMARY_KEYS.inc(len(current) - len(changed), outcome='skipped')
+        if changed:
+            self.pending[path] = changed
+            SUMMARY_SAVES.inc(outcome='changed')
+        else:
+            self.pending.pop(path, None)
+            SUMMARY_SAVES.inc(outcome='unchanged')
+
+    def flush(self):
+        pending, self.pending = self.pending, {}
+        for path, changed in sorted(pending.iteritems()):
+            whole = path not in self.persisted or \
+                time.time() - self.written_at.get(path, 0) >= \
+                self.rewrite_interval
+            persisted = self.persisted.setdefault(path, {})
+            for key, value in sorted(changed.iteritems()):
+                try:
+                    NS.etcd_orm.client.write('/%s/%s' % (path, key), value)
+                except EtcdException as ex:
+                    # What was not written is compared again, and written,
+                    # at the next save
+                    SUMMARY_KEYS.inc(outcome='failed')
+                    Event(
+                        ExceptionMessage(
+                            priority="error",
+                            publisher=NS.publisher_id,
+                            payload={"message": 'Failed to write summary '
+                                                '%s to etcd.' % path,
+                                     "exception": ex
+                                     }
+                        )
+                    )
+                    return
+                persisted[key] = value
+                SUMMARY_KEYS.inc(outcome='written')
+            if whole:
+                self.written_at[path] = time.time()
+
+    def retain(self, section, keys):
+        # Forget the summaries of the section other than those of keys
+        paths = set(SUMMARY_PATHS[section] % key for key in keys)
+        prefix = SUMMARY_PATHS[section] % ''
+        for state in (self.persisted, self.written_at, self.pending):
+            for path in state.keys():
+                if path.startswith(prefix) and path not in paths:
+                    del state[path]
@@ -1,7 +1,5 @@
 import ast
-from etcd import EtcdConnectionFailed
-import gevent.event
-import gevent.greenlet
+import gevent
 
 from tendrl.commons.event import Event
 from tendrl.commons.message import ExceptionMessage
@@ -10,7 +8,7 @@ from tendrl.performance_monitoring.exceptions \
 from tendrl.performance_monitoring.utils import initiate_config_generation
 
 
-class ConfigureNodeMonitoring(gevent.greenlet.Greenlet):
+class ConfigureNodeMonitoring(object):
     def init_monitoring(self):
         try:
             node_dets = NS.central_store_thread.get_nodes_details()
@@ -86,30 +84,4 @@ class ConfigureNodeMonitoring(gevent.greenlet.Greenlet):
             )
 
     def __init__(self):
-        super(ConfigureNodeMonitoring, self).__init__()
-        try:
-            self.monitoring_config_init_nodes = []
-            self._complete = gevent.event.Event()
-        except TendrlPerformanceMonitoringException as ex:
-            raise ex
-
-    def _run(self):
-        try:
-            while not self._complete.is_set():
-                gevent.sleep(0.1)
-                self.init_monitoring()
-                gevent.sleep(10)
-        except (EtcdConnectionFailed, Exception) as e:
-            Event(
-                ExceptionMessage(
-                    priority="error",
-                    publisher=NS.publisher_id,
-                    payload={"message": 'Exception caught while watching '
-                                        'alerts',
-                             "exception": e
-                             }
-                )
-            )
-
-    def stop(self):
-        self._complete.set()
+        self.monitoring_config_init_nodes = []
@@ -1,8 +1,18 @@
 CLUSTER_UTILIZATION = "cluster_utilization"
 SYSTEM_UTILIZATION = "system_utilization"
+CLUSTER_NODE_UTILIZATION = "cluster_node_utilization"
 USED = "used"
 TOTAL = "total"
 PERCENT_USED = "percent_used"
 STATUS_UP = "up"
 STATUS_NOT_MONITORED = "not_monitored"
 STATUS_DOWN = "down"
+AGGREGATE_SUM = "sum"
+AGGREGATE_AVERAGE = "average"
+AGGREGATE_MAX = "max"
+AGGREGATE_MIN = "min"
+AGGREGATES = [AGGREGATE_SUM, AGGREGATE_AVERAGE, AGGREGATE_MAX, AGGREGATE_MIN]
+PERCENTILE_50 = "p50"
+PERCENTILE_90 = "p90"
+PERCENTILE_99 = "p99"
+MAX = "max"
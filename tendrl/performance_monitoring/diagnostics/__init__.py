@@ -0,0 +1,89 @@
+import os
+import sys
+
+from gevent import monkey
+
+# The diagnostics samplers must keep running while the gevent hub is busy,
+# so they use real OS threads and sleeps rather than the patched ones.
+start_new_thread = monkey.get_original('thread', 'start_new_thread')
+get_ident = monkey.get_original('thread', 'get_ident')
+real_sleep = monkey.get_original('time', 'sleep')
+allocate_lock = monkey.get_original('thread', 'allocate_lock')
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Module (relative to the package) -> task its frames are attributed to
+TASK_MODULES = {
+    'aggregator/node_summary.py': 'NodeSummarise',
+    'aggregator/cluster_summary.py': 'ClusterSummarise',
+    'aggregator/node_liveness.py': 'NodeLivenessTracker',
+    'configure/configure_cluster_monitoring.py':
+        'ConfigureClusterMonitoring',
+    'configure/configure_node_monitoring.py': 'ConfigureNodeMonitoring',
+}
+IDLE = 'idle'
+
+
+def frame_label(code):
+    filename = code.co_filename
+    if filename.startswith(PACKAGE_DIR):
+        filename = filename[len(PACKAGE_DIR) + 1:]
+    else:
+        filename = os.path.basename(filename)
+    if filename.endswith('.pyc'):
+        filename = filename[:-1]
+    return filename, '%s:%s' % (filename, code.co_name)
+
+
+def walk_stack(frame):
+    # Frames from the outermost to the innermost
+    frames = []
+    while frame is not None:
+        frames.append(frame)
+        frame = frame.f_back
+    frames.reverse()
+    return frames
+
+
+def attribute(frames):
+    """Name the task a stack belongs to
+
+    The first frame of one of the periodic tasks' modules names the task.
+    A stack going through flask's dispatch_request is attributed to the
+    view function it dispatched to.
+    """
+    for index, frame in enumerate(frames):
+        code = frame.f_code
+        filename, _ = frame_label(code)
+        if filename in TASK_MODULES:
+            return TASK_MODULES[filename]
+        package = os.path.basename(os.path.dirname(code.co_filename))
+        if all((
+            code.co_name == 'dispatch_request',
+            package == 'flask',
+            index + 1 < len(frames)
+        )):
+            return 'request:%s' % frames[index + 1].f_code.co_name
+    return 'other'
+
+
+def is_idle(frame):
+    # The hub waiting in its event loop, with nothing else to run
+    code = frame.f_code
+    if code.co_name != 'run':
+        return False
+    return os.path.basename(code.co_filename).startswith('hub.py')
+
+
+def collapse_stack(frame):
+    """Collapsed (flamegraph) form of a stack, rooted at its task"""
+    if is_idle(frame):
+        return IDLE
+    frames = walk_stack(frame)
+    labels = [frame_label(stack_frame.f_code)[1] for stack_frame in frames]
+    labels.insert(0, attribute(frames))
+    return ';'.join(labels)
+
+
+def current_frame(thread_id):
+    return sys._current_frames().get(thread_id)
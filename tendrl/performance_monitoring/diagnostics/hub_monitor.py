@@ -0,0 +1,161 @@
+from collections import deque
+import greenlet
+from gevent import monkey
+import time
+import traceback
+
+from tendrl.performance_monitoring.diagnostics import attribute
+from tendrl.performance_monitoring.diagnostics import current_frame
+from tendrl.performance_monitoring.diagnostics import frame_label
+from tendrl.performance_monitoring.diagnostics import get_ident
+from tendrl.performance_monitoring.diagnostics import is_idle
+from tendrl.performance_monitoring.diagnostics import PACKAGE_DIR
+from tendrl.performance_monitoring.diagnostics import real_sleep
+from tendrl.performance_monitoring.diagnostics import start_new_thread
+from tendrl.performance_monitoring.diagnostics import walk_stack
+from tendrl.performance_monitoring import instrumentation
+
+allocate_lock = monkey.get_original('thread', 'allocate_lock')
+
+HUB_BLOCKS = instrumentation.counter(
+    'tendrl_pm_hub_blocks_total',
+    'Times a greenlet held the gevent hub longer than the threshold',
+    ['task']
+)
+HUB_BLOCK_SECONDS = instrumentation.histogram(
+    'tendrl_pm_hub_block_seconds',
+    'Time a greenlet held the gevent hub, for blocks over the threshold',
+    ['task']
+)
+
+
+def block_location(frames):
+    # Innermost frame of the package, where the blocking call was made
+    # from, else the innermost frame
+    for frame in reversed(frames):
+        if frame.f_code.co_filename.startswith(PACKAGE_DIR):
+            break
+    return '%s:%d' % (frame_label(frame.f_code)[1], frame.f_lineno)
+
+
+class HubBlockMonitor(object):
+    """Reports greenlets holding the gevent hub longer than threshold
+
+    A greenlet trace function counts the switches between greenlets. A
+    separate OS thread checks the count every interval: when it has not
+    moved for threshold seconds and the main thread is not the hub
+    waiting for events, the running greenlet is blocking every other
+    one. Its stack is then captured, and the block is counted against
+    the code location it was made from. Durations are accurate to the
+    interval.
+    """
+
+    def __init__(self, threshold=0.1, interval=None, history=50):
+        self.threshold = threshold
+        self.interval = interval or max(threshold / 5.0, 0.001)
+        # location -> count, total and max seconds, task and last stack
+        self.locations = {}
+        # The last blocks, most recent last
+        self.recent = deque(maxlen=history)
+        self.switches = 0
+        self.running = False
+        self.target_thread = None
+        self._previous_trace = None
+        self._lock = allocate_lock()
+
+    def start(self):
+        if self.running:
+            return
+        self.target_thread = get_ident()
+        self._previous_trace = greenlet.settrace(self._trace)
+        self.running = True
+        start_new_thread(self._watch, ())
+
+    def stop(self):
+        if not self.running:
+            return
+        self.running = False
+        greenlet.settrace(self._previous_trace)
+
+    def _trace(self, event, args):
+        self.switches += 1
+        if self._previous_trace is not None:
+            self._previous_trace(event, args)
+
+    def _watch(self):
+        switches = self.switches
+        since = time.time()
+        block = None
+        while self.running:
+            real_sleep(self.interval)
+            now = time.time()
+            if self.switches != switches:
+                if block is not None:
+                    self._end_block(block, now - since)
+                    block = None
+                switches = self.switches
+                since = now
+                continue
+            if block is not None or now - since < self.threshold:
+                continue
+            frame = current_frame(self.target_thread)
+            if frame is None or is_idle(frame):
+                continue
+            block = self._start_block(frame, since)
+            del frame
+
+    def _start_block(self, frame, since):
+        frames = walk_stack(frame)
+        block = {
+            'location': block_location(frames),
+            'task': attribute(frames),
+            'started_at': since,
+            'stack': ''.join(traceback.format_stack(frame)),
+        }
+        with self._lock:
+            location = self.locations.setdefault(block['location'], {
+                'count': 0,
+                'total_seconds': 0.0,
+                'max_seconds': 0.0,
+            })
+            location['count'] += 1
+            location['task'] = block['task']
+            location['stack'] = block['stack']
+        HUB_BLOCKS.inc(task=block['task'])
+        return block
+
+    def _end_block(self, block, seconds):
+        block['seconds'] = seconds
+        with self._lock:
+            # Gone if reset while the block lasted
+            location = self.locations.get(block['location'])
+            if location is not None:
+                location['total_seconds'] += seconds
+                location['max_seconds'] = max(
+                    location['max_seconds'],
+                    seconds
+                )
+            self.recent.append(block)
+        HUB_BLOCK_SECONDS.observe(seconds, task=block['task'])
+
+    def stats(self):
+        with self._lock:
+            locations = [
+                dict(location, location=name)
+                for name, location in self.locations.iteritems()
+            ]
+            recent = list(self.recent)
+        return {
+            'threshold': self.threshold,
+            'locations': sorted(
+                locations,
+                key=lambda location: location['total_seconds'],
+                reverse=True
+            ),
+            'recent': recent,
+        }
+
+    def reset(self):
+        with self._lock:
+            self.locations = {}
+            self.recent.clear()
@@ -0,0 +1,95 @@
+from collections import Counter
+import time
+
+from tendrl.performance_monitoring.diagnostics import allocate_lock
+from tendrl.performance_monitoring.diagnostics import collapse_stack
+from tendrl.performance_monitoring.diagnostics import current_frame
+from tendrl.performance_monitoring.diagnostics import get_ident
+from tendrl.performance_monitoring.diagnostics import IDLE
+from tendrl.performance_monitoring.diagnostics import real_sleep
+from tendrl.performance_monitoring.diagnostics import start_new_thread
+from tendrl.performance_monitoring.exceptions \
+    import TendrlPerformanceMonitoringException
+
+
+class SamplingProfiler(object):
+    """Statistical profiler of the greenlets of the process
+
+    All greenlets share the main OS thread, so sampling that thread's
+    current frame from a separate OS thread observes whichever greenlet
+    holds the hub at that instant. Sampling costs nothing in the main
+    thread beyond the GIL hand-offs.
+
+    Each run has its own generation. A sampler thread only records, and
+    ends the run, while its generation is the current one, so a thread
+    of a stopped run still asleep when the next run starts exits on
+    waking instead of sampling into it. The counts are only read and
+    written under the lock.
+    """
+
+    def __init__(self):
+        self.lock = allocate_lock()
+        self.stacks = Counter()
+        self.samples = 0
+        self.running = False
+        self.generation = 0
+        self.deadline = None
+        self.interval = None
+        self.target_thread = None
+
+    def start(self, seconds, interval=0.005):
+        with self.lock:
+            if self.running:
+                raise TendrlPerformanceMonitoringException(
+                    'A profile is already in progress'
+                )
+            self.generation += 1
+            self.stacks = Counter()
+            self.samples = 0
+            self.interval = interval
+            self.deadline = time.time() + seconds
+            self.target_thread = get_ident()
+            self.running = True
+            start_new_thread(self._sample, (self.generation,))
+
+    def stop(self):
+        with self.lock:
+            self.generation += 1
+            self.running = False
+
+    def _sample(self, generation):
+        while time.time() < self.deadline:
+            frame = current_frame(self.target_thread)
+            stack = collapse_stack(frame) if frame is not None else None
+            del frame
+            with self.lock:
+                if self.generation != generation:
+                    return
+                if stack is not None:
+                    self.stacks[stack] += 1
+                    self.samples += 1
+            real_sleep(self.interval)
+        with self.lock:
+            if self.generation == generation:
+                self.running = False
+
+    def counts(self):
+        # A copy of the stack counts, the sampler may still be adding to
+        # them
+        with self.lock:
+            return Counter(self.stacks)
+
+    def collapsed(self, include_idle=False):
+        # One "task;frame;frame count" line per distinct stack, as read
+        # by flamegraph.pl and speedscope
+        return ''.join(
+            '%s %d\n' % (stack, count)
+            for stack, count in sorted(self.counts().items())
+            if include_idle or stack != IDLE
+        )
+
+    def task_totals(self):
+        totals = Counter()
+        for stack, count in self.counts().iteritems():
+            totals[stack.split(';', 1)[0]] += count
+        return dict(totals)
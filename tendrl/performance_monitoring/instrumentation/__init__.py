@@ -0,0 +1,238 @@
+import bisect
+import functools
+import gevent
+import gevent.event
+import gevent.greenlet
+import re
+import time
+
+from tendrl.commons.event import Event
+from tendrl.commons.message import ExceptionMessage
+
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60
+)
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join(
+        '%s="%s"' % (
+            name,
+            str(value).replace('\\', '\\\\').replace('"', '\\"')
+        ) for name, value in labels
+    )
+
+
+class Metric(object):
+    metric_type = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                'Metric %s expects labels %s' % (self.name, self.labelnames)
+            )
+        return tuple(labels[name] for name in self.labelnames)
+
+    def samples(self):
+        # (sample name, ((label, value), ...), value) tuples
+        for key, value in sorted(self.values.items()):
+            yield self.name, tuple(zip(self.labelnames, key)), value
+
+    def render(self):
+        lines = [
+            '# HELP %s %s' % (self.name, self.documentation),
+            '# TYPE %s %s' % (self.name, self.metric_type)
+        ]
+        for name, labels, value in self.samples():
+            lines.append('%s%s %s' % (
+                name,
+                format_labels(labels),
+                format_value(value)
+            ))
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    metric_type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    metric_type = 'gauge'
+
+    def set(self, value, **labels):
+        self.values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+
+class Histogram(Metric):
+    metric_type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(),
+                 buckets=DEFAULT_BUCKETS):
+        super(Histogram, self).__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        if key not in self.values:
+            # per bucket counts (non cumulative), sum, count
+            self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        state = self.values[key]
+        state[0][bisect.bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def samples(self):
+        for key, (counts, total, count) in sorted(self.values.items()):
+            labels = tuple(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(
+                self.buckets + (float('inf'),),
+                counts
+            ):
+                cumulative += bucket_count
+                yield (
+                    '%s_bucket' % self.name,
+                    labels + (('le', format_value(bound)),),
+                    cumulative
+                )
+            yield '%s_sum' % self.name, labels, total
+            yield '%s_count' % self.name, labels, count
+
+
+class _Timer(object):
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.histogram.observe(time.time() - self.start, **self.labels)
+
+    def __call__(self, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _Timer(self.histogram, self.labels):
+                return func(*args, **kwargs)
+        return wrapper
+
+
+class Registry(object):
+    def __init__(self):
+        self.metrics = {}
+
+    def _get_or_create(self, metric_cls, name, *args, **kwargs):
+        if name not in self.metrics:
+            self.metrics[name] = metric_cls(name, *args, **kwargs)
+        metric = self.metrics[name]
+        if not isinstance(metric, metric_cls):
+            raise ValueError(
+                'Metric %s already registered as a %s' % (
+                    name,
+                    metric.metric_type
+                )
+            )
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(),
+                  buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(
+            Histogram,
+            name,
+            documentation,
+            labelnames,
+            buckets=buckets
+        )
+
+    def render(self):
+        # Prometheus text exposition format 0.0.4
+        return '\n'.join(
+            self.metrics[name].render() for name in sorted(self.metrics)
+        ) + '\n'
+
+    def samples(self):
+        for name in sorted(self.metrics):
+            for sample in self.metrics[name].samples():
+                yield sample
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+
+
+def carbon_name(name, labels):
+    return '.'.join(
+        ['performance_monitoring', name] + [
+            re.sub('[^A-Za-z0-9_+-]', '_', str(value))
+            for _, value in labels
+        ]
+    )
+
+
+class SelfMetricsPusher(gevent.greenlet.Greenlet):
+    """Periodically pushes the self metrics to the time series db"""
+
+    def __init__(self, interval=60, registry=REGISTRY):
+        super(SelfMetricsPusher, self).__init__()
+        self.interval = interval
+        self.registry = registry
+        self._complete = gevent.event.Event()
+
+    def push(self):
+        plugin = NS.time_series_db_manager.get_plugin()
+        for name, labels, value in self.registry.samples():
+            plugin.push_metrics(carbon_name(name, labels), value)
+
+    def _run(self):
+        while not self._complete.is_set():
+            try:
+                self.push()
+            except Exception as ex:
+                Event(
+                    ExceptionMessage(
+                        priority="debug",
+                        publisher=NS.publisher_id,
+                        payload={"message": 'Failed to push self metrics.',
+                                 "exception": ex
+                                 }
+                    )
+                )
+            gevent.sleep(self.interval)
+
+    def stop(self):
+        self._complete.set()
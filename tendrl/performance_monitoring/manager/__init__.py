@@ -1,11 +1,14 @@
 import etcd
 from flask import Flask
+from flask import g
 from flask import request
 from flask import Response
+import gevent
 import json
 import multiprocessing
 import os
 import signal
+import time
 from uuid import UUID
 from tendrl.commons.config import ConfigNotFound
 from tendrl.commons.event import Event
@@ -15,23 +18,105 @@ from tendrl.commons import TendrlNS
 from tendrl.performance_monitoring import PerformanceMonitoringNS
 from tendrl.performance_monitoring.aggregator.cluster_summary \
     import ClusterSummarise
+from tendrl.performance_monitoring.aggregator.node_liveness \
+    import NodeLivenessTracker
 from tendrl.performance_monitoring.aggregator.node_summary import NodeSummarise
 from tendrl.performance_monitoring.central_store \
     import PerformanceMonitoringEtcdCentralStore
+from tendrl.performance_monitoring.central_store.changelog \
+    import NodeChangeLog
+from tendrl.performance_monitoring.central_store.ranking import RANKINGS
+from tendrl.performance_monitoring.central_store.snapshot \
+    import SummarySnapshot
+from tendrl.performance_monitoring.central_store.writer \
+    import SummaryWriter
 from tendrl.performance_monitoring.configure.configure_cluster_monitoring\
     import ConfigureClusterMonitoring
 from tendrl.performance_monitoring.configure.configure_node_monitoring \
     import ConfigureNodeMonitoring
+from tendrl.performance_monitoring.diagnostics.hub_monitor \
+    import HubBlockMonitor
+from tendrl.performance_monitoring.diagnostics.profiler \
+    import SamplingProfiler
 from tendrl.performance_monitoring import constants as \
     pm_consts
 from tendrl.performance_monitoring.exceptions \
     import TendrlPerformanceMonitoringException
+from tendrl.performance_monitoring import instrumentation
+from tendrl.performance_monitoring.instrumentation import SelfMetricsPusher
+from tendrl.performance_monitoring.manager.api_server import APIServer
+from tendrl.performance_monitoring.manager.api_server import parse_bool
+from tendrl.performance_monitoring.manager.summary_stream \
+    import SECTIONS
+from tendrl.performance_monitoring.manager.summary_stream \
+    import SummaryStream
 from tendrl.performance_monitoring.sds import SDSMonitoringManager
+from tendrl.performance_monitoring.sds.process_pool \
+    import SummaryProcessPool
+from tendrl.performance_monitoring.scheduler import Scheduler
+from tendrl.performance_monitoring.time_series_db.cache import parse_time
+from tendrl.performance_monitoring.time_series_db.cache \
+    import RangeQueryCache
+from tendrl.performance_monitoring.time_series_db.carbon_relay \
+    import CarbonRelay
 from tendrl.performance_monitoring.time_series_db.manager \
     import TimeSeriesDBManager
 
 app = Flask(__name__)
 
+MAX_PROFILE_SECONDS = 300
+SUMMARY_SNAPSHOT_PATH = '/var/run/tendrl/performance-monitoring.snapshot'
+
+API_REQUESTS = instrumentation.counter(
+    'tendrl_pm_api_requests_total',
+    'API requests served per route',
+    ['route', 'method', 'status']
+)
+API_REQUEST_SECONDS = instrumentation.histogram(
+    'tendrl_pm_api_request_seconds',
+    'Latency of API requests per route',
+    ['route']
+)
+
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.time()
+
+
+@app.after_request
+def record_request_metrics(response):
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    API_REQUESTS.inc(
+        route=route,
+        method=request.method,
+        status=response.status_code
+    )
+    API_REQUEST_SECONDS.observe(
+        time.time() - g.request_start,
+        route=route
+    )
+    return response
+
+
+@app.route("/monitoring/self/metrics")
+def get_self_metrics():
+    return Response(
+        instrumentation.REGISTRY.render(),
+        status=200,
+        mimetype='text/plain; version=0.0.4'
+    )
+
+
+def get_time_range():
+    # The from and until arguments of the stats requests, as graphite-web
+    # takes them
+    now = int(time.time())
+    return (
+        parse_time(request.args.get('from'), now),
+        parse_time(request.args.get('until'), now)
+    )
+
 
 @app.route("/monitoring/nodes/<node_id>/<resource_name>/stats")
 def get_nodestats(node_id, resource_name):
@@ -40,9 +125,129 @@ def get_nodestats(node_id, resource_name):
             node_id
         )
         return Response(
-            NS.time_series_db_manager.\
-            get_plugin().\
-            get_metric_stats(node_name, resource_name),
+            NS.time_series_db_manager.get_metric_stats(
+                node_name,
+                resource_name,
+                *get_time_range()
+            ),
+            status=200,
+            mimetype='application/json'
+        )
+    except (
+        ValueError,
+        etcd.EtcdKeyNotFound,
+        etcd.EtcdConnectionFailed,
+        SyntaxError,
+        etcd.EtcdException,
+        TypeError,
+        TendrlPerformanceMonitoringException
+    ) as ex:
+        return Response(str(ex), status=500, mimetype='application/json')
+
+
+@app.route("/monitoring/stats")
+def get_bulk_stats():
+    # The stats of resources of nodes, for example
+    # ?nodes=<node_id>,<node_id>&resources=cpu.percent-user,memory.*
+    # as {node_id: {resource: [series, ...]}}, in as few render requests
+    # as the time series db allows. Unknown nodes are left out.
+    node_ids = [
+        node_id for node_id in request.args.get('nodes', '').split(',')
+        if node_id
+    ]
+    resources = [
+        resource
+        for resource in request.args.get('resources', '').split(',')
+        if resource
+    ]
+    if not node_ids or not resources:
+        return Response(
+            'nodes and resources are required',
+            status=400,
+            mimetype='text/plain'
+        )
+    try:
+        node_names = NS.central_store_thread.get_node_names(node_ids)
+        stats = NS.time_series_db_manager.get_plugin().\
+            get_bulk_metric_stats(
+                node_names.values(),
+                resources,
+                *get_time_range()
+            )
+        return Response(
+            json.dumps(dict(
+                (
+                    node_id,
+                    dict(
+                        (resource, stats[(node_name, resource)])
+                        for resource in resources
+                    )
+                )
+                for node_id, node_name in node_names.iteritems()
+            )),
+            status=200,
+            mimetype='application/json'
+        )
+    except (
+        ValueError,
+        etcd.EtcdKeyNotFound,
+        etcd.EtcdConnectionFailed,
+        SyntaxError,
+        etcd.EtcdException,
+        TypeError,
+        TendrlPerformanceMonitoringException
+    ) as ex:
+        return Response(str(ex), status=500, mimetype='application/json')
+
+
+@app.route("/monitoring/clusters/<cluster_id>/nodes/<resource_name>/stats")
+def get_cluster_nodestats(cluster_id, resource_name):
+    # The resource of every node of the cluster in a single render
+    # request, reduced by the time series db: a series per node id by
+    # default, ?aggregate=sum|average|max|min for a single series of the
+    # cluster, or ?top=<n> for the n nodes with the highest current values
+    aggregate = request.args.get('aggregate')
+    top = request.args.get('top')
+    if aggregate is not None and aggregate not in pm_consts.AGGREGATES:
+        return Response(
+            'aggregate is one of %s' % ', '.join(pm_consts.AGGREGATES),
+            status=400,
+            mimetype='text/plain'
+        )
+    if top is not None:
+        if aggregate is not None or not top.isdigit() or not int(top):
+            return Response(
+                'top is a positive number, not given with aggregate',
+                status=400,
+                mimetype='text/plain'
+            )
+        top = int(top)
+    try:
+        node_names = NS.central_store_thread.get_node_names(
+            NS.central_store_thread.get_cluster_node_ids(cluster_id)
+        )
+        if not node_names:
+            return Response('[]', status=200, mimetype='application/json')
+        node_ids = dict(
+            (node_name, node_id)
+            for node_id, node_name in node_names.iteritems()
+        )
+        stats = NS.time_series_db_manager.get_plugin().\
+            get_aggregated_metric_stats(
+                node_names.values(),
+                resource_name,
+                aggregate,
+                top,
+                False,
+                *get_time_range()
+            )
+        for series in stats:
+            series['target'] = node_ids.get(
+                series['target'],
+                series['target']
+            )
+        return Response(
+            json.dumps(stats),
             status=200,
             mimetype='application/json'
         )
@@ -76,9 +281,11 @@ def get_clusterutilization(cluster_id, utiliation_type):
         # with EtcdKeyNotFound if cluster if is invalid
         NS.etcd_orm.client.read('/clusters/%s' % cluster_id)
         return Response(
-            NS.time_series_db_manager.\
-            get_plugin().\
-            get_metric_stats(entity_name, metric_name),
+            NS.time_series_db_manager.get_metric_stats(
+                entity_name,
+                metric_name,
+                *get_time_range()
+            ),
             status=200,
             mimetype='application/json'
         )
@@ -112,9 +319,11 @@ def get_sdsutilization(sds_type, utiliation_type):
             1
         )
         return Response(
-            NS.time_series_db_manager.\
-            get_plugin().\
-            get_metric_stats(entity_name, metric_name),
+            NS.time_series_db_manager.get_metric_stats(
+                entity_name,
+                metric_name,
+                *get_time_range()
+            ),
             status=200,
             mimetype='application/json'
         )
@@ -132,16 +341,32 @@ def get_sdsutilization(sds_type, utiliation_type):
 
 @app.route("/monitoring/clusters/<cluster_id>/summary")
 def get_cluster_summary(cluster_id):
+    # The summary refers to its nodes by node_ids, ?expand=nodes adds
+    # their summaries as node_summaries
+    expand = request.args.get('expand')
+    if expand not in (None, 'nodes'):
+        return Response(
+            'expand is nodes',
+            status=400,
+            mimetype='text/plain'
+        )
     try:
         cluster_summary = NS.central_store_thread.get_cluster_summary(
             cluster_id
         )
+        if expand and cluster_summary is not None:
+            cluster_summary = dict(
+                cluster_summary,
+                node_summaries=NS.central_store_thread.get_node_summary(
+                    cluster_summary.get('node_ids') or []
+                )[0]
+            )
         return Response(
             json.dumps(cluster_summary),
             status=200,
             mimetype='application/json'
         )
-    except TendrlPerformanceMonitoringException as ex:
+    except (etcd.EtcdException, TendrlPerformanceMonitoringException) as ex:
         return Response(
             'Failed to fetch cluster summary for cluster %s.Error %s' % (
                 cluster_id,
@@ -215,7 +440,19 @@ def get_node_summary():
             len(request.args) == 1 and
             request.args.items()[0][0] == 'node_ids'
         )
-        if is_filter:
+        if 'since' in request.args:
+            # Only the summaries changed and the nodes removed after the
+            # version returned by the previous poll
+            since = request.args['since']
+            if not since.isdigit():
+                return Response(
+                    'since is a version returned by a previous request',
+                    status=400,
+                    mimetype='text/plain'
+                )
+            summary, ret_code, exs = \
+                NS.central_store_thread.get_node_summary_changes(int(since))
+        elif is_filter:
             node_list = (request.args.items()[0][1]).split(",")
             for index, node in enumerate(node_list):
                 uuid_string = node_list[index].strip()
@@ -256,11 +493,178 @@ def get_node_summary():
         )
 
 
+@app.route("/monitoring/nodes/top")
+def get_top_nodes():
+    # Summaries of the n nodes with the highest cpu, memory or storage
+    # percent used or alert count, highest first, optionally of the
+    # nodes of a cluster, e.g. ?by=cpu&n=10&cluster=<cluster name>
+    by = request.args.get('by', 'cpu')
+    n = request.args.get('n', '10')
+    if by not in RANKINGS or not n.isdigit():
+        return Response(
+            'by is one of %s and n a number' % ', '.join(sorted(RANKINGS)),
+            status=400,
+            mimetype='text/plain'
+        )
+    try:
+        summary, ret_code, exs = NS.central_store_thread.get_top_nodes(
+            by,
+            int(n),
+            request.args.get('cluster')
+        )
+        return Response(
+            json.dumps(summary),
+            status=ret_code,
+            mimetype='application/json'
+        )
+    except (
+        etcd.EtcdKeyNotFound,
+        etcd.EtcdConnectionFailed,
+        ValueError,
+        SyntaxError,
+        etcd.EtcdException,
+        TendrlPerformanceMonitoringException,
+        TypeError
+    ) as ex:
+        return Response(str(ex), status=500, mimetype='application/json')
+
+
+@app.route("/monitoring/stream")
+def get_summary_stream():
+    # Server-sent events of the summary changes as the summarisers publish
+    # them: node, cluster and system events with the new summary, their
+    # *_removed events, and resync when the client fell behind and has to
+    # read the summaries again. ?nodes=<node_id>,..&clusters=<cluster_id>,..
+    # subscribes to those nodes, and clusters and their nodes, only, and
+    # ?sections=nodes,clusters,systems to those sections.
+    if NS.central_store_thread.summary_snapshot is None:
+        return Response(
+            'The stream follows the summary snapshot, which is disabled',
+            status=503,
+            mimetype='text/plain'
+        )
+    node_ids, cluster_ids, sections = [
+        set(value for value in request.args.get(name, '').split(',')
+            if value)
+        for name in ('nodes', 'clusters', 'sections')
+    ]
+    if sections - set(SECTIONS.values()):
+        return Response(
+            'sections are among %s' % ', '.join(sorted(SECTIONS.values())),
+            status=400,
+            mimetype='text/plain'
+        )
+    try:
+        # Nodes joining the clusters later are not followed
+        for cluster_id in cluster_ids:
+            node_ids.update(
+                NS.central_store_thread.get_cluster_node_ids(cluster_id)
+            )
+    except (
+        etcd.EtcdConnectionFailed,
+        etcd.EtcdException,
+        TendrlPerformanceMonitoringException
+    ) as ex:
+        return Response(str(ex), status=500, mimetype='application/json')
+    subscriber = NS.summary_stream.subscribe(node_ids, cluster_ids, sections)
+    if subscriber is None:
+        return Response(
+            'Too many stream clients',
+            status=503,
+            mimetype='text/plain'
+        )
+    return Response(
+        subscriber,
+        status=200,
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@app.route("/monitoring/admin/profile")
+def get_profile():
+    # Samples all greenlets for the requested number of seconds and
+    # returns the collapsed stacks, each rooted at the task it belongs to.
+    try:
+        seconds = float(request.args.get('seconds', 10))
+        interval = float(request.args.get('interval', 0.005))
+    except ValueError as ex:
+        return Response(
+            'Invalid profile parameters.Error %s' % str(ex),
+            status=400,
+            mimetype='text/plain'
+        )
+    if not 0 < seconds <= MAX_PROFILE_SECONDS or interval <= 0:
+        return Response(
+            'seconds must be within (0, %s] and interval positive' %
+            MAX_PROFILE_SECONDS,
+            status=400,
+            mimetype='text/plain'
+        )
+    try:
+        NS.profiler.start(seconds, interval)
+    except TendrlPerformanceMonitoringException as ex:
+        return Response(
+            'Failed to profile.Error %s' % str(ex),
+            status=409,
+            mimetype='text/plain'
+        )
+    while NS.profiler.running:
+        gevent.sleep(0.1)
+    if request.args.get('format') == 'json':
+        return Response(
+            json.dumps({
+                'samples': NS.profiler.samples,
+                'tasks': NS.profiler.task_totals(),
+                'stacks': NS.profiler.counts()
+            }),
+            status=200,
+            mimetype='application/json'
+        )
+    return Response(
+        NS.profiler.collapsed(
+            include_idle=request.args.get('idle') == 'true'
+        ),
+        status=200,
+        mimetype='text/plain'
+    )
+
+
+@app.route("/monitoring/admin/profile/stop", methods=['POST'])
+def stop_profile():
+    NS.profiler.stop()
+    return Response('', status=200, mimetype='application/json')
+
+
+@app.route("/monitoring/admin/hub_blocks")
+def get_hub_blocks():
+    # Code locations that held the gevent hub over the threshold, the
+    # longest blocking first, with the stack of their last block
+    if NS.hub_monitor is None:
+        return Response(
+            'The hub monitor is disabled',
+            status=404,
+            mimetype='text/plain'
+        )
+    return Response(
+        json.dumps(NS.hub_monitor.stats()),
+        status=200,
+        mimetype='application/json'
+    )
+
+
+@app.route("/monitoring/admin/hub_blocks/reset", methods=['POST'])
+def reset_hub_blocks():
+    if NS.hub_monitor is not None:
+        NS.hub_monitor.reset()
+    return Response('', status=200, mimetype='application/json')
+
+
 class TendrlPerformanceManager(object):
 
     def __init__(self):
         try:
-            self.api_server = NS.performance_monitoring.config.data[
+            self.api_server_addr = NS.performance_monitoring.config.data[
                 'api_server_addr'
             ]
             self.api_port = int(
@@ -270,22 +674,270 @@ class TendrlPerformanceManager(object):
             )
             NS.configurator_queue = multiprocessing.Queue()
             NS.sds_monitoring_manager = SDSMonitoringManager()
+            NS.profiler = SamplingProfiler()
+            NS.hub_monitor = None
+            if parse_bool(
+                NS.performance_monitoring.config.data.get(
+                    'hub_monitor',
+                    True
+                )
+            ):
+                NS.hub_monitor = HubBlockMonitor(
+                    threshold=float(
+                        NS.performance_monitoring.config.data.get(
+                            'hub_monitor_threshold',
+                            0.1
+                        )
+                    )
+                )
+            self.node_liveness_timeout = int(
+                NS.performance_monitoring.config.data.get(
+                    'node_liveness_timeout',
+                    5
+                )
+            )
+            NS.node_liveness = NodeLivenessTracker(
+                timeout=self.node_liveness_timeout
+            )
+            # 'gevent' serves the api with APIServer, 'development' with
+            # flask's own server.
+            self.api_server_mode = NS.performance_monitoring.config.data.get(
+                'api_server_mode',
+                'gevent'
+            )
+            self.api_server = None
+            # Summaries are published to the api workers through a memory
+            # mapped snapshot rather than read back from etcd per request.
+            self.summary_snapshot_path = None
+            if parse_bool(
+                NS.performance_monitoring.config.data.get(
+                    'summary_snapshot',
+                    True
+                )
+            ):
+                self.summary_snapshot_path = \
+                    NS.performance_monitoring.config.data.get(
+                        'summary_snapshot_path',
+                        SUMMARY_SNAPSHOT_PATH
+                    )
             self.configure_cluster_monitoring = ConfigureClusterMonitoring()
-            self.node_summariser = NodeSummarise()
-            self.cluster_summariser = ClusterSummarise()
+            # Worker processes computing the sds plugins' cluster
+            # summaries, 0 computes them in the cluster summariser greenlet
+            cluster_summary_workers = int(
+                NS.performance_monitoring.config.data.get(
+                    'cluster_summary_workers',
+                    0
+                )
+            )
+            if cluster_summary_workers > 0:
+                NS.sds_monitoring_manager.process_pool = SummaryProcessPool(
+                    workers=cluster_summary_workers,
+                    timeout=float(
+                        NS.performance_monitoring.config.data.get(
+                            'cluster_summary_timeout',
+                            60
+                        )
+                    )
+                )
+            config = NS.performance_monitoring.config.data
+            if parse_bool(config.get('query_cache', True)):
+                NS.time_series_db_manager.cache = RangeQueryCache(
+                    chunk=int(config.get('query_cache_chunk', 3600)),
+                    # collectd's datapoints are all written after an
+                    # interval
+                    settle=int(config.get('interval', 600)),
+                    max_bytes=int(
+                        config.get('query_cache_max_bytes', 64 * 1024 * 1024)
+                    ),
+                    disk_dir=config.get('query_cache_dir') or None
+                )
+            NS.time_series_db_manager.stream = parse_bool(
+                config.get('stream_stats', False)
+            )
+            NS.summary_stream = SummaryStream(
+                poll_interval=float(config.get('stream_poll_interval', 1)),
+                max_pending=int(config.get('stream_max_pending', 1000)),
+                max_clients=int(config.get('stream_max_clients', 500)),
+                heartbeat=float(config.get('stream_heartbeat', 15))
+            )
+            NS.central_store_thread.node_changes = NodeChangeLog(
+                size=int(config.get('node_summary_change_log_size', 4096))
+            )
+            NS.central_store_thread.summary_writer = SummaryWriter(
+                rewrite_interval=int(
+                    config.get('summary_rewrite_interval', 3600)
+                )
+            )
+            self.carbon_relay = None
+            if parse_bool(config.get('carbon_relay', False)):
+                self.carbon_relay = CarbonRelay(
+                    (
+                        config['time_series_db_server'],
+                        int(config['carbon_port'])
+                    ),
+                    addr=config.get('carbon_relay_addr', '0.0.0.0'),
+                    port=int(config.get('carbon_relay_port', 2013)),
+                    pickle_port=int(
+                        config.get('carbon_relay_pickle_port', 2014)
+                    ),
+                    # Two collectd intervals, one datapoint may be missed
+                    max_age=2 * int(config.get('interval', 600))
+                )
+            self.node_summariser = NodeSummarise(
+                interval=int(config.get('interval', 0)),
+                relay=self.carbon_relay
+            )
+            self.cluster_summariser = ClusterSummarise(
+                concurrency=max(cluster_summary_workers, 1)
+            )
             self.configure_node_monitoring = ConfigureNodeMonitoring()
+            self.scheduler = Scheduler()
+            self.register_task(
+                'node_summary',
+                self.node_summariser.calculate_host_summaries,
+                60
+            )
+            self.register_task(
+                'cluster_summary',
+                self.cluster_summariser.run_cycle,
+                60
+            )
+            self.register_task(
+                'configure_cluster_monitoring',
+                self.configure_cluster_monitoring.configure_cluster_monitoring,
+                10
+            )
+            self.register_task(
+                'configure_node_monitoring',
+                self.configure_node_monitoring.init_monitoring,
+                10
+            )
+            self.self_metrics_pusher = None
+            if parse_bool(
+                NS.performance_monitoring.config.data.get(
+                    'self_metrics_push',
+                    False
+                )
+            ):
+                self.self_metrics_pusher = SelfMetricsPusher(
+                    interval=int(
+                        NS.performance_monitoring.config.data.get(
+                            'self_metrics_push_interval',
+                            60
+                        )
+                    )
+                )
         except (ConfigNotFound, TendrlPerformanceMonitoringException):
             raise
 
+    def register_task(self, name, func, period):
+        # <name>_period and <name>_max_runtime override the defaults, a
+        # max_runtime of 0 lets the runs complete however long they take
+        config = NS.performance_monitoring.config.data
+        self.scheduler.register(
+            name,
+            func,
+            float(config.get('%s_period' % name, period)),
+            jitter=float(config.get('task_jitter', 0.1)),
+            max_runtime=float(
+                config.get('%s_max_runtime' % name, 0)
+            ) or None
+        )
+
+    def start_api_worker(self):
+        # Runs in each forked api worker. Pooled connections opened
+        # before the fork must not be shared with the main process.
+        # Every worker has its own instrumentation registry, profiler and
+        # hub monitor, so /monitoring/self/metrics and /monitoring/admin/*
+        # answer for the worker serving the request only; the summarisers'
+        # own metrics are pushed to carbon by the main process when
+        # self_metrics_push is on.
+        NS.etcd_orm.client.http.clear()
+        plugin_http = getattr(
+            NS.time_series_db_manager.get_plugin(),
+            'http',
+            None
+        )
+        if plugin_http is not None:
+            plugin_http.clear()
+        snapshot = NS.central_store_thread.summary_snapshot
+        if snapshot is not None:
+            # Read only what the main process publishes
+            snapshot.close()
+            NS.central_store_thread.summary_snapshot = SummarySnapshot(
+                snapshot.path
+            )
+        NS.node_liveness = NodeLivenessTracker(
+            timeout=self.node_liveness_timeout,
+            publish=False
+        )
+        NS.node_liveness.start()
+        if NS.hub_monitor is not None:
+            # Its thread did not survive the fork
+            NS.hub_monitor.stop()
+            NS.hub_monitor = HubBlockMonitor(
+                threshold=NS.hub_monitor.threshold
+            )
+            NS.hub_monitor.start()
+
+    def start_summary_snapshot(self):
+        if self.summary_snapshot_path is None:
+            return
+        try:
+            NS.central_store_thread.summary_snapshot = SummarySnapshot(
+                self.summary_snapshot_path,
+                create=True
+            )
+        except EnvironmentError as ex:
+            Event(
+                ExceptionMessage(
+                    priority="error",
+                    publisher=NS.publisher_id,
+                    payload={"message": 'Failed to create the summary '
+                                        'snapshot %s, summaries will be read '
+                                        'from etcd.' %
+                                        self.summary_snapshot_path,
+                             "exception": ex
+                             }
+                )
+            )
+
     def start(self):
+        # Before the api workers are forked, so that the file exists when
+        # they open it
+        self.start_summary_snapshot()
+        if self.api_server_mode != 'development':
+            # Listen, and fork the api workers if any, before the
+            # background greenlets are started.
+            self.api_server = APIServer.from_config(
+                app,
+                NS.performance_monitoring.config.data,
+                on_worker_start=self.start_api_worker
+            )
+            self.api_server.start()
+        if NS.hub_monitor is not None:
+            NS.hub_monitor.start()
         NS.central_store_thread.start()
-        self.node_summariser.start()
-        self.cluster_summariser.start()
-        self.configure_cluster_monitoring.start()
-        self.configure_node_monitoring.start()
+        NS.node_liveness.start()
+        if self.carbon_relay is not None:
+            self.carbon_relay.start()
+        self.scheduler.start()
+        if self.self_metrics_pusher is not None:
+            self.self_metrics_pusher.start()
         try:
-            app.run(host=self.api_server, port=self.api_port, threaded=True)
-        except (ValueError, TendrlPerformanceMonitoringException) as ex:
+            if self.api_server is not None:
+                self.api_server.serve_forever()
+            else:
+                app.run(
+                    host=self.api_server_addr,
+                    port=self.api_port,
+                    threaded=True
+                )
+        except (
+            ValueError,
+            EnvironmentError,
+            TendrlPerformanceMonitoringException
+        ) as ex:
             Event(
                 ExceptionMessage(
                     priority="error",
@@ -299,11 +951,22 @@ class TendrlPerformanceManager(object):
             self.stop()
 
     def stop(self):
+        if self.api_server is not None:
+            self.api_server.stop()
         NS.central_store_thread.stop()
-        self.configure_cluster_monitoring.stop()
-        self.configure_node_monitoring.stop()
+        self.scheduler.stop()
+        if self.carbon_relay is not None:
+            self.carbon_relay.stop()
         NS.configurator_queue.close()
-        self.node_summariser.stop()
+        NS.node_liveness.stop()
+        if NS.sds_monitoring_manager.process_pool is not None:
+            NS.sds_monitoring_manager.process_pool.stop()
+        if self.self_metrics_pusher is not None:
+            self.self_metrics_pusher.stop()
+        if NS.hub_monitor is not None:
+            NS.hub_monitor.stop()
+        if NS.central_store_thread.summary_snapshot is not None:
+            NS.central_store_thread.summary_snapshot.close()
         os.system("ps -C tendrl-performance-monitoring -o pid=|xargs kill -9")
 
 
@@ -0,0 +1,227 @@
+import errno
+import os
+import signal
+import socket
+
+import gevent
+from gevent.baseserver import parse_address
+from gevent.pool import Pool
+from gevent.pywsgi import WSGIHandler
+from gevent.pywsgi import WSGIServer
+
+from tendrl.commons.event import Event
+from tendrl.commons.message import ExceptionMessage
+from tendrl.commons.message import Message
+
+
+def parse_bool(value):
+    # Config values may come as strings, e.g. from etcd
+    if isinstance(value, basestring):
+        return value.strip().lower() in ('true', 'yes', 'on', '1')
+    return bool(value)
+
+
+class APIRequestHandler(WSGIHandler):
+    """pywsgi handler with keep-alive and request timeouts
+
+    A connection waits for its next request line for keepalive_timeout at
+    most, and a request has request_timeout to send its request line and
+    headers, and for each read and write after that. With keepalive off
+    every response says Connection: close and the connection is closed
+    after it.
+    """
+
+    keepalive = True
+    keepalive_timeout = 5
+    request_timeout = 30
+    requests_served = 0
+
+    def read_requestline(self):
+        if self.requests_served:
+            timeout = self.keepalive_timeout
+        else:
+            timeout = self.request_timeout
+        # A timeout surfaces as a socket error, on which pywsgi closes the
+        # connection.
+        with gevent.Timeout(timeout, socket.timeout('timed out')):
+            line = super(APIRequestHandler, self).read_requestline()
+        self.socket.settimeout(self.request_timeout)
+        self.requests_served += 1
+        return line
+
+    def read_request(self, raw_requestline):
+        with gevent.Timeout(
+            self.request_timeout,
+            socket.timeout('timed out')
+        ):
+            return super(APIRequestHandler, self).read_request(
+                raw_requestline
+            )
+
+    def start_response(self, status, headers, exc_info=None):
+        if not self.keepalive and not any(
+            header.lower() == 'connection' for header, _ in headers
+        ):
+            # pywsgi closes the connection after a response sent with
+            # Connection: close
+            headers = list(headers) + [('Connection', 'close')]
+        return super(APIRequestHandler, self).start_response(
+            status,
+            headers,
+            exc_info
+        )
+
+
+class APIServer(object):
+    """Production server of the flask app, on gevent's pywsgi
+
+    Each process serves up to max_connections concurrent connections,
+    one greenlet each. With workers > 1 the listening socket is opened
+    first and then shared by that many forked worker processes, with the
+    calling process left to supervise them; on_worker_start is called
+    in each worker before it starts serving.
+    """
+
+    def __init__(self, app, host, port, workers=1, max_connections=1000,
+                 backlog=1024, keepalive=True, keepalive_timeout=5,
+                 request_timeout=30, on_worker_start=None):
+        self.app = app
+        self.address = (host, port)
+        self.workers = workers
+        self.max_connections = max_connections
+        self.backlog = backlog
+        self.on_worker_start = on_worker_start
+        self.handler_class = type(
+            'APIRequestHandler',
+            (APIRequestHandler,),
+            {
+                'keepalive': keepalive,
+                'keepalive_timeout': keepalive_timeout,
+                'request_timeout': request_timeout,
+            }
+        )
+        self.listener = None
+        self.server = None
+        self.worker_pids = set()
+        self._stopping = False
+
+    @classmethod
+    def from_config(cls, app, config, on_worker_start=None):
+        return cls(
+            app,
+            config['api_server_addr'],
+            int(config['api_server_port']),
+            workers=int(config.get('api_server_workers', 1)),
+            max_connections=int(
+                config.get('api_server_max_connections', 1000)
+            ),
+            backlog=int(config.get('api_server_backlog', 1024)),
+            keepalive=parse_bool(config.get('api_server_keepalive', True)),
+            keepalive_timeout=float(
+                config.get('api_server_keepalive_timeout', 5)
+            ),
+            request_timeout=float(
+                config.get('api_server_request_timeout', 30)
+            ),
+            on_worker_start=on_worker_start
+        )
+
+    def make_server(self):
+        return WSGIServer(
+            self.listener,
+            self.app,
+            spawn=Pool(self.max_connections),
+            handler_class=self.handler_class,
+            log=None
+        )
+
+    def start(self):
+        """Open the listener, forking the workers in pre-fork mode
+
+        Call it before starting the background greenlets, so that they
+        only run in this process.
+        """
+        family, address = parse_address(self.address)
+        self.listener = WSGIServer.get_listener(
+            address,
+            backlog=self.backlog,
+            family=family
+        )
+        if self.workers > 1:
+            for _ in range(self.workers):
+                self.spawn_worker()
+        else:
+            self.server = self.make_server()
+            self.server.start()
+
+    def spawn_worker(self):
+        pid = os.fork()
+        if pid:
+            self.worker_pids.add(pid)
+            return pid
+        # Worker process
+        status = 1
+        try:
+            signal.signal(signal.SIGTERM, lambda sig, frame: os._exit(0))
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            if self.on_worker_start is not None:
+                self.on_worker_start()
+            self.worker_pids = set()
+            self.server = self.make_server()
+            self.server.serve_forever()
+            status = 0
+        except Exception as ex:
+            Event(
+                ExceptionMessage(
+                    priority="error",
+                    publisher=NS.publisher_id,
+                    payload={"message": 'API worker %s exited.' % os.getpid(),
+                             "exception": ex
+                             }
+                )
+            )
+        finally:
+            os._exit(status)
+
+    def serve_forever(self):
+        """Serve until stopped, or in pre-fork mode, supervise the workers"""
+        if self.server is not None:
+            self.server.serve_forever()
+            return
+        while self.worker_pids and not self._stopping:
+            try:
+                pid, status = os.waitpid(-1, 0)
+            except OSError as ex:
+                if ex.errno == errno.EINTR:
+                    continue
+                if ex.errno == errno.ECHILD:
+                    break
+                raise
+            if pid not in self.worker_pids:
+                continue
+            self.worker_pids.discard(pid)
+            if self._stopping:
+                continue
+            Event(
+                Message(
+                    priority="error",
+                    publisher=NS.publisher_id,
+                    payload={"message": 'API worker %s exited with status %s,'
+                                        ' restarting it.' % (pid, status)}
+                )
+            )
+            # Back off so that a worker failing at start does not spin
+            gevent.sleep(1)
+            self.spawn_worker()
+
+    def stop(self):
+        self._stopping = True
+        if self.server is not None:
+            self.server.stop()
+        for pid in list(self.worker_pids):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                pass
+        if self.listener is not None:
+            self.listener.close()
@@ -0,0 +1,213 @@
+from collections import OrderedDict
+import gevent
+import gevent.event
+import json
+
+from tendrl.commons.event import Event
+from tendrl.commons.message import ExceptionMessage
+from tendrl.performance_monitoring.central_store.changelog \
+    import changes_since
+from tendrl.performance_monitoring.exceptions \
+    import TendrlPerformanceMonitoringException
+from tendrl.performance_monitoring import instrumentation
+
+# Event kind -> section of the summary snapshot
+SECTIONS = {
+    'node': 'nodes',
+    'cluster': 'clusters',
+    'system': 'systems',
+}
+
+STREAM_CLIENTS = instrumentation.gauge(
+    'tendrl_pm_stream_clients',
+    'Clients connected to /monitoring/stream'
+)
+STREAM_EVENTS = instrumentation.counter(
+    'tendrl_pm_stream_events_total',
+    'Summary change events queued for the stream clients, replaced by a '
+    'newer change of the same summary before being sent, or dropped for a '
+    'resync when a client fell too far behind',
+    ['outcome']
+)
+
+
+def server_sent_event(event, data):
+    return 'event: %s\ndata: %s\n\n' % (event, json.dumps(data, default=str))
+
+
+class Subscriber(object):
+    """A stream client's pending events, at most one per summary
+
+    A change to a summary replaces its pending change, so a slow client
+    only gets the latest state of each summary. One with more than
+    max_pending summaries waiting has them dropped for a single resync
+    event, after which it reads the summary endpoints again.
+
+    It is the response body of the client's request: the server calls
+    close() when the client goes, whether or not it was iterated.
+    """
+
+    def __init__(self, stream, node_ids=None, cluster_ids=None,
+                 sections=None, max_pending=1000, heartbeat=15):
+        self.stream = stream
+        # Only the changes of these nodes and clusters, and of no system,
+        # when either is set
+        self.node_ids = set(node_ids or [])
+        self.cluster_ids = set(cluster_ids or [])
+        self.sections = set(sections or SECTIONS.values())
+        self.max_pending = max_pending
+        self.heartbeat = heartbeat
+        # (kind, key) -> (event, data)
+        self.pending = OrderedDict()
+        self.ready = gevent.event.Event()
+
+    def wants(self, kind, key):
+        if SECTIONS[kind] not in self.sections:
+            return False
+        if not self.node_ids and not self.cluster_ids:
+            return True
+        if kind == 'node':
+            return key in self.node_ids
+        if kind == 'cluster':
+            return key in self.cluster_ids
+        return False
+
+    def offer(self, kind, key, event, data):
+        if kind != 'resync' and not self.wants(kind, key):
+            return
+        if self.pending.pop((kind, key), None) is not None:
+            STREAM_EVENTS.inc(outcome='coalesced')
+        self.pending[(kind, key)] = (event, data)
+        STREAM_EVENTS.inc(outcome='queued')
+        if len(self.pending) > self.max_pending:
+            STREAM_EVENTS.inc(len(self.pending), outcome='dropped')
+            self.pending.clear()
+            self.pending[('resync', None)] = ('resync', {})
+        self.ready.set()
+
+    def __iter__(self):
+        # The server-sent events of the changes as they come, and a
+        # comment every heartbeat seconds without any, so that proxies
+        # keep the connection and a client gone is noticed
+        while True:
+            self.ready.wait(self.heartbeat)
+            self.ready.clear()
+            if not self.pending:
+                yield ': keepalive\n\n'
+                continue
+            while self.pending:
+                event, data = self.pending.popitem(last=False)[1]
+                yield server_sent_event(event, data)
+
+    def close(self):
+        self.stream.unsubscribe(self)
+
+
+class SummaryStream(object):
+    """Pushes the summary changes the summarisers publish to stream clients
+
+    Each api process follows the summary snapshot, checking its header
+    every poll_interval seconds while it has clients, and compares each
+    new snapshot to the previous one: the node summaries changed are
+    those of the node change log, the cluster and system summaries are
+    compared. The changes are then offered to every client's Subscriber.
+    """
+
+    def __init__(self, poll_interval=1, max_pending=1000, max_clients=500,
+                 heartbeat=15):
+        self.poll_interval = poll_interval
+        self.max_pending = max_pending
+        self.max_clients = max_clients
+        self.heartbeat = heartbeat
+        self.subscribers = set()
+        self.greenlet = None
+        self.generation = None
+        self.version = None
+        self.previous = {'clusters': {}, 'systems': {}}
+
+    def subscribe(self, node_ids=None, cluster_ids=None, sections=None):
+        # None when max_clients are connected already
+        if len(self.subscribers) >= self.max_clients:
+            return None
+        subscriber = Subscriber(
+            self,
+            node_ids,
+            cluster_ids,
+            sections,
+            self.max_pending,
+            self.heartbeat
+        )
+        self.subscribers.add(subscriber)
+        STREAM_CLIENTS.set(len(self.subscribers))
+        if self.greenlet is None or self.greenlet.ready():
+            self.greenlet = gevent.spawn(self.follow)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.discard(subscriber)
+        STREAM_CLIENTS.set(len(self.subscribers))
+
+    def follow(self):
+        while self.subscribers:
+            try:
+                self.poll()
+            except TendrlPerformanceMonitoringException as ex:
+                Event(
+                    ExceptionMessage(
+                        priority="debug",
+                        publisher=NS.publisher_id,
+                        payload={"message": 'Failed to read the summary '
+                                            'snapshot for the stream.',
+                                 "exception": ex
+                                 }
+                    )
+                )
+            gevent.sleep(self.poll_interval)
+        # Restarted by the next client, from the snapshot it finds then
+        self.generation = None
+
+    def poll(self):
+        snapshot = NS.central_store_thread.summary_snapshot.read()
+        if snapshot is None or snapshot['generation'] == self.generation:
+            return
+        summaries = snapshot['summaries']
+        changes = summaries.get('node_changes')
+        events = []
+        if self.generation is not None:
+            events = self.changes(summaries, changes)
+        self.generation = snapshot['generation']
+        self.version = changes['version'] if changes else None
+        for section in self.previous:
+            self.previous[section] = summaries.get(section, {})
+        for subscriber in list(self.subscribers):
+            for event in events:
+                subscriber.offer(*event)
+
+    def changes(self, summaries, changes):
+        # [(kind, key, event, data)] from the previous snapshot
+        events = []
+        if changes:
+            nodes = summaries.get('nodes', {})
+            changed = None
+            if self.version is not None:
+                changed = changes_since(changes, self.version)
+            if changed is None:
+                # Fell behind the change log
+                return [('resync', None, 'resync', {})]
+            for node_id in changed[0]:
+                if node_id in nodes:
+                    events.append(('node', node_id, 'node', nodes[node_id]))
+            for node_id in changed[1]:
+                events.append(
+                    ('node', node_id, 'node_removed', {'node_id': node_id})
+                )
+        for kind in ('cluster', 'system'):
+            section = SECTIONS[kind]
+            current = summaries.get(section, {})
+            previous = self.previous[section]
+            for key, summary in current.iteritems():
+                if previous.get(key) != summary:
+                    events.append((kind, key, kind, summary))
+            for key in set(previous) - set(current):
+                events.append((kind, key, kind + '_removed', {'id': key}))
+        return events
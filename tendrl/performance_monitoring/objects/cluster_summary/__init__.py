@@ -7,7 +7,8 @@ class ClusterSummary(BaseObject):
     def __init__(self,
                  utilization={'': ''},
                  hosts_count={'': ''},
-                 node_summaries=[],
+                 node_ids=[],
+                 node_utilization={'': ''},
                  sds_det={'': ''},
                  sds_type='',
                  cluster_id='',
@@ -21,7 +22,11 @@ class ClusterSummary(BaseObject):
         self.cluster_id = cluster_id
         self.utilization = utilization
         self.hosts_count = hosts_count
-        self.node_summaries = node_summaries
+        # The member nodes, whose summaries are under
+        # monitoring/summary/nodes, and the percentiles of their
+        # utilization computed from those
+        self.node_ids = node_ids
+        self.node_utilization = node_utilization
         self.sds_det = sds_det
         self.sds_type = sds_type
         self.value = 'monitoring/summary/clusters/%s' % self.cluster_id
@@ -33,16 +38,23 @@ class ClusterSummary(BaseObject):
     def save(self, update=False):
         # Convert nested dict to str @ save and convert back to
         # dict on load
-        self.node_summaries = json.dumps(self.node_summaries)
+        self.node_ids = json.dumps(self.node_ids)
+        self.node_utilization = json.dumps(self.node_utilization)
         self.hosts_count = json.dumps(self.hosts_count)
         self.utilization = json.dumps(self.utilization)
         self.sds_det = json.dumps(self.sds_det)
-        super(ClusterSummary, self).save(update=update)
+        if update:
+            super(ClusterSummary, self).save(update=update)
+            return
+        # Only the keys changed since last written, at the end of the cycle
+        NS.central_store_thread.save_summary(self.value, self.to_json())
 
     def load(self):
         summary = super(ClusterSummary, self).load()
-        if isinstance(summary.node_summaries, basestring):
-            summary.node_summaries = json.loads(summary.node_summaries)
+        if isinstance(summary.node_ids, basestring):
+            summary.node_ids = json.loads(summary.node_ids)
+        if isinstance(summary.node_utilization, basestring):
+            summary.node_utilization = json.loads(summary.node_utilization)
         summary.sds_det = json.loads(summary.sds_det[''])
         summary.hosts_count = json.loads(self.hosts_count[''])
         summary.utilization = json.loads(self.utilization[''])
@@ -52,7 +64,8 @@ class ClusterSummary(BaseObject):
         return ClusterSummary(
             utilization=self.utilization,
             hosts_count=self.hosts_count,
-            node_summaries=self.node_summaries,
+            node_ids=self.node_ids,
+            node_utilization=self.node_utilization,
             sds_det=self.sds_det,
             sds_type=self.sds_type,
             cluster_id=self.cluster_id
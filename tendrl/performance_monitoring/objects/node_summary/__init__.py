@@ -36,6 +36,13 @@ class NodeSummary(BaseObject):
     def to_json(self):
         return self.__dict__
 
+    def save(self, update=False):
+        if update:
+            super(NodeSummary, self).save(update=update)
+            return
+        # Only the keys changed since last written, at the end of the cycle
+        NS.central_store_thread.save_summary(self.value, self.to_json())
+
 
 class _NodeSummaryEtcd(EtcdObj):
     """A table of the node summary, lazily updated
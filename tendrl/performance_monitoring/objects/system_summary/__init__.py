@@ -35,7 +35,11 @@ class SystemSummary(BaseObject):
         self.cluster_count = json.dumps(self.cluster_count)
         self.utilization = json.dumps(self.utilization)
         self.hosts_count = json.dumps(self.hosts_count)
-        super(SystemSummary, self).save(update=update)
+        if update:
+            super(SystemSummary, self).save(update=update)
+            return
+        # Only the keys changed since last written, at the end of the cycle
+        NS.central_store_thread.save_summary(self.value, self.to_json())
 
     def load(self):
         summary = super(SystemSummary, self).load()
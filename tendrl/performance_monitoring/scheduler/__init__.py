@@ -0,0 +1,175 @@
+import gevent
+import gevent.event
+import gevent.greenlet
+import random
+import time
+
+from tendrl.commons.event import Event
+from tendrl.commons.message import ExceptionMessage
+from tendrl.performance_monitoring import instrumentation
+
+TASK_BUCKETS = (
+    0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600, 1800
+)
+
+TASK_RUNS = instrumentation.counter(
+    'tendrl_pm_task_runs_total',
+    'Scheduled task runs per outcome: ok, error, timeout or skipped when '
+    'the previous run was still going',
+    ['task', 'outcome']
+)
+TASK_OVERRUNS = instrumentation.counter(
+    'tendrl_pm_task_overruns_total',
+    'Task runs that took longer than the task period',
+    ['task']
+)
+TASK_SECONDS = instrumentation.histogram(
+    'tendrl_pm_task_seconds',
+    'Duration of scheduled task runs',
+    ['task'],
+    buckets=TASK_BUCKETS
+)
+TASK_LAG_SECONDS = instrumentation.histogram(
+    'tendrl_pm_task_lag_seconds',
+    'Delay between the time a task run was due and its start',
+    ['task']
+)
+
+
+class Task(object):
+    def __init__(self, name, func, period, jitter=0.1, max_runtime=None):
+        self.name = name
+        self.func = func
+        self.period = period
+        # Fraction of the period each run is delayed by at most, at random
+        self.jitter = jitter
+        # Seconds after which a run is killed, None to let it finish
+        self.max_runtime = max_runtime
+        self.greenlet = None
+        # Start of the run's slot, advanced by exactly period so that runs
+        # do not drift; the run is due at slot + its jitter
+        self.slot = None
+        self.due_at = None
+        self.runs = 0
+        self.skipped = 0
+        self.overruns = 0
+        self.failures = 0
+        self.last_started_at = None
+        self.last_seconds = None
+
+    @property
+    def running(self):
+        return self.greenlet is not None and not self.greenlet.ready()
+
+    def to_json(self):
+        return {
+            'period': self.period,
+            'jitter': self.jitter,
+            'max_runtime': self.max_runtime,
+            'running': self.running,
+            'due_at': self.due_at,
+            'runs': self.runs,
+            'skipped': self.skipped,
+            'overruns': self.overruns,
+            'failures': self.failures,
+            'last_started_at': self.last_started_at,
+            'last_seconds': self.last_seconds,
+        }
+
+
+class Scheduler(gevent.greenlet.Greenlet):
+    """Runs the periodic tasks of the process, each in its own greenlet
+
+    Each task runs once per period, on a fixed grid started at a random
+    offset within its jitter, plus a random delay of up to jitter times
+    the period each run, so that tasks sharing a period do not run in
+    bursts. A run due while the previous one is still going is skipped
+    and counted, and one taking longer than max_runtime is killed. Run
+    durations, the lag of their start, overruns and failures are
+    recorded in the self metrics.
+    """
+
+    def __init__(self, seed=None):
+        super(Scheduler, self).__init__()
+        self.tasks = {}
+        self.rng = random.Random(seed)
+        self._complete = gevent.event.Event()
+
+    def register(self, name, func, period, jitter=0.1, max_runtime=None):
+        task = Task(name, func, period, jitter, max_runtime)
+        task.slot = time.time() + self.rng.uniform(0, jitter) * period
+        task.due_at = task.slot
+        self.tasks[name] = task
+        return task
+
+    def _run(self):
+        while not self._complete.is_set():
+            now = time.time()
+            for task in self.tasks.values():
+                if task.due_at <= now:
+                    self.dispatch(task, now)
+            if not self.tasks:
+                self._complete.wait()
+                continue
+            next_due_at = min(task.due_at for task in self.tasks.values())
+            self._complete.wait(max(next_due_at - time.time(), 0))
+
+    def dispatch(self, task, now):
+        if task.running:
+            task.skipped += 1
+            TASK_RUNS.inc(task=task.name, outcome='skipped')
+        else:
+            task.greenlet = gevent.spawn(self.execute, task, now - task.due_at)
+        # Slots missed while the hub was held are not caught up on
+        task.slot += task.period * (int((now - task.slot) // task.period) + 1)
+        task.due_at = task.slot + self.rng.uniform(0, task.jitter) * \
+            task.period
+
+    def execute(self, task, lag):
+        TASK_LAG_SECONDS.observe(lag, task=task.name)
+        task.last_started_at = time.time()
+        timeout = gevent.Timeout(task.max_runtime)
+        outcome = 'ok'
+        try:
+            with timeout:
+                task.func()
+        except gevent.Timeout as ex:
+            if ex is not timeout:
+                raise
+            outcome = 'timeout'
+            self.report(task, 'Task %s did not complete within %ss.' % (
+                task.name,
+                task.max_runtime
+            ), ex)
+        except Exception as ex:
+            outcome = 'error'
+            self.report(task, 'Task %s failed.' % task.name, ex)
+        finally:
+            task.last_seconds = time.time() - task.last_started_at
+            task.runs += 1
+            TASK_SECONDS.observe(task.last_seconds, task=task.name)
+            TASK_RUNS.inc(task=task.name, outcome=outcome)
+            if task.last_seconds > task.period:
+                task.overruns += 1
+                TASK_OVERRUNS.inc(task=task.name)
+
+    def report(self, task, message, ex):
+        task.failures += 1
+        Event(
+            ExceptionMessage(
+                priority="error",
+                publisher=NS.publisher_id,
+                payload={"message": message,
+                         "exception": ex
+                         }
+            )
+        )
+
+    def stats(self):
+        return dict(
+            (name, task.to_json()) for name, task in self.tasks.iteritems()
+        )
+
+    def stop(self):
+        # Runs in progress are left to complete
+        self._complete.set()
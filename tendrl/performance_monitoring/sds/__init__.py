@@ -1,8 +1,11 @@
 from abc import abstractmethod
 import ast
+from collections import Counter
 from etcd import EtcdKeyNotFound
+import heapq
 import importlib
 import inspect
+import itertools
 import os
 import six
 
@@ -49,64 +52,71 @@ class SDSPlugin(object):
         )
 
     @abstractmethod
-    def get_cluster_summary(self, cluster_id, cluster_det):
+    def get_cluster_summary(self, cluster_id, cluster_det, node_services=None):
         raise NotImplementedError(
             "The plugins overriding SDSPlugin should mandatorily override this"
         )
 
     @abstractmethod
-    def compute_system_summary(self, cluster_summaries, clusters):
+    def compute_system_summary(self, aggregate):
         raise NotImplementedError(
             "The plugins overriding SDSPlugin should mandatorily override this"
         )
 
-    def get_clusters_status_wise_counts(self, clusters):
+    def get_cluster_counters(self, cluster_summary, cluster_det):
+        # Flat (section, name[, status]) counters contributed by a single
+        # cluster to the system summary of its sds type. Plugins extend
+        # these with their sds specific counts.
+        counters = Counter()
+        utilization = literal_value(cluster_summary.utilization)
+        counters[('utilization', pm_consts.TOTAL)] = int(
+            utilization.get(pm_consts.TOTAL, 0)
+        )
+        counters[('utilization', pm_consts.USED)] = int(
+            utilization.get(pm_consts.USED, 0)
+        )
+        hosts_count = literal_value(cluster_summary.hosts_count)
+        for status, counter in hosts_count.iteritems():
+            counters[('hosts_count', status)] = int(counter)
+        cluster_status = cluster_det.get('GlobalDetails', {}).get('status')
+        if cluster_status:
+            counters[('cluster_count', cluster_status)] = 1
+            counters[('cluster_count', 'total')] = 1
+        services_count = literal_value(
+            cluster_summary.sds_det.get('services_count', {})
+        )
+        for service_name, service_status_counter in \
+                services_count.iteritems():
+            for service_status, counter in \
+                    service_status_counter.iteritems():
+                counters[
+                    ('services_count', service_name, service_status)
+                ] = int(counter)
+        return counters
+
+    def get_cluster_ranked(self, cluster_summary):
+        # section -> list of the cluster's most used entities. Plugins
+        # override this to feed the system wide top-N lists.
+        return {}
+
+    def get_clusters_status_wise_counts(self, aggregate):
         clusters_status_wise_counts = {'total': 0}
-        for cluster_id, cluster_det in clusters.iteritems():
-            if (
-                self.name in
-                    cluster_det.get('TendrlContext', {}).get('sds_name')
-            ):
-                cluster_status = cluster_det.get(
-                    'GlobalDetails', {}
-                ).get('status')
-                if cluster_status:
-                    if cluster_status not in clusters_status_wise_counts:
-                        clusters_status_wise_counts[cluster_status] = 1
-                    else:
-                        clusters_status_wise_counts[cluster_status] = \
-                            clusters_status_wise_counts[cluster_status] + 1
-                    clusters_status_wise_counts['total'] = \
-                        clusters_status_wise_counts['total'] + 1
+        clusters_status_wise_counts.update(aggregate.section('cluster_count'))
         return clusters_status_wise_counts
 
-    def get_system_utilization(self, cluster_summaries):
+    def get_system_utilization(self, aggregate):
         net_utilization = {
             'total': 0,
             'used': 0,
             'percent_used': 0
         }
-        for cluster_summary in cluster_summaries:
-            if self.name in cluster_summary.sds_type:
-                net_utilization['total'] = \
-                    net_utilization['total'] + int(
-                        cluster_summary.utilization.get(
-                            'total', 0
-                        )
-                )
-                net_utilization['used'] = \
-                    net_utilization['used'] + int(
-                        cluster_summary.utilization.get(
-                            'used', 0
-                        )
-                )
-                net_utilization['percent_used'] = 0
-                if net_utilization['total'] > 0:
-                    net_utilization['percent_used'] = (
-                        net_utilization['used'] * 100
-                    ) / (
-                        net_utilization['total'] * 1.0
-                    )
+        net_utilization.update(aggregate.section('utilization'))
+        if net_utilization['total'] > 0:
+            net_utilization['percent_used'] = (
+                net_utilization['used'] * 100
+            ) / (
+                net_utilization['total'] * 1.0
+            )
         # Push the computed system utilization to time-series db
         NS.time_series_db_manager.get_plugin().push_metrics(
             NS.time_series_db_manager.get_timeseriesnamefromresource(
@@ -134,32 +144,30 @@ class SDSPlugin(object):
         )
         return net_utilization
 
-    def get_system_host_status_wise_counts(self, cluster_summaries):
+    def get_system_host_status_wise_counts(self, aggregate):
         status_wise_count = {
             'total': 0,
             'down': 0,
             'crit_alert_count': 0,
             'warn_alert_count': 0
         }
-        for cluster_summary in cluster_summaries:
-            if self.name in cluster_summary.sds_type:
-                for status, counter in cluster_summary.hosts_count.iteritems():
-                    status_wise_count[status] = \
-                        status_wise_count.get(status, 0) + int(counter)
+        status_wise_count.update(aggregate.section('hosts_count'))
         return status_wise_count
 
-    def get_services_count(self, cluster_det):
+    def get_services_count(self, cluster_det, node_services=None):
+        if node_services is None:
+            node_services = NS.sds_monitoring_manager.node_services
         node_service_counts = {}
-        for node_id, node_det in cluster_det.get('nodes', {}).iteritems():
-            services = etcd_read_key('nodes/%s/Service' % node_id)
+        for node_id in cluster_det.get('nodes', {}):
+            services = node_services.get(node_id, {})
             for service_name, service_det in services.iteritems():
                 if service_name in self.supported_services:
                     if service_name not in node_service_counts:
                         service_counter = {'running': 0, 'not_running': 0}
                     else:
                         service_counter = node_service_counts[service_name]
-                    if service_det['exists'] == 'True':
-                        if service_det['running'] == 'True':
+                    if service_det.get('exists') == 'True':
+                        if service_det.get('running') == 'True':
                             service_counter['running'] = \
                                 service_counter['running'] + 1
                         else:
@@ -168,26 +176,86 @@ class SDSPlugin(object):
                         node_service_counts[service_name] = service_counter
         return node_service_counts
 
-    def get_system_services_count(self, cluster_summaries):
-        system_services_count = {}
-        for cluster_summary in cluster_summaries:
-            if self.name in cluster_summary.sds_type:
-                services_count = cluster_summary.sds_det.get('services_count')
-                if isinstance(services_count, basestring):
-                    services_count = ast.literal_eval(
-                        services_count.encode('ascii', 'ignore')
-                    )
-                for service_name, service_status_counter in \
-                        services_count.iteritems():
-                    service_counter = {}
-                    for service_status, counter in \
-                            service_status_counter.iteritems():
-                        service_counter[service_status] = \
-                            service_counter.get(
-                                service_status, 0
-                        ) + int(counter)
-                    system_services_count[service_name] = service_counter
-        return system_services_count
+    def get_system_services_count(self, aggregate):
+        return aggregate.section('services_count')
+
+
+class SystemAggregate(object):
+    """Mergeable partial aggregates of the clusters of one sds type
+
+    Each cluster contributes a flat Counter of its summable counts and its
+    own top-N lists. The system totals are the running sum of those
+    partials, so replacing the partial of a single changed cluster updates
+    the totals without walking every other cluster again.
+    """
+
+    def __init__(self):
+        self.partials = {}
+        self.totals = Counter()
+        # Number of partials carrying each key, so that keys no cluster
+        # reports any more disappear from the totals as a rescan would.
+        self.key_refs = Counter()
+
+    def update(self, cluster_id, counters, ranked):
+        self.remove(cluster_id)
+        self.totals.update(counters)
+        self.key_refs.update(counters.keys())
+        self.partials[cluster_id] = (counters, ranked)
+
+    def remove(self, cluster_id):
+        previous = self.partials.pop(cluster_id, None)
+        if previous is None:
+            return
+        self.totals.subtract(previous[0])
+        self.key_refs.subtract(previous[0].keys())
+        for key in previous[0]:
+            if self.key_refs[key] <= 0:
+                del self.key_refs[key]
+                del self.totals[key]
+
+    def retain(self, cluster_ids):
+        for cluster_id in set(self.partials) - set(cluster_ids):
+            self.remove(cluster_id)
+
+    def section(self, name):
+        # Rebuild the nested dict of one section from the flat totals.
+        result = {}
+        for key, counter in self.totals.iteritems():
+            if key[0] != name:
+                continue
+            if len(key) == 2:
+                result[key[1]] = counter
+            else:
+                result.setdefault(key[1], {})[key[2]] = counter
+        return result
+
+    def ranked(self, name, sort_key, count=5):
+        return heapq.nlargest(
+            count,
+            itertools.chain.from_iterable(
+                ranked.get(name, []) for _, ranked in self.partials.values()
+            ),
+            key=lambda k: k[sort_key]
+        )
+
+
+def summarise_cluster(sds_name, cluster_id, cluster_det, node_services):
+    # Plain dicts in and out, so that it can run in a worker process
+    for plugin in SDSPlugin.plugins:
+        if plugin.name == sds_name:
+            return plugin.get_cluster_summary(
+                cluster_id,
+                cluster_det,
+                node_services=node_services
+            )
+
+
+def literal_value(value):
+    # Summary attributes read back from etcd may still be the str form of
+    # the dict or list that was saved.
+    if isinstance(value, basestring):
+        return ast.literal_eval(value.encode('ascii', 'ignore'))
+    return value
 
 
 class SDSMonitoringManager(object):
@@ -205,17 +273,79 @@ class SDSMonitoringManager(object):
 
     def __init__(self):
         self.supported_sds = []
+        # node_id -> service_name -> service attributes, restricted to the
+        # services some plugin supports. Refreshed once per summary cycle.
+        self.node_services = {}
+        # sds name -> SystemAggregate of that sds type's clusters
+        self.system_aggregates = {}
+        # SummaryProcessPool computing the plugins' cluster summaries out
+        # of process, when configured
+        self.process_pool = None
         self.load_sds_plugins()
 
+    def refresh_service_index(self):
+        supported_services = set()
+        for plugin in SDSPlugin.plugins:
+            supported_services.update(plugin.supported_services)
+        self.node_services = NS.central_store_thread.get_node_services(
+            supported_services
+        )
+
     def get_cluster_summary(self, cluster_id, cluster_det):
         sds_name = cluster_det.get('TendrlContext', {}).get('sds_name')
+        if self.process_pool is None:
+            return summarise_cluster(
+                sds_name,
+                cluster_id,
+                cluster_det,
+                self.node_services
+            )
+        # Only the services of the cluster's nodes are sent along
+        node_services = dict(
+            (node_id, self.node_services[node_id])
+            for node_id in cluster_det.get('nodes', {})
+            if node_id in self.node_services
+        )
+        return self.process_pool.summarise(
+            sds_name,
+            cluster_id,
+            cluster_det,
+            node_services
+        )
+
+    def get_system_aggregate(self, sds_name):
+        if sds_name not in self.system_aggregates:
+            self.system_aggregates[sds_name] = SystemAggregate()
+        return self.system_aggregates[sds_name]
+
+    def update_cluster_aggregate(self, cluster_summary, cluster_det):
         for plugin in SDSPlugin.plugins:
-            if plugin.name == sds_name:
-                return plugin.get_cluster_summary(cluster_id, cluster_det)
+            if plugin.name == cluster_summary.sds_type:
+                self.get_system_aggregate(plugin.name).update(
+                    cluster_summary.cluster_id,
+                    plugin.get_cluster_counters(cluster_summary, cluster_det),
+                    plugin.get_cluster_ranked(cluster_summary)
+                )
+                return
 
     def compute_system_summary(self, cluster_summaries, clusters):
+        # Single pass over the clusters, grouped by their exact sds type.
+        for cluster_summary in cluster_summaries:
+            self.update_cluster_aggregate(
+                cluster_summary,
+                clusters.get(cluster_summary.cluster_id, {})
+            )
         for plugin in SDSPlugin.plugins:
-            plugin.compute_system_summary(cluster_summaries, clusters)
+            aggregate = self.get_system_aggregate(plugin.name)
+            # Clusters that could not be summarised this cycle keep their
+            # previous partials
+            aggregate.retain([
+                cluster_id for cluster_id, cluster_det in clusters.iteritems()
+                if cluster_det.get(
+                    'TendrlContext', {}
+                ).get('sds_name') == plugin.name
+            ])
+            plugin.compute_system_summary(aggregate)
 
     def configure_monitoring(self, integration_id):
         try:
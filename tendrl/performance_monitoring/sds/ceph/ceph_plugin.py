@@ -4,6 +4,7 @@ from tendrl.commons.event import Event
 from tendrl.commons.message import ExceptionMessage
 from tendrl.performance_monitoring.objects.system_summary \
     import SystemSummary
+from tendrl.performance_monitoring.sds import literal_value
 from tendrl.performance_monitoring.sds import SDSPlugin
 from tendrl.performance_monitoring.utils import read as etcd_read_key
 
@@ -143,13 +144,14 @@ class CephPlugin(SDSPlugin):
         )
         return mon_status_wise_counts
 
-    def get_cluster_summary(self, cluster_id, cluster_det):
+    def get_cluster_summary(self, cluster_id, cluster_det, node_services=None):
         ret_val = {}
         ret_val['most_used_pools'] = self.get_most_used_pools(
             cluster_det
         )
         ret_val['services_count'] = self.get_services_count(
-            cluster_det
+            cluster_det,
+            node_services
         )
         ret_val['most_used_rbds'] = self.get_most_used_rbds(
             cluster_det
@@ -160,105 +162,72 @@ class CephPlugin(SDSPlugin):
         ret_val['mon_counts'] = self.get_mon_status_wise_counts(cluster_det)
         return ret_val
 
-    def get_system_mon_status_wise_counts(self, cluster_summaries):
-        mon_status_wise_counts = {}
-        for cluster_summary in cluster_summaries:
-            if self.name in cluster_summary.sds_type:
-                cluster_mon_count = \
-                    cluster_summary.sds_det.get('mon_counts', {})
-                if (
-                    isinstance(cluster_mon_count, unicode) and not
-                        isinstance(cluster_mon_count, dict)
-                ):
-                    cluster_mon_count = ast.literal_eval(
-                        cluster_mon_count.encode('ascii', 'ignore')
-                    )
-                for status, count in cluster_mon_count.iteritems():
-                    mon_status_wise_counts[status] = \
-                        mon_status_wise_counts.get(status, 0) + int(count)
-        return mon_status_wise_counts
+    def get_cluster_counters(self, cluster_summary, cluster_det):
+        counters = super(CephPlugin, self).get_cluster_counters(
+            cluster_summary,
+            cluster_det
+        )
+        for section in ['mon_counts', 'osd_counts']:
+            cluster_counts = literal_value(
+                cluster_summary.sds_det.get(section, {})
+            )
+            for status, count in cluster_counts.iteritems():
+                counters[(section, status)] = int(count)
+        return counters
+
+    def get_cluster_ranked(self, cluster_summary):
+        ranked = {}
+        for section in ['most_used_pools', 'most_used_rbds']:
+            ranked[section] = [
+                literal_value(entity) for entity in literal_value(
+                    cluster_summary.sds_det.get(section, [])
+                )
+            ]
+        return ranked
 
-    def get_system_osd_status_wise_counts(self, cluster_summaries):
-        osd_status_wise_counts = {}
-        for cluster_summary in cluster_summaries:
-            if self.name in cluster_summary.sds_type:
-                cluster_osd_count = \
-                    cluster_summary.sds_det.get('osd_counts', {})
-                if (
-                    isinstance(cluster_osd_count, unicode) and not
-                        isinstance(cluster_osd_count, dict)
-                ):
-                    cluster_osd_count = ast.literal_eval(
-                        cluster_osd_count.encode('ascii', 'ignore')
-                    )
-                for status, count in cluster_osd_count.iteritems():
-                    osd_status_wise_counts[status] = \
-                        osd_status_wise_counts.get(status, 0) + count
-        return osd_status_wise_counts
+    def get_system_mon_status_wise_counts(self, aggregate):
+        return aggregate.section('mon_counts')
 
-    def get_system_max_used_pools(self, cluster_summaries):
-        pools = []
-        for cluster_summary in cluster_summaries:
-            if self.name in cluster_summary.sds_type:
-                cluster_most_used_pools = \
-                    cluster_summary.sds_det.get('most_used_pools', {})
-                if isinstance(cluster_most_used_pools, basestring):
-                    cluster_most_used_pools = ast.literal_eval(
-                        cluster_most_used_pools.encode('ascii', 'ignore')
-                    )
-                for pool in cluster_most_used_pools:
-                    if isinstance(pool, unicode):
-                        pool = pool.encode('ascii', 'ignore')
-                        pool = ast.literal_eval(pool)
-                    pools.append(pool)
-        most_used_pools = \
-            sorted(pools, key=lambda k: k['percent_used'])
-        most_used_pools.reverse()
-        return most_used_pools[:5]
+    def get_system_osd_status_wise_counts(self, aggregate):
+        return aggregate.section('osd_counts')
 
-    def get_system_max_used_rbds(self, cluster_summaries):
-        rbds = []
-        for cluster_summary in cluster_summaries:
-            if self.name in cluster_summary.sds_type:
-                cluster_most_used_rbds = \
-                    cluster_summary.sds_det.get('most_used_rbds', {})
-                if (
-                    isinstance(cluster_most_used_rbds, unicode) and not
-                        isinstance(cluster_most_used_rbds, list)
-                ):
-                    cluster_most_used_rbds = ast.literal_eval(
-                        cluster_most_used_rbds.encode('ascii', 'ignore')
-                    )
-                rbds.extend(cluster_most_used_rbds)
-        most_used_rbds = \
-            sorted(rbds, key=lambda k: k['percent_used'])
-        most_used_rbds.reverse()
-        return most_used_rbds[:5]
+    def get_system_max_used_pools(self, aggregate):
+        return aggregate.ranked('most_used_pools', 'percent_used')
+
+    def get_system_max_used_rbds(self, aggregate):
+        return aggregate.ranked('most_used_rbds', 'percent_used')
 
-    def compute_system_summary(self, cluster_summaries, clusters):
+    def compute_system_summary(self, aggregate):
         try:
-            SystemSummary(
-                utilization=self.get_system_utilization(cluster_summaries),
+            summary = SystemSummary(
+                utilization=self.get_system_utilization(aggregate),
                 hosts_count=self.get_system_host_status_wise_counts(
-                    cluster_summaries
+                    aggregate
                 ),
-                cluster_count=self.get_clusters_status_wise_counts(clusters),
+                cluster_count=self.get_clusters_status_wise_counts(aggregate),
                 sds_det={
                     'mon_counts': self.get_system_mon_status_wise_counts(
-                        cluster_summaries
+                        aggregate
                     ),
                     'osd_counts': self.get_system_osd_status_wise_counts(
-                        cluster_summaries
+                        aggregate
                     ),
                     'most_used_pools': self.get_system_max_used_pools(
-                        cluster_summaries
+                        aggregate
                     ),
                     'most_used_rbds': self.get_system_max_used_rbds(
-                        cluster_summaries
+                        aggregate
                     )
                 },
                 sds_type=self.name
-            ).save(update=False)
+            )
+            # save() serializes the nested dicts in place
+            NS.central_store_thread.snapshot_summary(
+                'systems',
+                self.name,
+                summary.to_json()
+            )
+            summary.save(update=False)
         except Exception as ex:
             Event(
                 ExceptionMessage(
@@ -4,6 +4,7 @@ from tendrl.commons.event import Event
 from tendrl.commons.message import ExceptionMessage
 from tendrl.performance_monitoring.objects.system_summary \
     import SystemSummary
+from tendrl.performance_monitoring.sds import literal_value
 from tendrl.performance_monitoring.sds import SDSPlugin
 from tendrl.performance_monitoring.utils import read as etcd_read_key
 
@@ -83,10 +84,11 @@ class GlusterFSPlugin(SDSPlugin):
             most_used_volumes.append(vol_det)
         return most_used_volumes[:5]
 
-    def get_cluster_summary(self, cluster_id, cluster_det):
+    def get_cluster_summary(self, cluster_id, cluster_det, node_services=None):
         ret_val = {}
         ret_val['services_count'] = self.get_services_count(
-            cluster_det
+            cluster_det,
+            node_services
         )
         ret_val['volume_status_wise_counts'] = \
             self.get_volume_status_wise_counts(
@@ -97,65 +99,61 @@ class GlusterFSPlugin(SDSPlugin):
         )
         return ret_val
 
-    def get_system_volume_status_wise_counts(self, cluster_summaries):
-        volume_status_wise_counts = {}
-        for cluster_summary in cluster_summaries:
-            if self.name in cluster_summary.sds_type:
-                cluster_volume_count = cluster_summary.sds_det.get(
-                    'volume_status_wise_counts', {}
+    def get_cluster_counters(self, cluster_summary, cluster_det):
+        counters = super(GlusterFSPlugin, self).get_cluster_counters(
+            cluster_summary,
+            cluster_det
+        )
+        cluster_volume_count = literal_value(
+            cluster_summary.sds_det.get('volume_status_wise_counts', {})
+        )
+        for status, count in cluster_volume_count.iteritems():
+            counters[('volume_counts', status)] = int(count)
+        return counters
+
+    def get_cluster_ranked(self, cluster_summary):
+        return {
+            'most_used_volumes': [
+                literal_value(volume) for volume in literal_value(
+                    cluster_summary.sds_det.get('most_used_volumes', [])
                 )
-                if isinstance(cluster_volume_count, unicode):
-                    cluster_volume_count = ast.literal_eval(
-                        cluster_volume_count.encode('ascii', 'replace')
-                    )
-                for status, count in cluster_volume_count.iteritems():
-                    volume_status_wise_counts[status] = \
-                        volume_status_wise_counts.get(status, 0) + int(count)
-        return volume_status_wise_counts
+            ]
+        }
 
-    def get_system_max_used_volumes(self, cluster_summaries):
-        most_used_volumes = []
-        for cluster_summary in cluster_summaries:
-            if self.name in cluster_summary.sds_type:
-                cluster_most_used_volumes = \
-                    cluster_summary.sds_det.get('most_used_volumes', {})
-                if isinstance(cluster_most_used_volumes, basestring):
-                    cluster_most_used_volumes = ast.literal_eval(
-                        cluster_most_used_volumes.encode(
-                            'ascii', 'ignore'
-                        )
-                    )
-                for volume in cluster_most_used_volumes:
-                    if isinstance(volume, unicode):
-                        volume = volume.encode('ascii', 'ignore')
-                        volume = ast.literal_eval(volume)
-                    most_used_volumes.append(volume)
-        most_used_volumes = \
-            sorted(most_used_volumes, key=lambda k: k['pcnt_used'])
-        most_used_volumes.reverse()
-        return most_used_volumes[:5]
+    def get_system_volume_status_wise_counts(self, aggregate):
+        return aggregate.section('volume_counts')
 
-    def compute_system_summary(self, cluster_summaries, clusters):
+    def get_system_max_used_volumes(self, aggregate):
+        return aggregate.ranked('most_used_volumes', 'pcnt_used')
+
+    def compute_system_summary(self, aggregate):
         try:
-            SystemSummary(
-                utilization=self.get_system_utilization(cluster_summaries),
+            summary = SystemSummary(
+                utilization=self.get_system_utilization(aggregate),
                 hosts_count=self.get_system_host_status_wise_counts(
-                    cluster_summaries
+                    aggregate
                 ),
-                cluster_count=self.get_clusters_status_wise_counts(clusters),
+                cluster_count=self.get_clusters_status_wise_counts(aggregate),
                 sds_det={
                     'volume_counts': self.get_system_volume_status_wise_counts(
-                        cluster_summaries
+                        aggregate
                     ),
                     'most_used_volumes': self.get_system_max_used_volumes(
-                        cluster_summaries
+                        aggregate
                     ),
                     'services_count': self.get_system_services_count(
-                        cluster_summaries
+                        aggregate
                     )
                 },
                 sds_type=self.name
-            ).save(update=False)
+            )
+            # save() serializes the nested dicts in place
+            NS.central_store_thread.snapshot_summary(
+                'systems',
+                self.name,
+                summary.to_json()
+            )
+            summary.save(update=False)
         except Exception as ex:
             Event(
                 ExceptionMessage(
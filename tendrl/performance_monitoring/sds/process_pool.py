@@ -0,0 +1,197 @@
+import cPickle
+import errno
+import fcntl
+import gevent
+import gevent.queue
+import os
+import signal
+import socket
+import struct
+
+from tendrl.performance_monitoring.exceptions \
+    import TendrlPerformanceMonitoringException
+from tendrl.performance_monitoring import instrumentation
+from tendrl.performance_monitoring.sds import summarise_cluster
+
+# Length of the pickled message that follows
+MESSAGE_HEADER = struct.Struct('!L')
+
+POOL_FAILURES = instrumentation.counter(
+    'tendrl_pm_summary_pool_failures_total',
+    'Cluster summaries the process pool failed to compute',
+    ['reason']
+)
+POOL_SECONDS = instrumentation.histogram(
+    'tendrl_pm_summary_pool_seconds',
+    'Time to compute a cluster summary in the process pool, queueing '
+    'included'
+)
+
+
+def read_exactly(fd, size):
+    data = ''
+    while len(data) < size:
+        chunk = os.read(fd, size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+
+def write_all(fd, data):
+    while data:
+        data = data[os.write(fd, data):]
+
+
+class _Worker(object):
+    def __init__(self, pid, sock):
+        self.pid = pid
+        self.sock = sock
+
+    def request(self, message):
+        payload = cPickle.dumps(message, cPickle.HIGHEST_PROTOCOL)
+        self.sock.sendall(MESSAGE_HEADER.pack(len(payload)) + payload)
+        header = self.recv(MESSAGE_HEADER.size)
+        return cPickle.loads(self.recv(MESSAGE_HEADER.unpack(header)[0]))
+
+    def recv(self, size):
+        data = ''
+        while len(data) < size:
+            chunk = self.sock.recv(size - len(data))
+            if not chunk:
+                raise EOFError('Worker %s exited' % self.pid)
+            data += chunk
+        return data
+
+    def kill(self):
+        self.sock.close()
+        try:
+            os.kill(self.pid, signal.SIGKILL)
+            os.waitpid(self.pid, 0)
+        except OSError as ex:
+            if ex.errno not in (errno.ESRCH, errno.ECHILD):
+                raise
+
+
+class SummaryProcessPool(object):
+    """Forked worker processes computing the sds plugins' cluster summaries
+
+    A cluster's details and the services of its nodes are sent to an idle
+    worker as plain dicts, and the plugin's summary dict is sent back, so
+    the CPU bound part of a cluster summary does not hold up the gevent
+    hub. Waiting for a worker only blocks the calling greenlet. A worker
+    that takes longer than timeout seconds is killed and replaced.
+
+    Workers are forked the first time a summary is requested, after the
+    plugins are loaded, and do nothing but compute summaries: they never
+    run the hub or touch NS.
+    """
+
+    def __init__(self, workers=2, timeout=60):
+        self.size = workers
+        self.timeout = timeout
+        self.workers = []
+        self.idle = gevent.queue.Queue()
+
+    def start(self):
+        for _ in range(self.size):
+            self.idle.put(self.spawn())
+
+    def spawn(self):
+        parent_sock, child_sock = socket.socketpair()
+        pid = os.fork()
+        if pid:
+            child_sock.close()
+            worker = _Worker(pid, parent_sock)
+            self.workers.append(worker)
+            return worker
+        # Worker process
+        status = 1
+        try:
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            parent_sock.close()
+            for worker in self.workers:
+                worker.sock.close()
+            fd = child_sock.fileno()
+            # gevent made the socket non blocking; the worker blocks on it
+            # rather than yielding to the hub, which it shares with the
+            # parent's greenlets
+            fcntl.fcntl(
+                fd,
+                fcntl.F_SETFL,
+                fcntl.fcntl(fd, fcntl.F_GETFL) & ~os.O_NONBLOCK
+            )
+            self.serve(fd)
+            status = 0
+        finally:
+            os._exit(status)
+
+    def serve(self, fd):
+        while True:
+            header = read_exactly(fd, MESSAGE_HEADER.size)
+            if header is None:
+                return
+            request = cPickle.loads(
+                read_exactly(fd, MESSAGE_HEADER.unpack(header)[0])
+            )
+            try:
+                response = (True, summarise_cluster(*request))
+            except Exception as ex:
+                response = (False, '%s: %s' % (type(ex).__name__, str(ex)))
+            payload = cPickle.dumps(response, cPickle.HIGHEST_PROTOCOL)
+            write_all(fd, MESSAGE_HEADER.pack(len(payload)) + payload)
+
+    def replace(self, worker):
+        # Kill worker, which may have a response left unread, and put a
+        # new one on the idle queue unless the pool was stopped meanwhile
+        worker.kill()
+        if worker in self.workers:
+            self.workers.remove(worker)
+            self.idle.put(self.spawn())
+
+    @POOL_SECONDS.time()
+    def summarise(self, sds_name, cluster_id, cluster_det, node_services):
+        if not self.workers:
+            self.start()
+        worker = self.idle.get()
+        timeout = gevent.Timeout(self.timeout)
+        try:
+            with timeout:
+                ok, result = worker.request(
+                    (sds_name, cluster_id, cluster_det, node_services)
+                )
+        except BaseException as ex:
+            # Only a worker that completed its response goes back idle,
+            # whatever interrupted this one, GreenletExit included
+            self.replace(worker)
+            if ex is timeout:
+                POOL_FAILURES.inc(reason='timeout')
+                raise TendrlPerformanceMonitoringException(
+                    'Summary of cluster %s took longer than %ss' % (
+                        cluster_id,
+                        self.timeout
+                    )
+                )
+            if isinstance(ex, (EOFError, EnvironmentError)):
+                POOL_FAILURES.inc(reason='worker')
+                raise TendrlPerformanceMonitoringException(
+                    'Summary of cluster %s failed. Error %s' % (
+                        cluster_id,
+                        str(ex)
+                    )
+                )
+            raise
+        self.idle.put(worker)
+        if not ok:
+            POOL_FAILURES.inc(reason='error')
+            raise TendrlPerformanceMonitoringException(
+                'Summary of cluster %s failed. Error %s' % (cluster_id, result)
+            )
+        return result
+
+    def stop(self):
+        for worker in self.workers:
+            worker.kill()
+        self.workers = []
+        self.idle = gevent.queue.Queue()
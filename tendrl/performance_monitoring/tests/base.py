@@ -1,5 +1,55 @@
+import __builtin__
+import contextlib
+from mock import MagicMock
+import sys
+
+# The tendrl.commons modules the modules under test import
+COMMONS_MODULES = (
+    'tendrl.commons',
+    'tendrl.commons.central_store',
+    'tendrl.commons.config',
+    'tendrl.commons.etcdobj',
+    'tendrl.commons.event',
+    'tendrl.commons.message',
+    'tendrl.commons.objects',
+    'tendrl.commons.objects.job',
+)
 
 
 class TestCase(object):
 
     """Test case base class for all unit tests."""
+
+
+@contextlib.contextmanager
+def commons_stubs():
+    """tendrl.commons and NS stubbed out while the modules under test import
+
+    The modules keep the stubs they imported. sys.modules and NS are
+    restored on exit, so the stubs do not leak into the other test files,
+    and the tests set the NS they use themselves.
+    """
+    missing = object()
+    saved = dict(
+        (name, sys.modules.get(name, missing)) for name in COMMONS_MODULES
+    )
+    saved_ns = getattr(__builtin__, 'NS', missing)
+    commons = MagicMock()
+    commons.central_store.EtcdCentralStore = object
+    stubs = dict((name, MagicMock()) for name in COMMONS_MODULES)
+    stubs['tendrl.commons'] = commons
+    stubs['tendrl.commons.central_store'] = commons.central_store
+    sys.modules.update(stubs)
+    __builtin__.NS = MagicMock()
+    try:
+        yield
+    finally:
+        for name, module in saved.iteritems():
+            if module is missing:
+                sys.modules.pop(name, None)
+            else:
+                sys.modules[name] = module
+        if saved_ns is missing:
+            del __builtin__.NS
+        else:
+            __builtin__.NS = saved_ns
@@ -0,0 +1,90 @@
+import __builtin__
+from base import commons_stubs
+import gevent
+from mock import MagicMock
+import socket
+with commons_stubs():
+    from tendrl.performance_monitoring.manager.api_server import APIServer
+
+
+def hello(environ, start_response):
+    start_response('200 OK', [('Content-Type', 'text/plain')])
+    return ['hello']
+
+
+def get(sock):
+    sock.sendall('GET / HTTP/1.1\r\nHost: localhost\r\n\r\n')
+    response = ''
+    while not response.endswith('hello'):
+        data = sock.recv(4096)
+        if not data:
+            break
+        response += data
+    return response
+
+
+class TestAPIServer(object):
+    def setup_method(self, method):
+        __builtin__.NS = MagicMock()
+
+    def serve(self, **kwargs):
+        server = APIServer(hello, '127.0.0.1', 0, **kwargs)
+        server.start()
+        return server, server.listener.getsockname()
+
+    def test_keepalive(self):
+        server, address = self.serve(keepalive_timeout=0.2)
+        try:
+            sock = socket.create_connection(address)
+            # Fail rather than hang if the server keeps the connection
+            sock.settimeout(5)
+            assert get(sock).startswith('HTTP/1.1 200')
+            # Same connection serves the next request
+            assert get(sock).startswith('HTTP/1.1 200')
+            # and is closed once idle for longer than keepalive_timeout
+            gevent.sleep(0.5)
+            assert sock.recv(4096) == ''
+        finally:
+            server.stop()
+
+    def test_no_keepalive(self):
+        server, address = self.serve(keepalive=False)
+        try:
+            sock = socket.create_connection(address)
+            # Fail rather than hang if the server keeps the connection
+            sock.settimeout(5)
+            response = get(sock)
+            assert 'Connection: close' in response
+            assert sock.recv(4096) == ''
+        finally:
+            server.stop()
+
+    def test_from_config(self):
+        server = APIServer.from_config(
+            hello,
+            {
+                'api_server_addr': '127.0.0.1',
+                'api_server_port': '5000',
+                'api_server_workers': 4,
+                'api_server_request_timeout': 10,
+            }
+        )
+        assert server.address == ('127.0.0.1', 5000)
+        assert server.workers == 4
+        assert server.max_connections == 1000
+        assert server.handler_class.request_timeout == 10.0
+        assert server.handler_class.keepalive_timeout == 5.0
+        assert server.handler_class.keepalive is True
+
+    def test_keepalive_config_strings(self):
+        for value, expected in [('false', False), ('True', True),
+                                ('no', False), (False, False)]:
+            server = APIServer.from_config(
+                hello,
+                {
+                    'api_server_addr': '127.0.0.1',
+                    'api_server_port': 5000,
+                    'api_server_keepalive': value,
+                }
+            )
+            assert server.handler_class.keepalive is expected
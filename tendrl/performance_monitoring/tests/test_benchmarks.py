@@ -0,0 +1,244 @@
+from base import commons_stubs
+import etcd
+from etcd import EtcdDirNotEmpty
+from etcd import EtcdEventIndexCleared
+from etcd import EtcdKeyNotFound
+from etcd import EtcdNotFile
+import json
+import pytest
+import time
+with commons_stubs():
+    from tendrl.performance_monitoring.aggregator import cluster_summary
+    from tendrl.performance_monitoring.aggregator import node_summary
+    from tendrl.performance_monitoring.benchmarks.etcd_http \
+        import EtcdHTTPServer
+    from tendrl.performance_monitoring.benchmarks.etcd_store import MemoryEtcd
+    from tendrl.performance_monitoring.benchmarks.etcd_store \
+        import MemoryEtcdClient
+    from tendrl.performance_monitoring.benchmarks.faults import Latency
+    from tendrl.performance_monitoring.benchmarks import fixtures
+    from tendrl.performance_monitoring.benchmarks import graphite_standin
+    from tendrl.performance_monitoring.benchmarks.graphite_standin \
+        import GraphiteWebServer
+    from tendrl.performance_monitoring.benchmarks.graphite_standin \
+        import MetricStore
+    from tendrl.performance_monitoring.benchmarks import load
+    from tendrl.performance_monitoring.benchmarks import summary
+    from tendrl.performance_monitoring.sds.ceph import ceph_plugin
+    from tendrl.performance_monitoring.sds.glusterfs import glusterfs_plugin
+
+
+class Server(object):
+    def __init__(self, client):
+        self.client = client
+
+
+class Summary(object):
+    # Stands in for the summary objects, whose BaseObject is mocked
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+    def load(self):
+        raise EtcdKeyNotFound()
+
+    def save(self, update=True):
+        pass
+
+    def to_json(self):
+        return self.__dict__
+
+    def copy(self):
+        return Summary(**self.__dict__)
+
+
+class TestMemoryEtcd(object):
+    def test_read_write_delete(self):
+        client = MemoryEtcdClient()
+        client.write('/a/b/c', '1')
+        client.write('/a/b/d', '2')
+        assert client.read('/a/b/c').value == '1'
+        assert sorted(
+            leaf.key for leaf in client.read('/a', recursive=True).leaves
+        ) == ['/a/b/c', '/a/b/d']
+        with pytest.raises(EtcdDirNotEmpty):
+            client.delete('/a/b')
+        client.delete('/a/b', recursive=True)
+        with pytest.raises(EtcdKeyNotFound):
+            client.read('/a/b/c')
+        assert client.reads == 3
+        assert client.writes == 4
+
+    def test_watch(self):
+        store = MemoryEtcd(history=2)
+        client = MemoryEtcdClient(store)
+        client.write('/w/x', '1')
+        index = store.index
+        client.write('/w/y', '2')
+        result = client.watch('/w', index=index, recursive=True)
+        assert (result.key, result.value) == ('/w/x', '1')
+        client.write('/w/z', '3')
+        client.write('/w/z', '4')
+        # The event at index was dropped from the history
+        with pytest.raises(EtcdEventIndexCleared):
+            client.watch('/w', index=index, recursive=True)
+
+
+class TestSummaryBenchmark(object):
+    def test_main(self, monkeypatch, capsys):
+        monkeypatch.setattr(summary, 'EtcdServer', Server)
+        monkeypatch.setattr(node_summary, 'NodeSummary', Summary)
+        monkeypatch.setattr(cluster_summary, 'ClusterSummary', Summary)
+        monkeypatch.setattr(ceph_plugin, 'SystemSummary', Summary)
+        monkeypatch.setattr(glusterfs_plugin, 'SystemSummary', Summary)
+        summary.main(['--nodes', '10', '--clusters', '2', '--repeat', '1'])
+        results = [
+            json.loads(line)
+            for line in capsys.readouterr()[0].splitlines()
+        ]
+        assert [result['benchmark'] for result in results] == [
+            name for name, _ in summary.BENCHMARKS
+        ]
+        for result in results:
+            assert set(result) == set([
+                'benchmark', 'nodes', 'clusters', 'repeat', 'throttle',
+                'min', 'median', 'max', 'etcd_reads', 'etcd_writes',
+                'time_series_queries',
+            ])
+            assert (result['nodes'], result['clusters']) == (10, 2)
+        assert results[0]['etcd_reads'] > 0
+
+    def test_fleet(self):
+        tree = fixtures.build_fleet(10, 2)
+        assert len(tree['nodes']) == 10
+        sds_names = sorted(
+            cluster['TendrlContext']['sds_name']
+            for cluster in tree['clusters'].values()
+        )
+        assert sds_names == ['ceph', 'gluster']
+
+
+class TestGraphiteStandIn(object):
+    def test_expand_braces(self):
+        assert graphite_standin.expand_braces('a.b') == ['a.b']
+        assert graphite_standin.expand_braces('a.{b,c}.{d,e}') == [
+            'a.b.d', 'a.b.e', 'a.c.d', 'a.c.e'
+        ]
+
+    def test_parse_from(self):
+        now = 100000
+        assert graphite_standin.parse_from(None, now) == \
+            now - graphite_standin.RETENTION
+        assert graphite_standin.parse_from('-30s', now) == now - 30
+        assert graphite_standin.parse_from('-30min', now) == now - 1800
+        assert graphite_standin.parse_from('-2h', now) == now - 7200
+        assert graphite_standin.parse_from('-1d', now) == now - 86400
+        assert graphite_standin.parse_from('5000', now) == 5000
+
+    def test_metric_store(self):
+        store = MetricStore(step=60, retention=600)
+        store.add('a.b.c', 1.0, 6010)
+        # Same step, replaces the point
+        store.add('a.b.c', 2.0, 6059)
+        store.add('a.b.c', 3.0, 6120)
+        store.add('a.x.c', 4.0, 6000)
+        assert store.fetch('a.b.c', 5940, 6180) == [
+            [2.0, 6000], [None, 6060], [3.0, 6120], [None, 6180]
+        ]
+        assert store.match('a.*.c') == ['a.b.c', 'a.x.c']
+        assert store.match('a.{b,y}.c') == ['a.b.c']
+        assert store.match('a.*') == []
+        # Points older than the retention are dropped
+        store.add('a.b.c', 5.0, 6700)
+        assert [timestamp for timestamp, _ in store.series['a.b.c']] == [
+            6120, 6660
+        ]
+
+    def test_render_cacti_style(self):
+        store = MetricStore()
+        now = int(time.time())
+        store.add('a.b', 1.0, now - 120)
+        store.add('a.b', 3.0, now - 60)
+        store.add('a.c', 2.0, now - 60)
+        server = GraphiteWebServer(store)
+        result = json.loads(server.render({
+            'target': ['cactiStyle(a.b)', 'a.c'],
+            'from': ['-5min'],
+        }))
+        assert [series['target'] for series in result] == [
+            'a.b Current:3.00 Max:3.00 Min:1.00', 'a.c'
+        ]
+        assert [2.0] == [
+            value for value, _ in result[1]['datapoints'] if value is not None
+        ]
+
+
+class TestEtcdHTTPServer(object):
+    def setup_method(self, method):
+        self.server = EtcdHTTPServer(MemoryEtcd(history=2))
+        self.server.start()
+        host, port = self.server.address
+        self.client = etcd.Client(host=host, port=port)
+
+    def teardown_method(self, method):
+        self.server.stop()
+
+    def test_error_codes(self):
+        responses = []
+
+        def start_response(status, headers):
+            responses.append(status)
+        for ex, status, code in [
+            (EtcdKeyNotFound('Key not found : /a'), '404 ERROR', 100),
+            (EtcdNotFile('Not a file : /a'), '403 ERROR', 102),
+            (EtcdDirNotEmpty('Directory not empty : /a'), '403 ERROR', 108),
+            (EtcdEventIndexCleared('The event in requested index is '
+                                   'outdated and cleared : /a'),
+             '400 ERROR', 401),
+            (Exception('Raft Internal Error'), '500 ERROR', 300),
+        ]:
+            body = json.loads(self.server.error(start_response, ex, '/a')[0])
+            assert responses.pop() == status
+            assert body['errorCode'] == code
+            assert body['cause'] == '/a'
+
+    def test_python_etcd(self):
+        self.client.write('/a/b', '1')
+        index = self.client.write('/a/c', '2').modifiedIndex
+        assert self.client.read('/a/b').value == '1'
+        assert sorted(
+            (leaf.key, leaf.value)
+            for leaf in self.client.read('/a', recursive=True).leaves
+        ) == [('/a/b', '1'), ('/a/c', '2')]
+        with pytest.raises(EtcdKeyNotFound):
+            self.client.read('/a/missing')
+        with pytest.raises(EtcdDirNotEmpty):
+            self.client.delete('/a')
+        result = self.client.watch('/a', index=index, recursive=True)
+        assert (result.key, result.value) == ('/a/c', '2')
+        self.client.write('/a/b', '3')
+        self.client.write('/a/b', '4')
+        with pytest.raises(EtcdEventIndexCleared):
+            self.client.watch('/a', index=index, recursive=True)
+        assert self.server.stats()['requests']['WATCH'] == 2
+
+
+class TestLoad(object):
+    def test_latency(self):
+        assert Latency().sample() == 0
+        assert Latency('fixed:0.5').sample() == 0.5
+        sample = Latency('uniform:1,2').sample()
+        assert 1 <= sample <= 2
+        assert Latency('exponential:0.1').sample() >= 0
+        assert Latency('lognormal:0.1,0.5').sample() > 0
+        with pytest.raises(ValueError):
+            Latency('pareto:1')
+
+    def test_percentile(self):
+        values = range(1, 101)
+        assert load.percentile(values, 50) == 50
+        assert load.percentile(values, 99) == 99
+        assert load.percentile(values, 100) == 100
+        assert load.percentile([1, 2, 3, 4], 50) == 2
+        assert load.percentile([1.0], 99) == 1.0
+        assert load.percentile([], 50) is None
+        assert load.percentile(range(10), 99) == 9
@@ -0,0 +1,122 @@
+import __builtin__
+from base import commons_stubs
+from etcd import EtcdConnectionFailed
+from etcd import EtcdKeyNotFound
+import json
+from mock import MagicMock
+from mock import patch
+import pytest
+import time
+import urllib3
+with commons_stubs():
+    from tendrl.performance_monitoring.benchmarks.graphite_standin \
+        import GraphiteWebServer
+    from tendrl.performance_monitoring.benchmarks.graphite_standin \
+        import MetricStore
+    from tendrl.performance_monitoring.central_store \
+        import PerformanceMonitoringEtcdCentralStore
+    from tendrl.performance_monitoring.exceptions \
+        import TendrlPerformanceMonitoringException
+    from tendrl.performance_monitoring import manager
+    # The plugins are instantiated, and connect to carbon, when defined
+    with patch('gevent.socket.socket'):
+        from tendrl.performance_monitoring.time_series_db.dbplugins.graphite \
+            import GraphitePlugin
+
+METRICS = (
+    'cpu.percent-user',
+    'cpu.percent-system',
+    'memory.percent-used',
+    'df-root.df_complex-used',
+    'df-var.df_complex-used',
+)
+
+
+class TestBulkStats(object):
+    def setup_method(self, method):
+        __builtin__.NS = MagicMock()
+        store = MetricStore()
+        now = int(time.time())
+        for node in ('node1_example', 'node2_example', 'node3_example'):
+            for metric in METRICS:
+                store.add('collectd.%s.%s' % (node, metric), 1.0, now - 60)
+        self.server = GraphiteWebServer(store)
+        self.server.start()
+        self.plugin = GraphitePlugin.__new__(GraphitePlugin)
+        self.plugin.host, self.plugin.port = self.server.address
+        self.plugin.prefix = 'collectd'
+        self.plugin.http = urllib3.PoolManager()
+
+    def teardown_method(self, method):
+        self.server.stop()
+
+    def test_bulk_targets(self):
+        assert self.plugin.bulk_targets(
+            ['node1.example', 'node2.example'],
+            ['cpu.percent-user', 'cpu.percent-system', 'df-*.df_complex-used']
+        ) == [
+            'collectd.{node1_example,node2_example}.cpu.'
+            '{percent-system,percent-user}',
+            'collectd.{node1_example,node2_example}.df-*.df_complex-used',
+        ]
+
+    def test_node_names_read_failure(self):
+        NS.etcd_orm.client.read.side_effect = EtcdConnectionFailed()
+        store = PerformanceMonitoringEtcdCentralStore()
+        with pytest.raises(TendrlPerformanceMonitoringException):
+            store.get_node_names(['n1', 'n2'])
+
+    def test_one_render_request(self):
+        stats = self.plugin.get_bulk_metric_stats(
+            ['node1.example', 'node2.example'],
+            ['cpu.percent-user', 'memory.percent-used',
+             'df-*.df_complex-used', 'swap.percent-used']
+        )
+        assert self.server.requests == {'/render': 1}
+        assert len(stats) == 8
+        assert [series['target'] for series in stats[
+            ('node1.example', 'df-*.df_complex-used')
+        ]] == [
+            'collectd.node1_example.df-root.df_complex-used',
+            'collectd.node1_example.df-var.df_complex-used',
+        ]
+        # Nulls are removed
+        assert stats[('node2.example', 'cpu.percent-user')][0][
+            'datapoints'
+        ] == [[1.0, int(time.time()) // 60 * 60 - 60]]
+        assert stats[('node2.example', 'swap.percent-used')] == []
+
+    def test_endpoint(self):
+        NS.time_series_db_manager.get_plugin.return_value = self.plugin
+        fqdns = {
+            '/nodes/n1/NodeContext/fqdn': 'node1.example',
+            '/nodes/n3/NodeContext/fqdn': 'node3.example',
+        }
+        reads = []
+
+        def etcd_read(key):
+            reads.append(key)
+            if key not in fqdns:
+                raise EtcdKeyNotFound()
+            return MagicMock(value=fqdns[key])
+        NS.etcd_orm.client.read.side_effect = etcd_read
+        NS.central_store_thread = PerformanceMonitoringEtcdCentralStore()
+        client = manager.app.test_client()
+        response = client.get(
+            '/monitoring/stats?nodes=n1,n2&resources=cpu.percent-user,'
+            'memory.percent-used'
+        )
+        assert response.status_code == 200
+        stats = json.loads(response.data)
+        # n2 has no fqdn
+        assert stats.keys() == ['n1']
+        assert sorted(stats['n1']) == ['cpu.percent-user',
+                                       'memory.percent-used']
+        assert stats['n1']['cpu.percent-user'][0]['target'] == \
+            'collectd.node1_example.cpu.percent-user'
+        # Only the fqdns of the requested nodes are read
+        assert sorted(reads) == [
+            '/nodes/n1/NodeContext/fqdn',
+            '/nodes/n2/NodeContext/fqdn',
+        ]
+        assert client.get('/monitoring/stats?nodes=n1').status_code == 400
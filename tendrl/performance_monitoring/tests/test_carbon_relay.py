@@ -0,0 +1,129 @@
+import __builtin__
+from base import commons_stubs
+import cPickle
+import gevent
+from gevent.server import StreamServer
+from gevent import socket
+from mock import MagicMock
+import pickle
+import struct
+import sys
+import time
+with commons_stubs():
+    from tendrl.performance_monitoring.aggregator.node_summary \
+        import NodeSummarise
+    from tendrl.performance_monitoring.time_series_db import carbon_relay
+    from tendrl.performance_monitoring.time_series_db.carbon_relay \
+        import CarbonRelay
+
+
+class Exploit(object):
+    def __reduce__(self):
+        return (sys.exit, (1,))
+
+
+class TestCarbonRelay(object):
+    def setup_method(self, method):
+        __builtin__.NS = MagicMock()
+        self.received = []
+        self.upstream = StreamServer(('127.0.0.1', 0), self.collect)
+        self.upstream.start()
+        self.relay = CarbonRelay(
+            ('127.0.0.1', self.upstream.server_port),
+            addr='127.0.0.1',
+            port=0,
+            pickle_port=0
+        )
+
+    def teardown_method(self, method):
+        self.relay.stop()
+        self.upstream.stop()
+
+    def collect(self, sock, address):
+        for line in sock.makefile():
+            self.received.append(line)
+
+    def send(self, port, data):
+        sock = socket.create_connection(('127.0.0.1', port))
+        sock.sendall(data)
+        sock.close()
+
+    def start(self):
+        # Listens on ports picked by the kernel
+        self.relay.servers = [
+            StreamServer(('127.0.0.1', 0), self.relay.handle_plaintext),
+            StreamServer(('127.0.0.1', 0), self.relay.handle_pickle),
+        ]
+        for server in self.relay.servers:
+            server.start()
+        self.relay.sender = gevent.spawn(self.relay.send)
+        return [server.server_port for server in self.relay.servers]
+
+    def test_plaintext_forwarded_and_kept(self):
+        plaintext_port, _ = self.start()
+        now = int(time.time())
+        self.send(plaintext_port, (
+            'collectd.node1_example.cpu.percent-user 12.5 %d\n'
+            'collectd.node1_example.cpu.percent-user 10.0 %d\n'
+            'collectd.node1_example.df-root.df_complex-used 300 %d\n'
+            'collectd.node1_example.df-var.df_complex-used 200 %d\n'
+            'collectd.node1_example.interface-eth0.if_octets.rx 7 %d\n'
+            'not a datapoint line\n'
+        ) % (now, now - 60, now, now, now))
+        gevent.sleep(0.1)
+        assert len(self.received) == 5
+        assert self.received[0] == \
+            'collectd.node1_example.cpu.percent-user 12.5 %d\n' % now
+        # The late datapoint does not replace the latest value
+        assert self.relay.latest('node1.example', 'cpu.percent-user') == \
+            [12.5]
+        assert self.relay.latest(
+            'node1.example',
+            'df-*.df_complex-used'
+        ) == [300.0, 200.0]
+        # Only the series the summaries read are kept
+        assert self.relay.latest('node1.example', 'interface-*') is None
+        assert carbon_relay.RELAY_DROPPED.values[('malformed',)] >= 1
+
+    def test_pickle(self):
+        _, pickle_port = self.start()
+        now = time.time()
+        payload = cPickle.dumps([
+            ('collectd.node1.memory.percent-used', (now, 42.0)),
+        ], 2)
+        self.send(
+            pickle_port,
+            struct.pack('!L', len(payload)) + payload
+        )
+        gevent.sleep(0.1)
+        assert self.relay.latest('node1', 'memory.percent-used') == [42.0]
+        assert self.received == [
+            'collectd.node1.memory.percent-used 42.0 %d\n' % now
+        ]
+
+    def test_pickle_globals_refused(self):
+        _, pickle_port = self.start()
+        payload = pickle.dumps([Exploit()])
+        self.send(
+            pickle_port,
+            struct.pack('!L', len(payload)) + payload
+        )
+        gevent.sleep(0.1)
+        assert self.received == []
+
+    def test_stale_values_not_served(self):
+        self.relay.max_age = 600
+        self.relay.record('collectd.node1.cpu.percent-user', 5.0,
+                          time.time() - 700)
+        assert self.relay.latest('node1', 'cpu.percent-user') is None
+
+    def test_node_summary_from_relay(self):
+        self.relay.record('collectd.node1.cpu.percent-user', 5.0,
+                          time.time())
+        self.relay.record('collectd.node1.cpu.percent-system', 2.0,
+                          time.time())
+        NS.central_store_thread.get_node_name_from_id.return_value = 'node1'
+        summariser = NodeSummarise(relay=self.relay)
+        usage = summariser.get_net_host_cpu_utilization('n1')
+        assert usage['percent_used'] == '7.0'
+        assert not NS.time_series_db_manager.get_plugin.called
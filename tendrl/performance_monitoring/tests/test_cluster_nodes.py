@@ -0,0 +1,121 @@
+import __builtin__
+from base import commons_stubs
+from etcd import EtcdKeyNotFound
+import json
+from mock import MagicMock
+import os
+import shutil
+import tempfile
+with commons_stubs():
+    from tendrl.performance_monitoring.aggregator import cluster_summary
+    from tendrl.performance_monitoring.aggregator.cluster_summary \
+        import ClusterSummarise
+    from tendrl.performance_monitoring.central_store \
+        import PerformanceMonitoringEtcdCentralStore
+    from tendrl.performance_monitoring.central_store.snapshot \
+        import SummarySnapshot
+    from tendrl.performance_monitoring import manager
+
+
+def node_summary(node_id, cpu):
+    return {
+        'node_id': node_id,
+        'cpu_usage': {'percent_used': cpu, 'updated_at': ''},
+    }
+
+
+class TestClusterNodes(object):
+    def setup_method(self, method):
+        __builtin__.NS = MagicMock()
+        NS.central_store_thread.get_snapshot_summary.return_value = {
+            'n1': node_summary('n1', 10.0),
+        }
+
+    def test_nodes_summary_from_the_snapshot(self, monkeypatch):
+        reads = []
+
+        def etcd_read(key):
+            reads.append(key)
+            if key.endswith('/n2'):
+                return node_summary('n2', 30.0)
+            raise EtcdKeyNotFound()
+        monkeypatch.setattr(cluster_summary, 'etcd_read', etcd_read)
+        summaries = ClusterSummarise().cluster_nodes_summary(
+            ['n1', 'n3', 'n2']
+        )
+        assert [summary['node_id'] for summary in summaries] == ['n1', 'n2']
+        assert reads == [
+            '/monitoring/summary/nodes/n3',
+            '/monitoring/summary/nodes/n2',
+        ]
+
+    def test_parse_cluster(self, monkeypatch):
+        monkeypatch.setattr(cluster_summary, 'ClusterSummary', dict)
+        monkeypatch.setattr(
+            cluster_summary,
+            'etcd_read',
+            MagicMock(return_value=node_summary('n2', 30.0))
+        )
+        summary = ClusterSummarise().parse_cluster('c1', {
+            'nodes': {'n2': {}, 'n1': {}},
+            'TendrlContext': {'sds_name': 'ceph'},
+        })
+        assert summary['node_ids'] == ['n1', 'n2']
+        assert summary['node_utilization'] == {
+            'cpu': {'p50': 10.0, 'p90': 30.0, 'p99': 30.0, 'max': 30.0}
+        }
+        assert 'node_summaries' not in summary
+
+    def test_drops_embedded_node_summaries_once(self):
+        summariser = ClusterSummarise()
+        NS.etcd_orm.client.delete.side_effect = EtcdKeyNotFound()
+        summariser.drop_node_summaries('c1')
+        summariser.drop_node_summaries('c1')
+        NS.etcd_orm.client.delete.assert_called_once_with(
+            '/monitoring/summary/clusters/c1/node_summaries'
+        )
+
+
+class TestExpandNodes(object):
+    def setup_method(self, method):
+        __builtin__.NS = MagicMock()
+        NS.node_liveness.get_status.return_value = 'UP'
+        self.tmpdir = tempfile.mkdtemp()
+        self.store = PerformanceMonitoringEtcdCentralStore()
+        self.store.summary_snapshot = SummarySnapshot(
+            os.path.join(self.tmpdir, 'summaries.snapshot'),
+            create=True
+        )
+        for node_id, cpu in (('n1', 10.0), ('n2', 30.0)):
+            self.store.snapshot_summary(
+                'nodes',
+                node_id,
+                node_summary(node_id, cpu)
+            )
+        self.store.snapshot_summary('clusters', 'c1', {
+            'cluster_id': 'c1',
+            'node_ids': ['n1', 'n2'],
+        })
+        self.store.publish_summaries(node_ids=['n1', 'n2'])
+        NS.central_store_thread = self.store
+
+    def teardown_method(self, method):
+        self.store.summary_snapshot.close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_endpoint(self):
+        client = manager.app.test_client()
+        summary = json.loads(
+            client.get('/monitoring/clusters/c1/summary').data
+        )
+        assert 'node_summaries' not in summary
+        summary = json.loads(
+            client.get('/monitoring/clusters/c1/summary?expand=nodes').data
+        )
+        assert [
+            node['node_id'] for node in summary['node_summaries']
+        ] == ['n1', 'n2']
+        assert summary['node_summaries'][1]['status'] == 'UP'
+        assert client.get(
+            '/monitoring/clusters/c1/summary?expand=pools'
+        ).status_code == 400
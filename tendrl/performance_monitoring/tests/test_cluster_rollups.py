@@ -0,0 +1,95 @@
+import __builtin__
+from base import commons_stubs
+import json
+from mock import MagicMock
+from mock import patch
+import socket
+with commons_stubs():
+    from tendrl.performance_monitoring.aggregator import cluster_summary
+    from tendrl.performance_monitoring.aggregator.cluster_summary \
+        import ClusterSummarise
+    from tendrl.performance_monitoring.time_series_db.manager \
+        import TimeSeriesDBManager
+    # The plugins are instantiated, and connect to carbon, when defined
+    with patch('gevent.socket.socket'):
+        from tendrl.performance_monitoring.time_series_db.dbplugins.graphite \
+            import GraphitePlugin
+
+
+def node_summary(cpu, memory, storage):
+    return {
+        'cpu_usage': {'percent_used': cpu, 'updated_at': ''},
+        # Summaries may be read back with their usages as json
+        'memory_usage': json.dumps({'percent_used': memory}),
+        'storage_usage': {'percent_used': storage},
+    }
+
+
+class TestClusterRollups(object):
+    def setup_method(self, method):
+        __builtin__.NS = MagicMock()
+        self.plugin = GraphitePlugin.__new__(GraphitePlugin)
+        self.plugin.push_metrics = MagicMock()
+        NS.time_series_db_manager = TimeSeriesDBManager.__new__(
+            TimeSeriesDBManager
+        )
+        NS.time_series_db_manager.plugin = self.plugin
+
+    def test_percentiles(self):
+        assert cluster_summary.percentiles(range(100, 0, -1)) == {
+            'p50': 50,
+            'p90': 90,
+            'p99': 99,
+            'max': 100,
+        }
+        assert cluster_summary.percentiles([7.0]) == {
+            'p50': 7.0,
+            'p90': 7.0,
+            'p99': 7.0,
+            'max': 7.0,
+        }
+
+    def test_rollups(self):
+        summaries = [
+            node_summary(str(value), value, '') for value in range(1, 11)
+        ]
+        # Not summarised yet
+        summaries.append({'cpu_usage': {'percent_used': 'nan'}})
+        summaries.append({})
+        rollups = ClusterSummarise().node_utilization_rollups(summaries)
+        assert rollups == {
+            'cpu': {'p50': 5.0, 'p90': 9.0, 'p99': 10.0, 'max': 10.0},
+            'memory': {'p50': 5.0, 'p90': 9.0, 'p99': 10.0, 'max': 10.0},
+        }
+
+    def test_pushes_a_series_per_percentile(self):
+        summariser = ClusterSummarise()
+        summariser.push_node_utilization_rollups(
+            'c1',
+            summariser.node_utilization_rollups([
+                node_summary('10.0', 20.0, '30.0'),
+                node_summary('50.0', 60.0, '70.0')
+            ])
+        )
+        pushed = dict(
+            call[0] for call in self.plugin.push_metrics.call_args_list
+        )
+        assert len(pushed) == 12
+        assert pushed[
+            'cluster_c1.node_utilization.cpu.percent-p50'
+        ] == 10.0
+        assert pushed[
+            'cluster_c1.node_utilization.storage.percent-max'
+        ] == 70.0
+
+    def test_push_failure_is_reported(self):
+        self.plugin.push_metrics.side_effect = socket.error('closed')
+        summariser = ClusterSummarise()
+        summariser.push_node_utilization_rollups(
+            'c1',
+            summariser.node_utilization_rollups([
+                node_summary('10.0', 20.0, '30.0')
+            ])
+        )
+        assert self.plugin.push_metrics.call_count == 1
+        assert cluster_summary.Event.called
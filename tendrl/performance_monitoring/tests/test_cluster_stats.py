@@ -0,0 +1,178 @@
+import __builtin__
+from base import commons_stubs
+import json
+from mock import MagicMock
+from mock import patch
+import time
+import urllib3
+with commons_stubs():
+    from tendrl.performance_monitoring.aggregator.node_summary \
+        import NodeSummarise
+    from tendrl.performance_monitoring.benchmarks.graphite_standin \
+        import GraphiteWebServer
+    from tendrl.performance_monitoring.benchmarks.graphite_standin \
+        import MetricStore
+    from tendrl.performance_monitoring import manager
+    # The plugins are instantiated, and connect to carbon, when defined
+    with patch('gevent.socket.socket'):
+        from tendrl.performance_monitoring.time_series_db.dbplugins.graphite \
+            import GraphitePlugin
+
+# node -> (cpu percent-user, used bytes per df series)
+NODES = {
+    'node1_example': (10.0, (100.0, 200.0)),
+    'node2_example': (30.0, (1000.0, 2000.0)),
+    'node3_example': (20.0, (10.0, 20.0)),
+}
+
+
+class TestClusterStats(object):
+    def setup_method(self, method):
+        __builtin__.NS = MagicMock()
+        store = MetricStore()
+        now = int(time.time())
+        for node, (cpu, used) in NODES.items():
+            store.add('collectd.%s.cpu.percent-user' % node, cpu, now - 60)
+            for df, value in zip(('df-root', 'df-var'), used):
+                store.add(
+                    'collectd.%s.%s.df_complex-used' % (node, df),
+                    value,
+                    now - 60
+                )
+                store.add(
+                    'collectd.%s.%s.df_complex-free' % (node, df),
+                    value * 3,
+                    now - 60
+                )
+        self.server = GraphiteWebServer(store)
+        self.server.start()
+        self.plugin = GraphitePlugin.__new__(GraphitePlugin)
+        self.plugin.host, self.plugin.port = self.server.address
+        self.plugin.prefix = 'collectd'
+        self.plugin.http = urllib3.PoolManager()
+        NS.time_series_db_manager.get_plugin.return_value = self.plugin
+
+    def teardown_method(self, method):
+        self.server.stop()
+
+    def current(self, stats):
+        return dict(
+            (series['target'], series['datapoints'][-1][0])
+            for series in stats
+        )
+
+    def test_aggregate_target(self):
+        assert self.plugin.aggregate_target(
+            ['node1.example', 'node2.example'],
+            'df-*.df_complex-used',
+            aggregate='sum'
+        ) == (
+            "alias(sumSeries(groupByNode(collectd.{node1_example,"
+            "node2_example}.df-*.df_complex-used,1,'sumSeries')),'sum')"
+        )
+        assert self.plugin.aggregate_target(
+            ['node1.example'],
+            'cpu.percent-user',
+            top=3,
+            fill=True
+        ) == (
+            "highestCurrent(groupByNode(keepLastValue("
+            "collectd.node1_example.cpu.percent-user),1,'sumSeries'),3)"
+        )
+
+    def test_per_node_sums(self):
+        stats = self.plugin.get_aggregated_metric_stats(
+            ['node1.example', 'node2.example'],
+            'df-*.df_complex-used'
+        )
+        assert self.server.requests == {'/render': 1}
+        assert self.current(stats) == {
+            'node1.example': 300.0,
+            'node2.example': 3000.0,
+        }
+        # Nulls are removed
+        assert len(stats[0]['datapoints']) == 1
+
+    def test_aggregates(self):
+        names = ['node1.example', 'node2.example', 'node3.example']
+        for aggregate, value in (('sum', 60.0), ('average', 20.0),
+                                 ('max', 30.0), ('min', 10.0)):
+            assert self.current(self.plugin.get_aggregated_metric_stats(
+                names,
+                'cpu.percent-user',
+                aggregate=aggregate
+            )) == {aggregate: value}
+        assert [
+            series['target']
+            for series in self.plugin.get_aggregated_metric_stats(
+                names,
+                'cpu.percent-user',
+                top=2
+            )
+        ] == ['node2.example', 'node3.example']
+
+    def test_endpoint(self):
+        NS.central_store_thread.get_cluster_node_ids.return_value = [
+            'n1', 'n2'
+        ]
+        NS.central_store_thread.get_node_names.return_value = {
+            'n1': 'node1.example',
+            'n2': 'node2.example',
+        }
+        client = manager.app.test_client()
+        response = client.get(
+            '/monitoring/clusters/c1/nodes/df-*.df_complex-used/stats'
+        )
+        assert response.status_code == 200
+        assert self.current(json.loads(response.data)) == {
+            'n1': 300.0,
+            'n2': 3000.0,
+        }
+        NS.central_store_thread.get_cluster_node_ids.assert_called_once_with(
+            'c1'
+        )
+        response = client.get(
+            '/monitoring/clusters/c1/nodes/df-*.df_complex-used/stats'
+            '?aggregate=sum'
+        )
+        assert self.current(json.loads(response.data)) == {'sum': 3300.0}
+        for query in ('aggregate=median', 'top=0', 'top=2&aggregate=sum'):
+            assert client.get(
+                '/monitoring/clusters/c1/nodes/cpu.percent-user/stats?%s' %
+                query
+            ).status_code == 400
+        NS.central_store_thread.get_node_names.return_value = {}
+        response = client.get(
+            '/monitoring/clusters/c2/nodes/cpu.percent-user/stats'
+        )
+        assert json.loads(response.data) == []
+
+    def test_summariser_storage(self):
+        NS.central_store_thread.get_node_names.return_value = {
+            'n1': 'node1.example',
+            'n2': 'node2.example',
+        }
+        summariser = NodeSummarise(throttle=0)
+        summariser.prefetch_storage(['n1', 'n2'])
+        # A request per resource for all the nodes
+        assert self.server.requests == {'/render': 2}
+        assert summariser.get_storage_stat(
+            'n2',
+            'df-*.df_complex-used'
+        ) == 3000.0
+        usage = summariser.get_net_storage_utilization('n1')
+        assert usage['used'] == '300.0'
+        assert usage['total'] == '1200.0'
+        assert usage['percent_used'] == '25.0'
+        assert self.server.requests == {'/render': 2}
+
+    def test_summariser_leaves_relayed_nodes(self):
+        NS.central_store_thread.get_node_names.return_value = {
+            'n1': 'node1.example',
+        }
+        relay = MagicMock()
+        relay.latest.return_value = [1.0]
+        summariser = NodeSummarise(throttle=0, relay=relay)
+        summariser.prefetch_storage(['n1'])
+        assert self.server.requests == {}
+        assert summariser.storage == {}
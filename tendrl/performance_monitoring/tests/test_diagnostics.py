@@ -0,0 +1,203 @@
+import __builtin__
+from base import commons_stubs
+from collections import Counter
+import gevent
+import json
+from mock import MagicMock
+import os
+import time
+with commons_stubs():
+    from tendrl.performance_monitoring import diagnostics
+    from tendrl.performance_monitoring.diagnostics.hub_monitor \
+        import HubBlockMonitor
+    from tendrl.performance_monitoring.diagnostics.profiler \
+        import SamplingProfiler
+    from tendrl.performance_monitoring.exceptions \
+        import TendrlPerformanceMonitoringException
+    from tendrl.performance_monitoring import manager
+
+
+class Code(object):
+    def __init__(self, filename, name):
+        self.co_filename = filename
+        self.co_name = name
+
+
+class Frame(object):
+    def __init__(self, filename, name, back=None):
+        self.f_code = Code(filename, name)
+        self.f_back = back
+
+
+def stack(*frames):
+    # Innermost frame of a stack given from the outermost frame in
+    frame = None
+    for filename, name in frames:
+        frame = Frame(filename, name, frame)
+    return frame
+
+
+def package_file(path):
+    return os.path.join(diagnostics.PACKAGE_DIR, path)
+
+
+class TestDiagnostics(object):
+    def test_task_attribution(self):
+        frame = stack(
+            ('/usr/lib/gevent/greenlet.py', 'run'),
+            (package_file('aggregator/node_summary.py'), '_run'),
+            (package_file('utils/__init__.py'), 'read'),
+        )
+        frames = diagnostics.walk_stack(frame)
+        assert diagnostics.attribute(frames) == 'NodeSummarise'
+        assert diagnostics.collapse_stack(frame) == ';'.join([
+            'NodeSummarise',
+            'greenlet.py:run',
+            'aggregator/node_summary.py:_run',
+            'utils/__init__.py:read',
+        ])
+
+    def test_request_attribution(self):
+        frame = stack(
+            ('/usr/lib/python2.7/site-packages/flask/app.py',
+             'dispatch_request'),
+            (package_file('manager/__init__.py'), 'get_node_summary'),
+        )
+        frames = diagnostics.walk_stack(frame)
+        assert diagnostics.attribute(frames) == 'request:get_node_summary'
+
+    def test_other_and_idle(self):
+        frame = stack(('/tmp/script.py', 'main'))
+        assert diagnostics.attribute(diagnostics.walk_stack(frame)) == 'other'
+        hub = stack(('/usr/lib/gevent/hub.py', 'run'))
+        assert diagnostics.is_idle(hub)
+        assert diagnostics.collapse_stack(hub) == diagnostics.IDLE
+
+
+class TestSamplingProfiler(object):
+    def test_collapsed_and_totals(self):
+        profiler = SamplingProfiler()
+        profiler.stacks = Counter({
+            'NodeSummarise;a.py:f': 3,
+            'NodeSummarise;a.py:g': 1,
+            'request:get_node_summary;b.py:h': 2,
+            diagnostics.IDLE: 5,
+        })
+        assert profiler.collapsed() == (
+            'NodeSummarise;a.py:f 3\n'
+            'NodeSummarise;a.py:g 1\n'
+            'request:get_node_summary;b.py:h 2\n'
+        )
+        assert 'idle 5\n' in profiler.collapsed(include_idle=True)
+        assert profiler.task_totals() == {
+            'NodeSummarise': 4,
+            'request:get_node_summary': 2,
+            diagnostics.IDLE: 5,
+        }
+
+    def test_sampling_run(self):
+        profiler = SamplingProfiler()
+        profiler.start(0.2, 0.001)
+
+        def busy_loop():
+            while profiler.running:
+                sum(range(100))
+        busy_loop()
+        assert profiler.samples > 0
+        assert any('busy_loop' in collapsed for collapsed in profiler.stacks)
+
+    def test_stopped_sampler_leaves_the_next_run(self):
+        profiler = SamplingProfiler()
+        profiler.start(1, 0.5)
+        stopped = profiler.generation
+        profiler.stop()
+        profiler.start(1, 0.5)
+        profiler.stop()
+        profiler.running = True
+        # The first run's sampler waking up during the second run
+        samples = profiler.samples
+        profiler._sample(stopped)
+        assert profiler.samples == samples
+        assert profiler.running
+
+
+def hold_hub(seconds):
+    deadline = time.time() + seconds
+    while time.time() < deadline:
+        sum(range(100))
+
+
+class TestHubBlockMonitor(object):
+    def setup_method(self, method):
+        self.monitor = HubBlockMonitor(threshold=0.05, interval=0.005)
+        self.monitor.start()
+
+    def teardown_method(self, method):
+        self.monitor.stop()
+
+    def test_block_recorded(self):
+        gevent.sleep(0.05)
+        hold_hub(0.2)
+        # Lets the monitor see the hub switch again
+        gevent.sleep(0.05)
+        stats = self.monitor.stats()
+        assert len(stats['locations']) == 1
+        location = stats['locations'][0]
+        assert location['location'].startswith(
+            'tests/test_diagnostics.py:hold_hub:'
+        )
+        assert location['count'] == 1
+        assert 0.1 < location['max_seconds'] < 0.5
+        assert 'in hold_hub' in location['stack']
+        assert [block['location'] for block in stats['recent']] == [
+            location['location']
+        ]
+        self.monitor.reset()
+        assert self.monitor.stats()['locations'] == []
+
+    def test_idle_and_switching_not_recorded(self):
+        gevent.sleep(0.2)
+        deadline = time.time() + 0.2
+        while time.time() < deadline:
+            gevent.sleep(0)
+        assert self.monitor.stats()['locations'] == []
+
+
+class TestProfileRoutes(object):
+    def setup_method(self, method):
+        __builtin__.NS = MagicMock()
+        self.client = manager.app.test_client()
+
+    def test_invalid_parameters(self):
+        for query in ['seconds=abc', 'seconds=0', 'seconds=301',
+                      'interval=-1']:
+            response = self.client.get('/monitoring/admin/profile?' + query)
+            assert response.status_code == 400
+        assert not NS.profiler.start.called
+
+    def test_profile_in_progress(self):
+        NS.profiler.start.side_effect = TendrlPerformanceMonitoringException(
+            'A profile is already in progress'
+        )
+        response = self.client.get('/monitoring/admin/profile?seconds=1')
+        assert response.status_code == 409
+
+    def test_stop_is_post(self):
+        response = self.client.get('/monitoring/admin/profile/stop')
+        assert response.status_code == 405
+        assert not NS.profiler.stop.called
+        response = self.client.post('/monitoring/admin/profile/stop')
+        assert response.status_code == 200
+        NS.profiler.stop.assert_called_once_with()
+
+    def test_hub_blocks(self):
+        NS.hub_monitor.stats.return_value = {'threshold': 0.1}
+        response = self.client.get('/monitoring/admin/hub_blocks')
+        assert response.status_code == 200
+        assert json.loads(response.data) == {'threshold': 0.1}
+        response = self.client.post('/monitoring/admin/hub_blocks/reset')
+        assert response.status_code == 200
+        NS.hub_monitor.reset.assert_called_once_with()
+        NS.hub_monitor = None
+        response = self.client.get('/monitoring/admin/hub_blocks')
+        assert response.status_code == 404
@@ -0,0 +1,104 @@
+import __builtin__
+from base import commons_stubs
+from mock import MagicMock
+import pytest
+import socket
+with commons_stubs():
+    from tendrl.performance_monitoring.instrumentation import Registry
+    from tendrl.performance_monitoring.instrumentation import SelfMetricsPusher
+
+
+class TestInstrumentation(object):
+    def test_counter_and_gauge(self):
+        registry = Registry()
+        requests = registry.counter('requests_total', 'Requests', ['route'])
+        requests.inc(route='/a')
+        requests.inc(2, route='/a')
+        requests.inc(route='/b')
+        registry.gauge('nodes', 'Nodes').set(7)
+        assert registry.counter('requests_total', 'Requests') is requests
+        assert registry.render() == '\n'.join([
+            '# HELP nodes Nodes',
+            '# TYPE nodes gauge',
+            'nodes 7.0',
+            '# HELP requests_total Requests',
+            '# TYPE requests_total counter',
+            'requests_total{route="/a"} 3.0',
+            'requests_total{route="/b"} 1.0',
+        ]) + '\n'
+
+    def test_histogram(self):
+        registry = Registry()
+        latency = registry.histogram('latency', 'Latency', buckets=(1, 5))
+        latency.observe(0.5)
+        latency.observe(1)
+        latency.observe(7)
+        assert list(latency.samples()) == [
+            ('latency_bucket', (('le', '1.0'),), 2),
+            ('latency_bucket', (('le', '5.0'),), 2),
+            ('latency_bucket', (('le', '+Inf'),), 3),
+            ('latency_sum', (), 8.5),
+            ('latency_count', (), 3),
+        ]
+
+        @latency.time()
+        def timed():
+            return 'done'
+        assert timed() == 'done'
+        assert list(latency.samples())[-1] == ('latency_count', (), 4)
+
+    def test_label_mismatch(self):
+        registry = Registry()
+        with pytest.raises(ValueError):
+            registry.counter('c', 'C', ['route']).inc(status=200)
+        with pytest.raises(ValueError):
+            registry.gauge('c', 'C')
+
+    def test_push(self):
+        __builtin__.NS = MagicMock()
+        registry = Registry()
+        registry.counter('reads_total', 'Reads', ['key']).inc(key='a.b')
+        SelfMetricsPusher(registry=registry).push()
+        NS.time_series_db_manager.get_plugin().push_metrics.\
+            assert_called_once_with(
+                'performance_monitoring.reads_total.a_b',
+                1
+            )
+
+    def test_graphite_request_counted_once(self):
+        __builtin__.NS = MagicMock()
+        # GraphitePlugin connects to carbon when its class is registered
+        carbon = socket.socket()
+        carbon.bind(('127.0.0.1', 0))
+        carbon.listen(1)
+        NS.performance_monitoring.config.data = {
+            'time_series_db_server': '127.0.0.1',
+            'time_series_db_port': 80,
+            'carbon_port': carbon.getsockname()[1],
+        }
+        from tendrl.performance_monitoring.time_series_db.dbplugins \
+            import graphite
+        plugin = [
+            plugin for plugin in graphite.GraphitePlugin.plugins
+            if type(plugin) is graphite.GraphitePlugin
+        ][-1]
+        plugin.http = MagicMock()
+        plugin.http.request.return_value = MagicMock(status=200, data=None)
+        before = dict(
+            (labels, value) for _, labels, value in
+            graphite.GRAPHITE_REQUESTS.samples()
+        )
+        # Processing the response fails after the request was counted
+        with pytest.raises(graphite.TendrlPerformanceMonitoringException):
+            plugin.get_metric_stats('node1', 'cpu.percent-user')
+        after = dict(
+            (labels, value) for _, labels, value in
+            graphite.GRAPHITE_REQUESTS.samples()
+        )
+        assert after[(('status', 200),)] - before.get(
+            (('status', 200),), 0
+        ) == 1
+        assert after.get((('status', 'error'),), 0) == before.get(
+            (('status', 'error'),), 0
+        )
+        carbon.close()
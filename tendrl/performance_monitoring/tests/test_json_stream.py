@@ -0,0 +1,116 @@
+import __builtin__
+from base import commons_stubs
+import json
+from mock import MagicMock
+from mock import patch
+import pytest
+import random
+import time
+import urllib3
+with commons_stubs():
+    from tendrl.performance_monitoring.benchmarks.graphite_standin \
+        import GraphiteWebServer
+    from tendrl.performance_monitoring.benchmarks.graphite_standin \
+        import MetricStore
+    from tendrl.performance_monitoring.exceptions \
+        import TendrlPerformanceMonitoringException
+    from tendrl.performance_monitoring.time_series_db.json_stream \
+        import NullDatapointFilter
+    # The plugins are instantiated, and connect to carbon, when defined
+    with patch('gevent.socket.socket'):
+        from tendrl.performance_monitoring.time_series_db.dbplugins.graphite \
+            import GraphitePlugin
+
+
+def filtered(series):
+    return [
+        {
+            'target': item['target'],
+            'datapoints': [
+                point for point in item['datapoints'] if point[0] is not None
+            ],
+        }
+        for item in series
+    ]
+
+
+class TestNullDatapointFilter(object):
+    def test_any_chunk_size(self):
+        rng = random.Random(1)
+        series = [
+            {
+                # Brackets and separators in strings are left alone
+                'target': 'collectd.node%s.df-[root], "x"' % index,
+                'datapoints': [
+                    [rng.choice([None, None, 1.5, -2e-05]), 60 * point]
+                    for point in range(100)
+                ],
+            }
+            for index in range(3)
+        ]
+        series.append({'target': 'empty', 'datapoints': [[None, 60]]})
+        body = json.dumps(series)
+        for size in (1, 2, 5, 64, len(body)):
+            null_filter = NullDatapointFilter()
+            output = ''.join(
+                null_filter.feed(body[offset:offset + size])
+                for offset in range(0, len(body), size)
+            ) + null_filter.close()
+            assert json.loads(output) == filtered(series)
+            # Nothing is held once a chunk is complete
+            assert null_filter.buffer == ''
+
+    def test_holds_only_cut_token(self):
+        null_filter = NullDatapointFilter()
+        # The last token may go on in the next chunk
+        assert null_filter.feed('[{"target": "a", "datapoints": [[1.0, 60]') \
+            == '[{"target": "a", "datapoints": ['
+        assert null_filter.feed(', [nu') == '[1.0, 60]'
+        assert null_filter.buffer == '[nu'
+        assert null_filter.feed('ll, 120], [2.0, 180]]}]') == \
+            ', [2.0, 180]]}'
+        assert null_filter.close() == ']'
+
+
+class TestGraphiteStreaming(object):
+    def setup_method(self, method):
+        __builtin__.NS = MagicMock()
+        store = MetricStore()
+        now = int(time.time())
+        for age in range(0, 3600, 120):
+            store.add('collectd.node1.cpu.percent-user', 1.0, now - age)
+        self.server = GraphiteWebServer(store)
+        self.server.start()
+        self.plugin = GraphitePlugin.__new__(GraphitePlugin)
+        self.plugin.host, self.plugin.port = self.server.address
+        self.plugin.prefix = 'collectd'
+        self.plugin.http = urllib3.PoolManager()
+
+    def teardown_method(self, method):
+        self.server.stop()
+
+    def test_stream(self, monkeypatch):
+        monkeypatch.setattr(
+            'tendrl.performance_monitoring.time_series_db.dbplugins.'
+            'graphite.STREAM_CHUNK_SIZE',
+            100
+        )
+        chunks = list(self.plugin.stream_metric_stats(
+            'node1',
+            'cpu.percent-user',
+            from_time=int(time.time()) - 3600
+        ))
+        assert len(chunks) > 5
+        stats = json.loads(''.join(chunks))
+        assert 25 <= len(stats[0]['datapoints']) <= 31
+        assert all(value == 1.0 for value, _ in stats[0]['datapoints'])
+        assert stats == json.loads(self.plugin.get_metric_stats(
+            'node1',
+            'cpu.percent-user',
+            from_time=int(time.time()) - 3600
+        ))
+
+    def test_error_before_streaming(self):
+        self.server.faults.error_rate = 1.0
+        with pytest.raises(TendrlPerformanceMonitoringException):
+            self.plugin.stream_metric_stats('node1', 'cpu.percent-user')
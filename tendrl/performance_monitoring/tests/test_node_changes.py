@@ -0,0 +1,120 @@
+import __builtin__
+from base import commons_stubs
+import json
+from mock import MagicMock
+import os
+import shutil
+import tempfile
+with commons_stubs():
+    from tendrl.performance_monitoring.central_store \
+        import PerformanceMonitoringEtcdCentralStore
+    from tendrl.performance_monitoring.central_store.changelog \
+        import changes_since
+    from tendrl.performance_monitoring.central_store.changelog \
+        import NodeChangeLog
+    from tendrl.performance_monitoring.central_store.snapshot \
+        import SummarySnapshot
+    from tendrl.performance_monitoring import manager
+
+
+def summary(node_id, cpu, updated_at='t0'):
+    return {
+        'node_id': node_id,
+        'cpu_usage': {'percent_used': str(cpu), 'updated_at': updated_at},
+        'alert_count': 0,
+        '_etcd_cls': object,
+    }
+
+
+class TestNodeChangeLog(object):
+    def test_versions(self):
+        log = NodeChangeLog()
+        start = log.version
+        assert log.record('n1', summary('n1', 10)) == start + 1
+        assert log.record('n2', summary('n2', 20)) == start + 2
+        # Only the updated_at times moved
+        assert log.record('n1', summary('n1', 10, 't1')) == start + 1
+        assert log.record('n1', summary('n1', 11, 't1')) == start + 3
+        log.retain(['n1'])
+        assert changes_since(log.to_json(), start + 1) == (['n1'], ['n2'])
+        assert changes_since(log.to_json(), start + 4) == ([], [])
+        assert changes_since(log.to_json(), start) == (['n1'], ['n2'])
+        # A node removed and back is changed
+        log.record('n2', summary('n2', 20))
+        assert changes_since(log.to_json(), start + 1) == (
+            ['n1', 'n2'],
+            []
+        )
+
+    def test_too_old(self):
+        log = NodeChangeLog(size=2)
+        start = log.version
+        for cpu in range(4):
+            log.record('n1', summary('n1', cpu))
+        assert len(log.log) == 2
+        assert changes_since(log.to_json(), start + 1) is None
+        assert changes_since(log.to_json(), start + 2) == (['n1'], [])
+        # Not a version of this log
+        assert changes_since(log.to_json(), 0) is None
+        assert changes_since(log.to_json(), start + 10) is None
+
+
+class TestNodeSummaryChanges(object):
+    def setup_method(self, method):
+        __builtin__.NS = MagicMock()
+        NS.node_liveness.get_status.return_value = 'UP'
+        self.tmpdir = tempfile.mkdtemp()
+        path = os.path.join(self.tmpdir, 'summaries.snapshot')
+        self.store = PerformanceMonitoringEtcdCentralStore()
+        self.store.summary_snapshot = SummarySnapshot(path, create=True)
+        self.sweep({'n1': 10, 'n2': 20, 'n3': 30})
+        NS.central_store_thread = self.store
+        # Read in an api worker
+        self.worker_store = PerformanceMonitoringEtcdCentralStore()
+        self.worker_store.summary_snapshot = SummarySnapshot(path)
+
+    def teardown_method(self, method):
+        self.worker_store.summary_snapshot.close()
+        self.store.summary_snapshot.close()
+        shutil.rmtree(self.tmpdir)
+
+    def sweep(self, nodes):
+        for node_id, cpu in nodes.items():
+            self.store.snapshot_summary('nodes', node_id, summary(
+                node_id,
+                cpu
+            ))
+        self.store.retain_summaries('nodes', nodes.keys())
+        self.store.publish_summaries(node_ids=sorted(nodes))
+
+    def test_changes(self):
+        changes, status, _ = self.worker_store.get_node_summary_changes(0)
+        assert status == 200
+        assert changes['full']
+        assert len(changes['changed']) == 3
+        version = changes['version']
+        assert max(node['version'] for node in changes['changed']) == \
+            version
+        self.sweep({'n1': 10, 'n2': 25})
+        changes, status, _ = self.worker_store.get_node_summary_changes(
+            version
+        )
+        assert not changes['full']
+        assert [node['node_id'] for node in changes['changed']] == ['n2']
+        assert changes['changed'][0]['cpu_usage']['percent_used'] == '25'
+        assert changes['removed'] == ['n3']
+        assert changes['version'] == version + 2
+
+    def test_endpoint(self):
+        client = manager.app.test_client()
+        version = json.loads(
+            client.get('/monitoring/nodes/summary?since=0').data
+        )['version']
+        self.sweep({'n1': 15, 'n2': 20, 'n3': 30})
+        response = client.get('/monitoring/nodes/summary?since=%d' % version)
+        assert response.status_code == 200
+        changes = json.loads(response.data)
+        assert [node['node_id'] for node in changes['changed']] == ['n1']
+        assert client.get(
+            '/monitoring/nodes/summary?since=x'
+        ).status_code == 400
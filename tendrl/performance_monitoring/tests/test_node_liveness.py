@@ -0,0 +1,99 @@
+import __builtin__
+from base import commons_stubs
+import datetime
+from mock import MagicMock
+with commons_stubs():
+    from tendrl.performance_monitoring.aggregator import node_liveness
+    from tendrl.performance_monitoring.aggregator.node_liveness \
+        import NodeLivenessTracker
+    from tendrl.performance_monitoring.aggregator.node_liveness \
+        import TimerWheel
+    from tendrl.performance_monitoring import constants as pm_consts
+
+
+def last_seen_at(seconds_ago):
+    return '%s+00:00' % (
+        datetime.datetime.utcnow() - datetime.timedelta(seconds=seconds_ago)
+    ).isoformat()
+
+
+class TestTimerWheel(object):
+    def test_expiry(self):
+        wheel = TimerWheel(6, 1)
+        wheel.schedule('n1', 102.0, 100.0)
+        wheel.schedule('n2', 104.0, 100.0)
+        assert wheel.advance(100.0) == []
+        assert wheel.advance(101.0) == []
+        assert wheel.advance(102.0) == ['n1']
+        wheel.schedule('n2', 108.0, 102.5)
+        assert wheel.advance(104.0) == []
+        assert wheel.deadlines == {'n2': 108.0}
+
+    def test_cancel(self):
+        wheel = TimerWheel(6, 1)
+        wheel.schedule('n1', 100.0, 100.0)
+        wheel.cancel('n1')
+        assert wheel.advance(200.0) == []
+
+
+class TestNodeLivenessTracker(object):
+    def setup_method(self, method):
+        __builtin__.NS = MagicMock()
+
+    def test_status_transitions(self, monkeypatch):
+        tracker = NodeLivenessTracker(timeout=5)
+        assert tracker.get_status('n1') == pm_consts.STATUS_NOT_MONITORED
+        tracker.on_last_seen_at(
+            '/monitoring/nodes/n1/last_seen_at',
+            last_seen_at(1)
+        )
+        assert tracker.get_status('n1') == pm_consts.STATUS_UP
+        NS.etcd_orm.client.write.assert_called_once_with(
+            '/monitoring/summary/nodes/n1/status',
+            pm_consts.STATUS_UP
+        )
+        now = node_liveness.time.time()
+        monkeypatch.setattr(node_liveness.time, 'time', lambda: now + 10)
+        for _ in range(len(tracker.wheel.slots)):
+            for node_id in tracker.wheel.advance(now + 10):
+                tracker.set_status(node_id, pm_consts.STATUS_DOWN)
+        assert tracker.get_status('n1') == pm_consts.STATUS_DOWN
+        assert NS.etcd_orm.client.write.call_count == 2
+
+    def test_stale_last_seen_at(self):
+        tracker = NodeLivenessTracker(timeout=5)
+        tracker.on_last_seen_at(
+            '/monitoring/nodes/n1/last_seen_at',
+            last_seen_at(30)
+        )
+        assert tracker.get_status('n1') == pm_consts.STATUS_DOWN
+        tracker.on_last_seen_at('/monitoring/nodes/n1/other', 'x')
+        assert tracker.wheel.deadlines == {}
+
+    def test_no_publish(self):
+        tracker = NodeLivenessTracker(timeout=5, publish=False)
+        tracker.on_last_seen_at(
+            '/monitoring/nodes/n1/last_seen_at',
+            last_seen_at(1)
+        )
+        assert tracker.get_status('n1') == pm_consts.STATUS_UP
+        assert not NS.etcd_orm.client.write.called
+
+    def test_deleted_node_is_forgotten(self):
+        tracker = NodeLivenessTracker(timeout=5)
+        for node_id in ['n1', 'n2']:
+            tracker.on_last_seen_at(
+                '/monitoring/nodes/%s/last_seen_at' % node_id,
+                last_seen_at(1)
+            )
+        tracker.on_last_seen_at(
+            '/monitoring/nodes/n1/last_seen_at',
+            None,
+            'expire'
+        )
+        tracker.on_last_seen_at('/monitoring/nodes/n2', None, 'delete')
+        assert tracker.wheel.deadlines == {}
+        assert tracker.get_status('n1') == pm_consts.STATUS_NOT_MONITORED
+        assert tracker.get_status('n2') == pm_consts.STATUS_NOT_MONITORED
+        # Only the two UP transitions were written
+        assert NS.etcd_orm.client.write.call_count == 2
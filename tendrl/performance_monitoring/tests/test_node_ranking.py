@@ -0,0 +1,124 @@
+import __builtin__
+from base import commons_stubs
+import json
+from mock import MagicMock
+import os
+import shutil
+import tempfile
+with commons_stubs():
+    from tendrl.performance_monitoring.central_store \
+        import PerformanceMonitoringEtcdCentralStore
+    from tendrl.performance_monitoring.central_store.ranking \
+        import NodeRanking
+    from tendrl.performance_monitoring.central_store.snapshot \
+        import SummarySnapshot
+    from tendrl.performance_monitoring import manager
+
+
+def summary(node_id, cpu, alerts=0, cluster='c1'):
+    return {
+        'node_id': node_id,
+        'cluster_name': cluster,
+        'cpu_usage': {'percent_used': str(cpu), 'updated_at': ''},
+        'memory_usage': {'percent_used': '', 'updated_at': ''},
+        'storage_usage': json.dumps({'percent_used': cpu / 2.0}),
+        'alert_count': alerts,
+    }
+
+
+class TestNodeRanking(object):
+    def setup_method(self, method):
+        __builtin__.NS = MagicMock()
+        self.ranking = NodeRanking()
+        for index, cpu in enumerate([30, 10, 50, 20, 40]):
+            self.ranking.update(
+                'n%d' % index,
+                summary('n%d' % index, cpu, cluster='c%d' % (index % 2))
+            )
+
+    def test_top(self):
+        assert self.ranking.top('cpu', 3) == [
+            [50.0, 'n2'], [40.0, 'n4'], [30.0, 'n0']
+        ]
+        assert self.ranking.top('cpu', 10, 'c1') == [
+            [20.0, 'n3'], [10.0, 'n1']
+        ]
+        assert self.ranking.top('storage', 1) == [[25.0, 'n2']]
+        assert self.ranking.top('cpu', 0) == []
+        # Not summarised yet
+        assert self.ranking.top('memory', 3) == []
+        assert self.ranking.top('cpu', 3, 'c9') == []
+
+    def test_update_moves_the_node(self):
+        self.ranking.update('n1', summary('n1', 90, alerts=3, cluster='c1'))
+        assert self.ranking.top('cpu', 2) == [[90.0, 'n1'], [50.0, 'n2']]
+        assert self.ranking.top('alerts', 1) == [[3.0, 'n1']]
+        # Moved to another cluster
+        self.ranking.update('n1', summary('n1', 90, cluster='c0'))
+        assert self.ranking.top('cpu', 1, 'c1') == [[20.0, 'n3']]
+        assert self.ranking.top('cpu', 1, 'c0') == [[90.0, 'n1']]
+        assert len(self.ranking.indexes['cpu']['']) == 5
+
+    def test_retain(self):
+        self.ranking.retain(['n0', 'n1'])
+        assert self.ranking.top('cpu', 5) == [[30.0, 'n0'], [10.0, 'n1']]
+        assert 'c1' in self.ranking.indexes['cpu']
+        self.ranking.retain(['n0'])
+        assert 'c1' not in self.ranking.indexes['cpu']
+
+
+class TestTopNodes(object):
+    def setup_method(self, method):
+        __builtin__.NS = MagicMock()
+        NS.node_liveness.get_status.return_value = 'UP'
+        self.tmpdir = tempfile.mkdtemp()
+        path = os.path.join(self.tmpdir, 'summaries.snapshot')
+        self.store = PerformanceMonitoringEtcdCentralStore()
+        self.store.summary_snapshot = SummarySnapshot(path, create=True)
+        for index, cpu in enumerate([30, 10, 50]):
+            node_id = 'n%d' % index
+            self.store.snapshot_summary('nodes', node_id, summary(
+                node_id,
+                cpu
+            ))
+        self.store.publish_summaries(node_ids=['n0', 'n1', 'n2'])
+        NS.central_store_thread = self.store
+        # Read in an api worker
+        self.worker_store = PerformanceMonitoringEtcdCentralStore()
+        self.worker_store.summary_snapshot = SummarySnapshot(path)
+
+    def teardown_method(self, method):
+        self.worker_store.summary_snapshot.close()
+        self.store.summary_snapshot.close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_published_ranking(self):
+        summaries, status, _ = self.worker_store.get_top_nodes('cpu', 2)
+        assert status == 200
+        assert [node['node_id'] for node in summaries] == ['n2', 'n0']
+
+    def test_ranked_from_etcd_without_ranking(self, monkeypatch):
+        store = PerformanceMonitoringEtcdCentralStore()
+        monkeypatch.setattr(
+            store,
+            'get_node_summary',
+            lambda node_ids=None: (
+                [summary('n0', 30), summary('n1', 10)]
+                if node_ids is None else [summary(node_id, 0)
+                                          for node_id in node_ids],
+                200,
+                None
+            )
+        )
+        summaries, _, _ = store.get_top_nodes('cpu', 1)
+        assert [node['node_id'] for node in summaries] == ['n0']
+
+    def test_endpoint(self):
+        client = manager.app.test_client()
+        response = client.get('/monitoring/nodes/top?by=cpu&n=1&cluster=c1')
+        assert response.status_code == 200
+        assert [
+            node['node_id'] for node in json.loads(response.data)
+        ] == ['n2']
+        assert client.get('/monitoring/nodes/top?by=disk').status_code == 400
+        assert client.get('/monitoring/nodes/top?n=-1').status_code == 400
@@ -0,0 +1,59 @@
+import __builtin__
+from base import commons_stubs
+import json
+from mock import MagicMock
+import time
+with commons_stubs():
+    from tendrl.performance_monitoring.aggregator import node_summary
+    from tendrl.performance_monitoring.aggregator.node_summary \
+        import NodeSummarise
+
+
+def render(value, timestamp):
+    return json.dumps([{
+        'target': 'cpu Current:%s Max:%s Min:%s' % (value, value, value),
+        'datapoints': [[value - 1, timestamp - 600], [value, timestamp],
+                       [None, timestamp + 60]],
+    }])
+
+
+class TestNodeSummariseFreshness(object):
+    def setup_method(self, method):
+        __builtin__.NS = MagicMock()
+        NS.central_store_thread.get_node_name_from_id.return_value = 'node1'
+        self.get_metric_stats = \
+            NS.time_series_db_manager.get_plugin.return_value.get_metric_stats
+
+    def test_skips_until_newer_data(self, monkeypatch):
+        now = [1000.0]
+        monkeypatch.setattr(node_summary.time, 'time', lambda: now[0])
+        self.get_metric_stats.return_value = render(10.0, 990)
+        summariser = NodeSummarise(throttle=0, interval=600)
+        assert summariser.get_latest_stat('n1', 'cpu.percent-user') == 10.0
+        # Nothing newer than the datapoint at 990 before 1590
+        now[0] = 1500.0
+        self.get_metric_stats.return_value = render(20.0, 1590)
+        assert summariser.get_latest_stat('n1', 'cpu.percent-user') == 10.0
+        assert self.get_metric_stats.call_count == 1
+        now[0] = 1590.0
+        assert summariser.get_latest_stat('n1', 'cpu.percent-user') == 20.0
+        assert self.get_metric_stats.call_count == 2
+        assert node_summary.LATEST_STAT_LOOKUPS.values[('skipped',)] >= 1
+
+    def test_fetches_every_sweep_without_interval(self):
+        self.get_metric_stats.return_value = render(10.0, time.time())
+        summariser = NodeSummarise(throttle=0)
+        for _ in range(3):
+            summariser.get_latest_stat('n1', 'cpu.percent-user')
+        assert self.get_metric_stats.call_count == 3
+        assert summariser.latest == {}
+
+    def test_forgets_removed_nodes(self):
+        self.get_metric_stats.return_value = render(10.0, time.time())
+        summariser = NodeSummarise(throttle=0, interval=600)
+        summariser.get_latest_stat('n1', 'cpu.percent-user')
+        summariser.get_latest_stat('n2', 'cpu.percent-user')
+        NS.central_store_thread.get_node_ids.return_value = ['n2']
+        summariser.calculate_host_summary = MagicMock()
+        summariser.calculate_host_summaries()
+        assert summariser.latest.keys() == [('n2', 'cpu.percent-user')]
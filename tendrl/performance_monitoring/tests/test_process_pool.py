@@ -0,0 +1,154 @@
+import __builtin__
+from base import commons_stubs
+import gevent
+from mock import MagicMock
+import os
+import pytest
+import signal
+import time
+with commons_stubs():
+    from tendrl.performance_monitoring.exceptions \
+        import TendrlPerformanceMonitoringException
+    # Registers the plugin, as SDSMonitoringManager does when it loads them
+    from tendrl.performance_monitoring.sds.ceph import ceph_plugin  # noqa
+    from tendrl.performance_monitoring.sds import process_pool
+    from tendrl.performance_monitoring.sds import SDSMonitoringManager
+    from tendrl.performance_monitoring.sds.process_pool \
+        import SummaryProcessPool
+
+CEPH_CLUSTER = {
+    'TendrlContext': {'sds_name': 'ceph'},
+    'nodes': {'n1': {}},
+    'Pools': {
+        '1': {'percent_used': 10},
+        '2': {'percent_used': 30},
+    },
+    'maps': {
+        'osd_map': {'data': {'osds': "[{'state': ['up']}, {'state': []}]"}},
+        'mon_status': {'data': {'outside_quorum': '[]'}},
+        'mon_map': {'data': {'mons': "[{'name': 'a'}]"}},
+    },
+}
+NODE_SERVICES = {'n1': {'ceph-osd': {'exists': 'True', 'running': 'True'}}}
+
+
+def failing_summary(sds_name, cluster_id, cluster_det, node_services):
+    raise ValueError('bad cluster')
+
+
+def spinning_summary(sds_name, cluster_id, cluster_det, node_services):
+    while True:
+        pass
+
+
+def slow_summary(sds_name, cluster_id, cluster_det, node_services):
+    time.sleep(0.3)
+    return cluster_id
+
+
+class TestSummaryProcessPool(object):
+    def setup_method(self, method):
+        __builtin__.NS = MagicMock()
+        self.pool = SummaryProcessPool(workers=2, timeout=1)
+
+    def teardown_method(self, method):
+        self.pool.stop()
+
+    def test_summarise(self):
+        summary = self.pool.summarise(
+            'ceph',
+            'c1',
+            CEPH_CLUSTER,
+            NODE_SERVICES
+        )
+        assert len(self.pool.workers) == 2
+        assert all(worker.pid != os.getpid() for worker in self.pool.workers)
+        assert summary['osd_counts'] == {'total': 2, 'down': 1}
+        assert summary['mon_counts'] == {'outside_quorum': 0, 'total': 1}
+        assert summary['services_count'] == {
+            'ceph-osd': {'running': 1, 'not_running': 0}
+        }
+        assert [pool['percent_used'] for pool in summary['most_used_pools']] \
+            == [30, 10]
+        # Unknown sds types have no summary, as when computed in process
+        assert self.pool.summarise('lustre', 'c2', {}, {}) is None
+
+    def test_plugin_error(self, monkeypatch):
+        monkeypatch.setattr(process_pool, 'summarise_cluster',
+                            failing_summary)
+        with pytest.raises(TendrlPerformanceMonitoringException) as ex:
+            self.pool.summarise('ceph', 'c1', CEPH_CLUSTER, {})
+        assert 'bad cluster' in str(ex.value)
+        # The worker is kept
+        pids = [worker.pid for worker in self.pool.workers]
+        with pytest.raises(TendrlPerformanceMonitoringException):
+            self.pool.summarise('ceph', 'c1', CEPH_CLUSTER, {})
+        assert [worker.pid for worker in self.pool.workers] == pids
+
+    def test_timeout_replaces_worker(self, monkeypatch):
+        monkeypatch.setattr(process_pool, 'summarise_cluster',
+                            spinning_summary)
+        self.pool.start()
+        pids = set(worker.pid for worker in self.pool.workers)
+        with pytest.raises(TendrlPerformanceMonitoringException):
+            self.pool.summarise('ceph', 'c1', CEPH_CLUSTER, {})
+        assert len(self.pool.workers) == 2
+        assert len(pids - set(w.pid for w in self.pool.workers)) == 1
+        assert process_pool.POOL_FAILURES.values[('timeout',)] >= 1
+
+    def test_dead_worker_replaced(self):
+        self.pool.start()
+        # The first idle worker
+        os.kill(self.pool.workers[0].pid, signal.SIGKILL)
+        with pytest.raises(TendrlPerformanceMonitoringException):
+            self.pool.summarise('ceph', 'c1', CEPH_CLUSTER, {})
+        # The replacement serves the next summary
+        summaries = [
+            self.pool.summarise('ceph', 'c1', CEPH_CLUSTER, {})
+            for _ in range(2)
+        ]
+        assert summaries[0]['osd_counts'] == {'total': 2, 'down': 1}
+
+    def test_other_timeout_raised(self, monkeypatch):
+        monkeypatch.setattr(process_pool, 'summarise_cluster',
+                            spinning_summary)
+        self.pool.start()
+        pids = set(worker.pid for worker in self.pool.workers)
+        with pytest.raises(gevent.Timeout):
+            with gevent.Timeout(0.1):
+                self.pool.summarise('ceph', 'c1', CEPH_CLUSTER, {})
+        assert len(pids - set(w.pid for w in self.pool.workers)) == 1
+
+    def test_killed_request_replaces_worker(self, monkeypatch):
+        monkeypatch.setattr(process_pool, 'summarise_cluster', slow_summary)
+        self.pool.start()
+        request = gevent.spawn(
+            self.pool.summarise,
+            'ceph',
+            'c1',
+            CEPH_CLUSTER,
+            {}
+        )
+        gevent.sleep(0.1)
+        request.kill()
+        # Neither worker answers with c1's summary
+        assert [
+            self.pool.summarise('ceph', 'c2', CEPH_CLUSTER, {})
+            for _ in range(2)
+        ] == ['c2', 'c2']
+        assert self.pool.idle.qsize() == 2
+
+
+class TestManagerProcessPool(object):
+    def test_sends_cluster_node_services(self):
+        __builtin__.NS = MagicMock()
+        manager = SDSMonitoringManager()
+        manager.node_services = dict(NODE_SERVICES, n2={'etcd': {}})
+        manager.process_pool = MagicMock()
+        manager.get_cluster_summary('c1', CEPH_CLUSTER)
+        manager.process_pool.summarise.assert_called_once_with(
+            'ceph',
+            'c1',
+            CEPH_CLUSTER,
+            NODE_SERVICES
+        )
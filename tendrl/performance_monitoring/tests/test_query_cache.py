@@ -0,0 +1,145 @@
+from base import commons_stubs
+import json
+from mock import MagicMock
+import pytest
+import shutil
+import tempfile
+with commons_stubs():
+    from tendrl.performance_monitoring.exceptions \
+        import TendrlPerformanceMonitoringException
+    from tendrl.performance_monitoring.time_series_db import cache
+    from tendrl.performance_monitoring.time_series_db.cache \
+        import RangeQueryCache
+
+STEP = 60
+
+
+class Upstream(object):
+    # One datapoint a minute on two series, like a wildcard target
+    def __init__(self):
+        self.queries = []
+
+    def step(self, from_time, until_time):
+        return STEP
+
+    def __call__(self, from_time, until_time):
+        self.queries.append((from_time, until_time))
+        step = self.step(from_time, until_time)
+        start = from_time - from_time % step + step
+        return json.dumps([
+            {
+                'target': target,
+                'datapoints': [
+                    [float(timestamp % 1000), timestamp]
+                    for timestamp in range(start, until_time + 1, step)
+                ],
+            }
+            for target in ('df-root', 'df-var')
+        ])
+
+
+class ArchivedUpstream(Upstream):
+    # A minute archive retained for a day, then 10 minute points
+    def __init__(self, now):
+        super(ArchivedUpstream, self).__init__()
+        self.now = now
+
+    def step(self, from_time, until_time):
+        return STEP if self.now - from_time <= 86400 else 600
+
+
+def steps(result):
+    return set(
+        later[1] - earlier[1]
+        for series in result
+        for earlier, later in zip(
+            series['datapoints'],
+            series['datapoints'][1:]
+        )
+    )
+
+
+class TestRangeQueryCache(object):
+    def setup_method(self, method):
+        self.upstream = Upstream()
+        self.now = 10 ** 9
+        self.time = MagicMock(return_value=self.now)
+
+    def query(self, query_cache, from_time, until_time=None):
+        return json.loads(query_cache.query(
+            self.upstream,
+            'node1',
+            'df-*.df_complex-used',
+            from_time,
+            until_time
+        ))
+
+    def test_completed_chunks_cached(self, monkeypatch):
+        monkeypatch.setattr(cache.time, 'time', self.time)
+        query_cache = RangeQueryCache(chunk=3600, settle=600)
+        week = self.now - 7 * 86400
+        first = self.query(query_cache, week)
+        assert first == json.loads(self.upstream(week, self.now))
+        self.upstream.queries = []
+        # A minute later, only the live chunks are queried
+        self.time.return_value = self.now + 60
+        second = self.query(query_cache, week + 60)
+        live_from = self.now + 60 - 600
+        assert self.upstream.queries == [
+            (live_from - live_from % 3600, self.now + 60)
+        ]
+        assert second == json.loads(self.upstream(week + 60, self.now + 60))
+
+    def test_long_and_short_ranges(self, monkeypatch):
+        monkeypatch.setattr(cache.time, 'time', self.time)
+        self.upstream = ArchivedUpstream(self.now)
+        query_cache = RangeQueryCache(chunk=3600, settle=600)
+        week = self.query(query_cache, self.now - 7 * 86400)
+        assert steps(week) == set([600])
+        # The recent chunks are not cached at the week's coarse step
+        hour = self.query(query_cache, self.now - 3 * 3600)
+        assert steps(hour) == set([STEP])
+        self.upstream.queries = []
+        hour = self.query(query_cache, self.now - 3 * 3600)
+        assert steps(hour) == set([STEP])
+        assert len(self.upstream.queries) == 1
+        assert self.upstream.queries[0][0] > self.now - 3600
+        # Nor the week served minute chunks
+        week = self.query(query_cache, self.now - 7 * 86400)
+        assert steps(week) == set([600])
+
+    def test_memory_bounded(self, monkeypatch):
+        monkeypatch.setattr(cache.time, 'time', self.time)
+        query_cache = RangeQueryCache(chunk=3600, settle=600,
+                                      max_bytes=10000)
+        self.query(query_cache, self.now - 86400)
+        assert 0 < query_cache.size <= 10000
+        assert query_cache.size == sum(
+            len(data) for data in query_cache.chunks.values()
+        )
+
+    def test_disk_tier(self, monkeypatch):
+        monkeypatch.setattr(cache.time, 'time', self.time)
+        disk_dir = tempfile.mkdtemp()
+        try:
+            self.query(RangeQueryCache(disk_dir=disk_dir), self.now - 86400)
+            self.upstream.queries = []
+            # Another api worker
+            other = RangeQueryCache(disk_dir=disk_dir)
+            result = self.query(other, self.now - 86400)
+            assert len(self.upstream.queries) == 1
+            assert result == json.loads(
+                self.upstream(self.now - 86400, self.now)
+            )
+            assert cache.CACHE_CHUNKS.values[('disk',)] >= 23
+        finally:
+            shutil.rmtree(disk_dir)
+
+    def test_parse_time(self):
+        assert cache.parse_time(None, 1000) is None
+        assert cache.parse_time('now', 1000) == 1000
+        assert cache.parse_time('-7d', 10 ** 6) == 10 ** 6 - 7 * 86400
+        assert cache.parse_time('-30min', 10000) == 10000 - 1800
+        assert cache.parse_time('12345', 1000) == 12345
+        with pytest.raises(TendrlPerformanceMonitoringException):
+            cache.parse_time('yesterday', 1000)
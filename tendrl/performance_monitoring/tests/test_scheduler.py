@@ -0,0 +1,86 @@
+import __builtin__
+from base import commons_stubs
+import gevent
+import gevent.event
+from mock import MagicMock
+with commons_stubs():
+    from tendrl.performance_monitoring import scheduler
+    from tendrl.performance_monitoring.scheduler import Scheduler
+
+
+class TestScheduler(object):
+    def setup_method(self, method):
+        __builtin__.NS = MagicMock()
+        self.scheduler = Scheduler(seed=1)
+
+    def teardown_method(self, method):
+        self.scheduler.stop()
+        self.scheduler.join(1)
+
+    def test_runs_every_period(self):
+        runs = []
+        task = self.scheduler.register(
+            'test_runs',
+            lambda: runs.append(1),
+            0.05,
+            jitter=0.2
+        )
+        self.scheduler.start()
+        gevent.sleep(0.32)
+        # Within the jitter of every slot, without drifting
+        assert 5 <= len(runs) <= 7
+        assert task.runs == len(runs)
+        assert task.slot <= task.due_at <= task.slot + 0.2 * 0.05
+        assert scheduler.TASK_RUNS.values[('test_runs', 'ok')] == len(runs)
+
+    def test_skips_while_running(self):
+        release = gevent.event.Event()
+        task = self.scheduler.register('test_skips', release.wait, 0.02)
+        self.scheduler.start()
+        gevent.sleep(0.11)
+        assert task.runs == 0
+        assert task.skipped >= 3
+        assert task.running
+        release.set()
+        gevent.sleep(0)
+        assert task.runs == 1
+        assert task.overruns == 1
+        assert scheduler.TASK_OVERRUNS.values[('test_skips',)] == 1
+
+    def test_kills_after_max_runtime(self):
+        task = self.scheduler.register(
+            'test_timeout',
+            lambda: gevent.sleep(10),
+            1,
+            max_runtime=0.05
+        )
+        self.scheduler.start()
+        gevent.sleep(0.2)
+        assert task.runs == 1
+        assert not task.running
+        assert task.failures == 1
+        assert scheduler.TASK_RUNS.values[('test_timeout', 'timeout')] == 1
+        assert NS.publisher_id is not None
+
+    def test_error_does_not_stop_task(self):
+        def fail():
+            raise ValueError('bad run')
+
+        task = self.scheduler.register('test_error', fail, 0.02, jitter=0)
+        self.scheduler.start()
+        gevent.sleep(0.07)
+        assert task.runs >= 2
+        assert task.failures == task.runs
+        assert scheduler.TASK_RUNS.values[('test_error', 'error')] == \
+            task.runs
+
+    def test_stats(self):
+        self.scheduler.register('test_stats', lambda: None, 30, jitter=0)
+        self.scheduler.start()
+        gevent.sleep(0.01)
+        stats = self.scheduler.stats()['test_stats']
+        assert stats['period'] == 30
+        assert stats['runs'] == 1
+        assert stats['skipped'] == 0
+        assert not stats['running']
+        assert stats['last_seconds'] < 1
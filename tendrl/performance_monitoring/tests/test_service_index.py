@@ -0,0 +1,67 @@
+import __builtin__
+from base import commons_stubs
+from mock import MagicMock
+with commons_stubs():
+    from tendrl.performance_monitoring.central_store \
+        import PerformanceMonitoringEtcdCentralStore
+    from tendrl.performance_monitoring.sds.ceph.ceph_plugin import CephPlugin
+    from tendrl.performance_monitoring.sds import SDSMonitoringManager
+
+
+def leaf(key, value):
+    return MagicMock(key=key, value=value, dir=False)
+
+
+class TestServiceIndex(object):
+    def setup_method(self, method):
+        __builtin__.NS = MagicMock()
+
+    def test_get_node_services_single_read(self):
+        NS.etcd_orm.client.read.return_value = MagicMock(leaves=[
+            leaf('/nodes/n1/Service/ceph-osd/exists', 'True'),
+            leaf('/nodes/n1/Service/ceph-osd/running', 'False'),
+            leaf('/nodes/n1/Service/httpd/exists', 'True'),
+            leaf('/nodes/n1/NodeContext/fqdn', 'n1.example.com'),
+            leaf('/nodes/n2/Service/etcd/exists', 'True'),
+            leaf('/nodes/n2/Service/etcd/running', 'True'),
+        ])
+        store = PerformanceMonitoringEtcdCentralStore()
+        node_services = store.get_node_services(['ceph-osd', 'etcd'])
+        NS.etcd_orm.client.read.assert_called_once_with(
+            '/nodes',
+            recursive=True
+        )
+        assert node_services == {
+            'n1': {'ceph-osd': {'exists': 'True', 'running': 'False'}},
+            'n2': {'etcd': {'exists': 'True', 'running': 'True'}},
+        }
+
+    def test_get_services_count_from_index(self):
+        NS.sds_monitoring_manager.node_services = {
+            'n1': {
+                'ceph-osd': {'exists': 'True', 'running': 'False'},
+                'etcd': {'exists': 'True', 'running': 'True'},
+            },
+            'n2': {
+                'ceph-osd': {'exists': 'True', 'running': 'True'},
+                'glusterd': {'exists': 'True', 'running': 'True'},
+            },
+            'n3': {
+                'ceph-osd': {'exists': 'True', 'running': 'True'},
+            },
+        }
+        cluster_det = {'nodes': {'n1': {}, 'n2': {}}}
+        assert CephPlugin().get_services_count(cluster_det) == {
+            'ceph-osd': {'running': 1, 'not_running': 1},
+            'etcd': {'running': 1, 'not_running': 0},
+        }
+
+    def test_refresh_service_index(self):
+        NS.central_store_thread.get_node_services.return_value = {'n1': {}}
+        manager = SDSMonitoringManager()
+        manager.refresh_service_index()
+        service_names = \
+            NS.central_store_thread.get_node_services.call_args[0][0]
+        assert 'ceph-osd' in service_names
+        assert 'glusterd' in service_names
+        assert manager.node_services == {'n1': {}}
@@ -0,0 +1,133 @@
+import __builtin__
+from base import commons_stubs
+from mock import MagicMock
+import os
+import pytest
+import shutil
+import tempfile
+with commons_stubs():
+    from tendrl.performance_monitoring.central_store \
+        import PerformanceMonitoringEtcdCentralStore
+    from tendrl.performance_monitoring.central_store import snapshot
+    from tendrl.performance_monitoring.central_store.snapshot \
+        import SummarySnapshot
+    from tendrl.performance_monitoring.exceptions \
+        import TendrlPerformanceMonitoringException
+
+
+class TestSummarySnapshot(object):
+    def setup_method(self, method):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'summaries.snapshot')
+        self.writer = SummarySnapshot(self.path, create=True, size=64)
+        self.reader = SummarySnapshot(self.path)
+
+    def teardown_method(self, method):
+        self.reader.close()
+        self.writer.close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_publish_and_read(self):
+        assert self.reader.read() is None
+        assert self.reader.get('nodes', 'n1') is None
+        self.writer.update('nodes', 'n1', {
+            'node_id': 'n1',
+            'alert_count': 2,
+            '_etcd_cls': object,
+            'value': 'monitoring/summary/nodes/n1',
+        })
+        self.writer.set('node_ids', ['n1', 'n2'])
+        # Not visible before it is published
+        assert self.reader.read() is None
+        self.writer.publish()
+        assert self.reader.get('nodes', 'n1') == {
+            'node_id': 'n1',
+            'alert_count': 2
+        }
+        assert self.reader.get('node_ids') == ['n1', 'n2']
+        assert self.reader.read()['generation'] == 1
+        # Decoded once per published snapshot
+        assert self.reader.read() is self.reader.read()
+
+    def test_retain_and_grow(self):
+        for index in range(100):
+            self.writer.update('clusters', 'c%s' % index, {'index': index})
+        self.writer.publish()
+        # Outgrew the 64 bytes the reader mapped first
+        assert self.reader.get('clusters', 'c99') == {'index': 99}
+        self.writer.retain('clusters', ['c1'])
+        self.writer.publish()
+        assert self.reader.get('clusters') == {'c1': {'index': 1}}
+        assert self.reader.read()['generation'] == 2
+
+    def test_read_while_written(self, monkeypatch):
+        self.writer.set('node_ids', ['n1'])
+        self.writer.publish()
+        seq, length = snapshot.HEADER.unpack_from(self.writer.mmap, 0)
+        # A writer that stopped halfway leaves the sequence number odd
+        snapshot.HEADER.pack_into(self.writer.mmap, 0, seq + 1, length)
+        monkeypatch.setattr(snapshot, 'READ_ATTEMPTS', 3)
+        with pytest.raises(TendrlPerformanceMonitoringException):
+            self.reader.read()
+        snapshot.HEADER.pack_into(self.writer.mmap, 0, seq + 2, length)
+        assert self.reader.get('node_ids') == ['n1']
+
+
+class TestSnapshotCentralStore(object):
+    def setup_method(self, method):
+        __builtin__.NS = MagicMock()
+        self.tmpdir = tempfile.mkdtemp()
+        self.store = PerformanceMonitoringEtcdCentralStore()
+        self.store.summary_snapshot = SummarySnapshot(
+            os.path.join(self.tmpdir, 'summaries.snapshot'),
+            create=True
+        )
+
+    def teardown_method(self, method):
+        self.store.summary_snapshot.close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_summaries_from_snapshot(self):
+        NS.node_liveness.get_status.return_value = 'UP'
+        self.store.snapshot_summary('nodes', 'n1', {'node_id': 'n1'})
+        self.store.snapshot_summary('clusters', 'c1', {'cluster_id': 'c1'})
+        self.store.snapshot_summary('systems', 'ceph', {'sds_type': 'ceph'})
+        self.store.publish_summaries(node_ids=['n1'])
+        assert self.store.get_node_summary() == (
+            [{
+                'node_id': 'n1',
+                'status': 'UP',
+                'version': self.store.node_changes.version
+            }],
+            200,
+            None
+        )
+        assert self.store.get_cluster_summary('c1') == {'cluster_id': 'c1'}
+        assert self.store.get_system_summary('ceph') == {'sds_type': 'ceph'}
+        assert not NS.etcd_orm.client.read.called
+        # The status is not written back into the snapshot
+        assert 'status' not in self.store.summary_snapshot.get('nodes', 'n1')
+
+    def test_falls_back_to_etcd(self):
+        self.store.publish_summaries(node_ids=['n1'])
+        NS.etcd_orm.client.read.return_value = MagicMock(leaves=[
+            MagicMock(
+                key='/monitoring/summary/nodes/n1/node_id',
+                value='n1',
+                dir=False
+            ),
+            MagicMock(
+                key='/monitoring/summary/nodes/n1/_etcd_cls',
+                value='cls',
+                dir=False
+            ),
+        ])
+        NS.node_liveness.get_status.return_value = 'DOWN'
+        assert self.store.get_node_summary() == (
+            [{'node_id': 'n1', 'status': 'DOWN'}],
+            200,
+            None
+        )
+        NS.etcd_orm.client.read.assert_called_once_with(
+            '/monitoring/summary/nodes/n1'
+        )
@@ -0,0 +1,147 @@
+import __builtin__
+from base import commons_stubs
+import gevent
+import json
+from mock import MagicMock
+import os
+import shutil
+import tempfile
+with commons_stubs():
+    from tendrl.performance_monitoring.central_store \
+        import PerformanceMonitoringEtcdCentralStore
+    from tendrl.performance_monitoring.central_store.snapshot \
+        import SummarySnapshot
+    from tendrl.performance_monitoring import manager
+    from tendrl.performance_monitoring.manager.summary_stream \
+        import SummaryStream
+
+
+def parse(chunk):
+    event, data = chunk.strip().split('\n')
+    return event[len('event: '):], json.loads(data[len('data: '):])
+
+
+class TestSubscriber(object):
+    def setup_method(self, method):
+        self.stream = SummaryStream(max_pending=3, heartbeat=0.01)
+
+    def test_coalesces(self):
+        subscriber = self.stream.subscribe()
+        subscriber.offer('node', 'n1', 'node', {'cpu': 1})
+        subscriber.offer('node', 'n2', 'node', {'cpu': 2})
+        subscriber.offer('node', 'n1', 'node', {'cpu': 3})
+        events = iter(subscriber)
+        assert [parse(next(events)) for _ in range(2)] == [
+            ('node', {'cpu': 2}),
+            ('node', {'cpu': 3}),
+        ]
+        assert next(events) == ': keepalive\n\n'
+
+    def test_resync_when_behind(self):
+        subscriber = self.stream.subscribe()
+        for index in range(4):
+            subscriber.offer('node', 'n%d' % index, 'node', {})
+        assert parse(next(iter(subscriber))) == ('resync', {})
+        assert not subscriber.pending
+
+    def test_filters(self):
+        subscriber = self.stream.subscribe(
+            node_ids=['n1'],
+            cluster_ids=['c1']
+        )
+        assert subscriber.wants('node', 'n1')
+        assert not subscriber.wants('node', 'n2')
+        assert subscriber.wants('cluster', 'c1')
+        assert not subscriber.wants('system', 'ceph')
+        subscriber = self.stream.subscribe(sections=['systems'])
+        assert subscriber.wants('system', 'ceph')
+        assert not subscriber.wants('node', 'n1')
+
+    def test_max_clients(self):
+        self.stream.max_clients = 1
+        subscriber = self.stream.subscribe()
+        assert self.stream.subscribe() is None
+        subscriber.close()
+        assert self.stream.subscribe() is not None
+
+
+class TestSummaryStream(object):
+    def setup_method(self, method):
+        __builtin__.NS = MagicMock()
+        self.tmpdir = tempfile.mkdtemp()
+        path = os.path.join(self.tmpdir, 'summaries.snapshot')
+        self.store = PerformanceMonitoringEtcdCentralStore()
+        self.store.summary_snapshot = SummarySnapshot(path, create=True)
+        NS.central_store_thread = self.store
+        NS.summary_stream = SummaryStream(poll_interval=0.01, heartbeat=0.01)
+        self.publish({'n1': 10, 'n2': 20}, {'c1': 1})
+
+    def teardown_method(self, method):
+        self.store.summary_snapshot.close()
+        shutil.rmtree(self.tmpdir)
+
+    def publish(self, nodes, clusters):
+        for node_id, cpu in nodes.items():
+            self.store.snapshot_summary('nodes', node_id, {
+                'node_id': node_id,
+                'cpu_usage': {'percent_used': cpu}
+            })
+        self.store.retain_summaries('nodes', nodes.keys())
+        for cluster_id, hosts in clusters.items():
+            self.store.snapshot_summary('clusters', cluster_id, {
+                'cluster_id': cluster_id,
+                'hosts_count': hosts
+            })
+        self.store.retain_summaries('clusters', clusters.keys())
+        self.store.publish_summaries(node_ids=sorted(nodes))
+
+    def test_pushes_changes(self):
+        stream = NS.summary_stream
+        subscriber = stream.subscribe()
+        stream.poll()
+        # Nothing before the first change
+        assert not subscriber.pending
+        self.publish({'n1': 10, 'n2': 25}, {'c1': 2})
+        self.publish({'n2': 30}, {'c1': 2})
+        stream.poll()
+        events = iter(subscriber)
+        assert sorted(
+            parse(next(events)) for _ in range(len(subscriber.pending))
+        ) == [
+            ('cluster', {'cluster_id': 'c1', 'hosts_count': 2}),
+            ('node', {
+                'node_id': 'n2',
+                'cpu_usage': {'percent_used': 30},
+                'version': self.store.node_changes.version - 1,
+            }),
+            ('node_removed', {'node_id': 'n1'}),
+        ]
+        subscriber.close()
+        gevent.sleep(0.05)
+        assert stream.greenlet.ready()
+
+    def test_endpoint(self):
+        client = manager.app.test_client()
+        self.store.get_cluster_node_ids = MagicMock(return_value=['n1'])
+        response = client.get(
+            '/monitoring/stream?clusters=c1&sections=nodes',
+            buffered=False
+        )
+        assert response.status_code == 200
+        assert response.mimetype == 'text/event-stream'
+        subscriber, = NS.summary_stream.subscribers
+        assert subscriber.node_ids == set(['n1'])
+        assert subscriber.cluster_ids == set(['c1'])
+        assert next(response.response) == ': keepalive\n\n'
+        response.close()
+        assert not NS.summary_stream.subscribers
+        assert client.get(
+            '/monitoring/stream?sections=pools'
+        ).status_code == 400
+        self.store.summary_snapshot.close()
+        self.store.summary_snapshot = None
+        assert client.get('/monitoring/stream').status_code == 503
+        self.store.summary_snapshot = SummarySnapshot(
+            os.path.join(self.tmpdir, 'summaries.snapshot'),
+            create=True
+        )
@@ -0,0 +1,117 @@
+import __builtin__
+from base import commons_stubs
+from etcd import EtcdConnectionFailed
+from mock import MagicMock
+with commons_stubs():
+    from tendrl.performance_monitoring.benchmarks.etcd_store \
+        import MemoryEtcdClient
+    from tendrl.performance_monitoring.central_store.writer \
+        import changed_keys
+    from tendrl.performance_monitoring.central_store.writer \
+        import SummaryWriter
+    from tendrl.performance_monitoring.utils import read as etcd_read
+
+PATH = 'monitoring/summary/nodes/n1'
+
+
+def summary(cpu, memory=20, updated_at='t0'):
+    return {
+        'node_id': 'n1',
+        'cpu_usage': {'percent_used': cpu, 'updated_at': updated_at},
+        'memory_usage': {'percent_used': memory, 'updated_at': updated_at},
+        'alert_count': 0,
+        '_etcd_cls': object,
+        'value': PATH,
+    }
+
+
+class TestChangedKeys(object):
+    def test_updated_at_follows_its_value(self):
+        persisted = {
+            'a/percent_used': 1,
+            'a/updated_at': 't0',
+            'b/percent_used': 2,
+            'b/updated_at': 't0',
+        }
+        assert changed_keys(dict(persisted), persisted) == {}
+        assert changed_keys({
+            'a/percent_used': 1,
+            'a/updated_at': 't1',
+            'b/percent_used': 3,
+            'b/updated_at': 't1',
+        }, persisted) == {'b/percent_used': 3, 'b/updated_at': 't1'}
+        # Never written
+        assert changed_keys({'c/updated_at': 't1'}, persisted) == {
+            'c/updated_at': 't1'
+        }
+
+
+class TestSummaryWriter(object):
+    def setup_method(self, method):
+        __builtin__.NS = MagicMock()
+        NS.etcd_orm.client = MemoryEtcdClient()
+        self.writer = SummaryWriter()
+
+    def test_writes_changed_keys(self):
+        client = NS.etcd_orm.client
+        self.writer.save(PATH, summary(10))
+        assert client.writes == 0
+        self.writer.flush()
+        assert client.writes == 6
+        assert etcd_read('/' + PATH) == {
+            'node_id': 'n1',
+            'cpu_usage': {'percent_used': 10, 'updated_at': 't0'},
+            'memory_usage': {'percent_used': 20, 'updated_at': 't0'},
+            'alert_count': 0,
+        }
+        # Only the times moved
+        self.writer.save(PATH, summary(10, updated_at='t1'))
+        self.writer.flush()
+        assert client.writes == 6
+        self.writer.save(PATH, summary(15, updated_at='t2'))
+        self.writer.flush()
+        assert client.writes == 8
+        assert etcd_read('/' + PATH)['cpu_usage'] == {
+            'percent_used': 15,
+            'updated_at': 't2'
+        }
+        assert etcd_read('/' + PATH)['memory_usage']['updated_at'] == 't0'
+
+    def test_last_save_of_the_cycle(self):
+        client = NS.etcd_orm.client
+        self.writer.save(PATH, summary(10))
+        self.writer.flush()
+        self.writer.save(PATH, summary(15))
+        self.writer.save(PATH, summary(10))
+        self.writer.flush()
+        assert client.writes == 6
+
+    def test_rewrite_interval(self):
+        client = NS.etcd_orm.client
+        self.writer.rewrite_interval = 0
+        self.writer.save(PATH, summary(10))
+        self.writer.flush()
+        self.writer.save(PATH, summary(10))
+        self.writer.flush()
+        assert client.writes == 12
+
+    def test_failed_writes_are_retried(self):
+        client = NS.etcd_orm.client
+        write = client.write
+        client.write = MagicMock(side_effect=EtcdConnectionFailed())
+        self.writer.save(PATH, summary(10))
+        self.writer.flush()
+        assert client.write.call_count == 1
+        client.write = write
+        self.writer.save(PATH, summary(10))
+        self.writer.flush()
+        assert client.writes == 6
+
+    def test_retain(self):
+        self.writer.save(PATH, summary(10))
+        self.writer.save('monitoring/summary/clusters/c1', {'sds_type': ''})
+        self.writer.flush()
+        self.writer.retain('nodes', ['n2'])
+        assert self.writer.persisted.keys() == [
+            'monitoring/summary/clusters/c1'
+        ]
@@ -0,0 +1,99 @@
+import __builtin__
+from base import commons_stubs
+from mock import MagicMock
+with commons_stubs():
+    from tendrl.performance_monitoring.sds.ceph.ceph_plugin import CephPlugin
+    from tendrl.performance_monitoring.sds import SystemAggregate
+
+
+def cluster_summary(cluster_id, total, used, down, pools, sds_type='ceph'):
+    return MagicMock(
+        cluster_id=cluster_id,
+        sds_type=sds_type,
+        utilization={'total': total, 'used': used, 'percent_used': 0},
+        hosts_count={'total': 3, 'down': down},
+        sds_det={
+            'services_count': {'ceph-osd': {'running': 2, 'not_running': 1}},
+            'osd_counts': {'total': 4, 'down': down},
+            'mon_counts': '{"total": 1, "outside_quorum": 0}',
+            'most_used_pools': pools,
+            'most_used_rbds': [],
+        }
+    )
+
+
+class TestSystemAggregate(object):
+    def setup_method(self, method):
+        __builtin__.NS = MagicMock()
+        self.plugin = CephPlugin()
+        self.aggregate = SystemAggregate()
+        clusters = [
+            cluster_summary('c1', 100, 50, 1, [{'percent_used': 10}]),
+            cluster_summary('c2', 300, 50, 0, [{'percent_used': 70}]),
+        ]
+        for summary in clusters:
+            self.aggregate.update(
+                summary.cluster_id,
+                self.plugin.get_cluster_counters(
+                    summary,
+                    {'GlobalDetails': {'status': 'HEALTH_OK'}}
+                ),
+                self.plugin.get_cluster_ranked(summary)
+            )
+
+    def test_totals(self):
+        assert self.plugin.get_system_utilization(self.aggregate) == {
+            'total': 400,
+            'used': 100,
+            'percent_used': 25.0
+        }
+        assert self.plugin.get_system_host_status_wise_counts(
+            self.aggregate
+        ) == {
+            'total': 6,
+            'down': 1,
+            'crit_alert_count': 0,
+            'warn_alert_count': 0
+        }
+        assert self.plugin.get_clusters_status_wise_counts(
+            self.aggregate
+        ) == {'total': 2, 'HEALTH_OK': 2}
+        assert self.plugin.get_system_services_count(self.aggregate) == {
+            'ceph-osd': {'running': 4, 'not_running': 2}
+        }
+        assert self.plugin.get_system_mon_status_wise_counts(
+            self.aggregate
+        ) == {'total': 2, 'outside_quorum': 0}
+        assert self.plugin.get_system_max_used_pools(self.aggregate) == [
+            {'percent_used': 70}, {'percent_used': 10}
+        ]
+
+    def test_single_cluster_update(self):
+        summary = cluster_summary('c1', 100, 100, 0, [])
+        self.aggregate.update(
+            'c1',
+            self.plugin.get_cluster_counters(summary, {}),
+            self.plugin.get_cluster_ranked(summary)
+        )
+        assert self.aggregate.section('utilization') == {
+            'total': 400,
+            'used': 150
+        }
+        assert self.aggregate.section('cluster_count') == {
+            'total': 1,
+            'HEALTH_OK': 1
+        }
+        assert self.aggregate.section('osd_counts') == {
+            'total': 8,
+            'down': 0
+        }
+
+    def test_retain_drops_removed_clusters(self):
+        self.aggregate.retain(['c2'])
+        assert self.aggregate.section('utilization') == {
+            'total': 300,
+            'used': 50
+        }
+        self.aggregate.retain([])
+        assert self.aggregate.totals == {}
+        assert self.aggregate.ranked('most_used_pools', 'percent_used') == []
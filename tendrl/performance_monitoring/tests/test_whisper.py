@@ -0,0 +1,168 @@
+import __builtin__
+from base import commons_stubs
+import json
+from mock import MagicMock
+from mock import patch
+import os
+import shutil
+import tempfile
+import time
+with commons_stubs():
+    # The plugins are instantiated, and connect to carbon, when defined
+    with patch('gevent.socket.socket'):
+        from tendrl.performance_monitoring.time_series_db.dbplugins \
+            import whisper
+    from tendrl.performance_monitoring.time_series_db.dbplugins.whisper \
+        import WhisperPlugin
+
+ARCHIVES = ((60, 10), (300, 12))
+
+
+def create_whisper(path, points):
+    # points: {archive index: [(timestamp, value), ...]}
+    offset = whisper.METADATA.size + len(ARCHIVES) * whisper.ARCHIVE_INFO.size
+    header = whisper.METADATA.pack(1, 3600, 0.5, len(ARCHIVES))
+    body = ''
+    for index, (step, count) in enumerate(ARCHIVES):
+        header += whisper.ARCHIVE_INFO.pack(offset, step, count)
+        archive = ['\0' * whisper.POINT.size] * count
+        written = points.get(index, [])
+        base = written[0][0] if written else 0
+        for timestamp, value in written:
+            archive[(timestamp - base) // step % count] = \
+                whisper.POINT.pack(timestamp, value)
+        body += ''.join(archive)
+        offset += count * whisper.POINT.size
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, 'wb') as whisper_file:
+        whisper_file.write(header + body)
+
+
+class TestWhisperPlugin(object):
+    def setup_method(self, method):
+        __builtin__.NS = MagicMock()
+        self.storage_dir = tempfile.mkdtemp()
+        NS.performance_monitoring.config.data = {
+            'time_series_db_server': '127.0.0.1',
+            'time_series_db_port': 10080,
+            'carbon_port': 2003,
+            'whisper_storage_dir': self.storage_dir,
+        }
+        with patch('gevent.socket.socket'):
+            self.plugin = WhisperPlugin()
+            self.plugin.intialize()
+        self.plugin.http = MagicMock()
+        self.now = int(time.time())
+        self.now -= self.now % 60
+
+    def teardown_method(self, method):
+        self.plugin.destroy()
+        shutil.rmtree(self.storage_dir)
+
+    def series_path(self, metric):
+        return os.path.join(
+            self.storage_dir,
+            'collectd',
+            'node1_example',
+            metric.replace('.', os.sep) + '.wsp'
+        )
+
+    def test_fetch_wraps_around(self):
+        path = self.series_path('cpu.percent-user')
+        # 13 minutes written in a 10 point archive: the first 3 are gone
+        create_whisper(path, {0: [
+            (self.now - 60 * age, float(age)) for age in range(12, -1, -1)
+        ]})
+        datapoints = whisper.WhisperFile(path).fetch(
+            self.now - 600,
+            self.now,
+            self.now
+        )
+        assert [value for value, _ in datapoints] == \
+            [float(age) for age in range(9, -1, -1)]
+        assert [timestamp for _, timestamp in datapoints] == \
+            range(self.now - 540, self.now + 60, 60)
+
+    def test_older_ranges_from_coarser_archive(self):
+        path = self.series_path('memory.memory-used')
+        create_whisper(path, {
+            0: [(self.now, 1.0)],
+            1: [(self.now - self.now % 300 - 300 * age, 5.0)
+                for age in range(11, -1, -1)],
+        })
+        datapoints = whisper.WhisperFile(path).fetch(
+            self.now - 3000,
+            self.now,
+            self.now
+        )
+        assert all(timestamp % 300 == 0 for _, timestamp in datapoints)
+        assert 5.0 in [value for value, _ in datapoints]
+
+    def test_settled_ranges_read_locally(self):
+        # A day back is served by the coarsest archive, as graphite-web
+        # does
+        now = self.now - self.now % 300
+        for mount, value in (('root', 300.0), ('var', 200.0)):
+            create_whisper(
+                self.series_path('df-%s.df_complex-used' % mount),
+                {1: [(now - 900, value - 1), (now - 600, value)]}
+            )
+        stats = json.loads(self.plugin.get_metric_stats(
+            'node1.example',
+            'df-*.df_complex-used',
+            from_time=now - 86400,
+            until_time=now - 600
+        ))
+        assert [series['target'] for series in stats] == [
+            'collectd.node1_example.df-root.df_complex-used',
+            'collectd.node1_example.df-var.df_complex-used',
+        ]
+        assert stats[0]['datapoints'] == [
+            [299.0, now - 900],
+            [300.0, now - 600]
+        ]
+        assert not self.plugin.http.request.called
+        # Unmapped and mapped again when replaced
+        path = self.series_path('df-root.df_complex-used')
+        mapped = self.plugin.files[path]
+        os.remove(path)
+        create_whisper(path, {0: [(self.now, 1.0)] * 2})
+        self.plugin.get_metric_stats(
+            'node1.example',
+            'df-root.df_complex-used',
+            until_time=now - 600
+        )
+        assert self.plugin.files[path] is not mapped
+
+    def test_live_ranges_from_graphite_web(self):
+        # Their datapoints may still be in carbon's cache
+        create_whisper(self.series_path('cpu.percent-user'), {
+            0: [(self.now, 1.0)]
+        })
+        self.plugin.http.request.return_value = MagicMock(
+            status=200,
+            data='[]'
+        )
+        for time_interval, until_time in (
+            ('latest', None),
+            (None, None),
+            (None, self.now - 60),
+        ):
+            self.plugin.get_metric_stats(
+                'node1.example',
+                'cpu.percent-user',
+                time_interval,
+                until_time=until_time
+            )
+        assert self.plugin.http.request.call_count == 3
+        assert not self.plugin.files
+
+    def test_remote_series_from_graphite_web(self):
+        self.plugin.http.request.return_value = MagicMock(
+            status=200,
+            data='[{"target": "x", "datapoints": [[1.0, 60]]}]'
+        )
+        assert self.plugin.get_metric_stats('node2', 'cpu.percent-user') == \
+            '[{"target": "x", "datapoints": [[1.0, 60]]}]'
+        assert whisper.WHISPER_READS.values[('http',)] >= 1
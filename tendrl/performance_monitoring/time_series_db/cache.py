@@ -0,0 +1,286 @@
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+
+from tendrl.performance_monitoring.exceptions \
+    import TendrlPerformanceMonitoringException
+from tendrl.performance_monitoring import instrumentation
+
+# graphite-web's default render range
+DEFAULT_RANGE = 24 * 60 * 60
+PRUNE_EVERY = 1000
+TIME_UNITS = {
+    's': 1,
+    'min': 60,
+    'h': 3600,
+    'd': 86400,
+    'w': 604800,
+}
+
+CACHE_CHUNKS = instrumentation.counter(
+    'tendrl_pm_query_cache_chunks_total',
+    'Completed chunks of range queries read from memory, from disk, or '
+    'fetched from the time series db',
+    ['source']
+)
+CACHE_BYTES = instrumentation.gauge(
+    'tendrl_pm_query_cache_bytes',
+    'Size of the chunks the range query cache keeps in memory'
+)
+
+
+def series_step(series_list):
+    # Seconds between the datapoints of a render response, None when no
+    # series has two of them
+    steps = [
+        later[1] - earlier[1]
+        for series in series_list
+        for earlier, later in zip(
+            series['datapoints'],
+            series['datapoints'][1:]
+        )
+        if later[1] > earlier[1]
+    ]
+    return min(steps) if steps else None
+
+
+def parse_time(value, now):
+    """Seconds since the epoch, 'now', or relative to now as -7d or -30min
+
+    None when value is empty.
+    """
+    if not value:
+        return None
+    if value == 'now':
+        return now
+    match = re.match(r'^-(\d+)(s|min|h|d|w)$', value)
+    if match is not None:
+        return now - int(match.group(1)) * TIME_UNITS[match.group(2)]
+    try:
+        return int(value)
+    except ValueError:
+        raise TendrlPerformanceMonitoringException(
+            'Invalid time %s' % value
+        )
+
+
+class RangeQueryCache(object):
+    """Range queries split into chunks aligned on chunk seconds
+
+    Datapoints are time stamped at the end of their interval, so a chunk
+    starting at start holds those in (start, start + chunk]. A chunk
+    that ended more than settle seconds ago, the delay after which
+    collectd's datapoints are all written, is complete and never
+    changes: it is kept in a least recently used cache of max_bytes,
+    and in disk_dir if set. A query is then served from the cached
+    chunks, and a single query to the time series db fetches the chunks
+    not cached yet and the live ones at the end.
+
+    Carbon serves a range from the finest archive retaining all of it, so
+    the same chunk comes at a coarser step as part of a longer range.
+    Chunks are keyed by their step, taken from the fetched datapoints,
+    and only those at the finest step seen for the series are cached and
+    looked up. A range older than the finest archive retains is always
+    fetched.
+    """
+
+    def __init__(self, chunk=3600, settle=600, max_bytes=64 * 1024 * 1024,
+                 disk_dir=None, disk_retention=8 * 86400):
+        self.chunk = chunk
+        self.settle = settle
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        # Seconds after which a chunk not written again is removed from
+        # disk_dir, checked every PRUNE_EVERY chunks written
+        self.disk_retention = disk_retention
+        self.disk_writes = 0
+        # key -> json of the [target, datapoints] pairs of the chunk
+        self.chunks = OrderedDict()
+        self.size = 0
+        # (entity_name, metric_name) -> finest step seen
+        self.steps = {}
+
+    def key(self, entity_name, metric_name, step, start):
+        return '%s|%s|%d|%d' % (entity_name, metric_name, step, start)
+
+    def step_key(self, entity_name, metric_name):
+        return 'step|%s|%s' % (entity_name, metric_name)
+
+    def finest_step(self, entity_name, metric_name):
+        # From this process, else from another api worker through disk_dir
+        step = self.steps.get((entity_name, metric_name))
+        if step is not None or self.disk_dir is None:
+            return step
+        try:
+            with open(self.disk_path(
+                self.step_key(entity_name, metric_name)
+            )) as step_file:
+                step = int(step_file.read())
+        except (EnvironmentError, ValueError):
+            return None
+        self.steps[(entity_name, metric_name)] = step
+        return step
+
+    def learn_step(self, entity_name, metric_name, step):
+        self.steps[(entity_name, metric_name)] = step
+        if self.disk_dir is not None:
+            self.write_disk(self.step_key(entity_name, metric_name), str(step))
+
+    def disk_path(self, key):
+        return os.path.join(self.disk_dir, hashlib.sha1(key).hexdigest())
+
+    def get(self, key):
+        data = self.chunks.pop(key, None)
+        if data is not None:
+            self.chunks[key] = data
+            CACHE_CHUNKS.inc(source='memory')
+            return json.loads(data)
+        if self.disk_dir is None:
+            return None
+        try:
+            with open(self.disk_path(key)) as chunk_file:
+                data = chunk_file.read()
+        except EnvironmentError:
+            return None
+        CACHE_CHUNKS.inc(source='disk')
+        self.remember(key, data)
+        return json.loads(data)
+
+    def remember(self, key, data):
+        self.chunks[key] = data
+        self.size += len(data)
+        while self.size > self.max_bytes and self.chunks:
+            self.size -= len(self.chunks.popitem(last=False)[1])
+        CACHE_BYTES.set(self.size)
+
+    def put(self, key, series):
+        data = json.dumps(series)
+        old = self.chunks.pop(key, None)
+        if old is not None:
+            self.size -= len(old)
+        self.remember(key, data)
+        if self.disk_dir is None or not self.write_disk(key, data):
+            # Kept in memory only
+            return
+        self.disk_writes += 1
+        if self.disk_writes % PRUNE_EVERY == 0:
+            self.prune()
+
+    def write_disk(self, key, data):
+        try:
+            # Renamed into place so that the other api workers never read
+            # a partial file
+            fd, path = tempfile.mkstemp(dir=self.disk_dir)
+            with os.fdopen(fd, 'w') as disk_file:
+                disk_file.write(data)
+            os.rename(path, self.disk_path(key))
+        except EnvironmentError:
+            return False
+        return True
+
+    def prune(self):
+        oldest = time.time() - self.disk_retention
+        for name in os.listdir(self.disk_dir):
+            path = os.path.join(self.disk_dir, name)
+            try:
+                if os.path.getmtime(path) < oldest:
+                    os.remove(path)
+            except EnvironmentError:
+                # Removed by another api worker
+                continue
+
+    def query(self, fetch, entity_name, metric_name, from_time=None,
+              until_time=None):
+        """Datapoints of the range, in graphite-web's render json
+
+        fetch(from_time, until_time) queries the time series db.
+        """
+        now = int(time.time())
+        until_time = min(until_time or now, now)
+        if from_time is None:
+            from_time = until_time - DEFAULT_RANGE
+        # Chunks ending at or before complete_until are complete
+        complete_until = now - self.settle
+        complete_until -= complete_until % self.chunk
+        starts = range(
+            from_time - from_time % self.chunk,
+            until_time,
+            self.chunk
+        )
+        step = self.finest_step(entity_name, metric_name)
+        cached = {}
+        fetch_from = None
+        for start in starts:
+            series = None
+            if step is not None and start + self.chunk <= complete_until:
+                series = self.get(
+                    self.key(entity_name, metric_name, step, start)
+                )
+            if series is None:
+                # This chunk, not cached yet or live, and the ones after
+                # it are fetched at once
+                fetch_from = start
+                break
+            cached[start] = series
+        fetched = []
+        if fetch_from is not None:
+            fetched = json.loads(fetch(fetch_from, until_time))
+            fetched_step = series_step(fetched)
+            if fetched_step is not None and (
+                step is None or fetched_step < step
+            ):
+                step = fetched_step
+                self.learn_step(entity_name, metric_name, step)
+                if cached:
+                    # Cached at a coarser step than the range is served at
+                    cached = {}
+                    fetch_from = starts[0]
+                    fetched = json.loads(fetch(fetch_from, until_time))
+                    fetched_step = series_step(fetched)
+            if fetched_step is not None and fetched_step == step:
+                self.store(fetched, entity_name, metric_name, step,
+                           fetch_from, min(until_time, complete_until))
+        return json.dumps(
+            self.merge(cached, fetched, starts, from_time, until_time)
+        )
+
+    def store(self, fetched, entity_name, metric_name, step, from_time,
+              until_time):
+        # Caches the complete chunks of the fetched range
+        chunks = dict(
+            (start, [[series['target'], []] for series in fetched])
+            for start in range(from_time, until_time, self.chunk)
+            if start + self.chunk <= until_time
+        )
+        for index, series in enumerate(fetched):
+            for point in series['datapoints']:
+                chunk = chunks.get((point[1] - 1) // self.chunk * self.chunk)
+                if chunk is not None:
+                    chunk[index][1].append(point)
+        for start, series in chunks.iteritems():
+            self.put(self.key(entity_name, metric_name, step, start), series)
+            CACHE_CHUNKS.inc(source='fetched')
+
+    def merge(self, cached, fetched, starts, from_time, until_time):
+        targets = OrderedDict()
+        for start in starts:
+            for target, datapoints in cached.get(start, []):
+                targets.setdefault(target, []).extend(datapoints)
+        for series in fetched:
+            targets.setdefault(series['target'], []).extend(
+                series['datapoints']
+            )
+        return [
+            {
+                'target': target,
+                'datapoints': [
+                    point for point in datapoints
+                    if from_time < point[1] <= until_time
+                ],
+            }
+            for target, datapoints in targets.iteritems()
+        ]
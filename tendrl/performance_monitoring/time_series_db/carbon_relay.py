@@ -0,0 +1,220 @@
+import cPickle
+import fnmatch
+import gevent
+import gevent.queue
+from gevent.server import StreamServer
+from gevent import socket
+import re
+from StringIO import StringIO
+import struct
+import time
+
+from tendrl.commons.event import Event
+from tendrl.commons.message import ExceptionMessage
+from tendrl.performance_monitoring import instrumentation
+
+# Series of each node, below collectd.<node>, the summarisers read
+LATEST_PATTERNS = (
+    'cpu.percent-*',
+    'memory.*',
+    'aggregation-memory-sum.memory',
+    'df-*.df_complex-*',
+)
+# Length of the pickled list of datapoints that follows
+PICKLE_HEADER = struct.Struct('!L')
+# Largest pickle message accepted, as in carbon
+MAX_PICKLE_SIZE = 1048576
+# Lines sent upstream at once
+SEND_BATCH = 500
+
+RELAY_DATAPOINTS = instrumentation.counter(
+    'tendrl_pm_relay_datapoints_total',
+    'Datapoints received by the carbon relay',
+    ['protocol']
+)
+RELAY_DROPPED = instrumentation.counter(
+    'tendrl_pm_relay_dropped_total',
+    'Datapoints the carbon relay did not forward: malformed, queue full '
+    'or upstream error',
+    ['reason']
+)
+RELAY_SERIES = instrumentation.gauge(
+    'tendrl_pm_relay_series',
+    'Series whose latest value the carbon relay keeps'
+)
+
+
+class CarbonRelay(object):
+    """Carbon plaintext and pickle listener forwarding to the real carbon
+
+    collectd is pointed at port and, or, pickle_port instead of carbon.
+    Every datapoint received is forwarded to upstream, the carbon
+    plaintext (host, port), and the latest value and timestamp of the
+    series matching patterns below prefix.<node> are kept in memory, so
+    the summarisers read them without render requests.
+
+    Datapoints are forwarded from a bounded queue: while carbon is
+    unreachable they are dropped, not buffered without limit, and
+    counted.
+    """
+
+    def __init__(self, upstream, addr='0.0.0.0', port=2013,
+                 pickle_port=2014, prefix='collectd',
+                 patterns=LATEST_PATTERNS, max_age=1200,
+                 queue_size=100000):
+        self.upstream = upstream
+        self.addr = addr
+        self.port = port
+        self.pickle_port = pickle_port
+        self.prefix = prefix + '.'
+        self.pattern = re.compile(
+            '|'.join(fnmatch.translate(pattern) for pattern in patterns)
+        )
+        # Seconds after which a latest value is no longer served
+        self.max_age = max_age
+        # node -> metric -> (value, timestamp)
+        self.latest_values = {}
+        self.queue = gevent.queue.Queue(queue_size)
+        self.servers = []
+        self.sender = None
+        self.sock = None
+
+    def start(self):
+        if self.port:
+            self.servers.append(
+                StreamServer((self.addr, self.port), self.handle_plaintext)
+            )
+        if self.pickle_port:
+            self.servers.append(
+                StreamServer((self.addr, self.pickle_port), self.handle_pickle)
+            )
+        for server in self.servers:
+            server.start()
+        self.sender = gevent.spawn(self.send)
+
+    def stop(self):
+        for server in self.servers:
+            server.stop()
+        self.servers = []
+        if self.sender is not None:
+            self.sender.kill()
+            self.sender = None
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def handle_plaintext(self, sock, address):
+        stream = sock.makefile()
+        try:
+            for line in stream:
+                parts = line.split()
+                if len(parts) != 3:
+                    RELAY_DROPPED.inc(reason='malformed')
+                    continue
+                self.receive('plaintext', *parts)
+        finally:
+            stream.close()
+
+    def handle_pickle(self, sock, address):
+        stream = sock.makefile()
+        try:
+            while True:
+                header = stream.read(PICKLE_HEADER.size)
+                if len(header) < PICKLE_HEADER.size:
+                    return
+                size = PICKLE_HEADER.unpack(header)[0]
+                if size > MAX_PICKLE_SIZE:
+                    RELAY_DROPPED.inc(reason='malformed')
+                    return
+                payload = stream.read(size)
+                if len(payload) < size:
+                    return
+                # Datapoints are plain lists and tuples: no class may be
+                # loaded from what a client sent
+                unpickler = cPickle.Unpickler(StringIO(payload))
+                unpickler.find_global = None
+                try:
+                    datapoints = unpickler.load()
+                    for path, (timestamp, value) in datapoints:
+                        self.receive('pickle', path, value, timestamp)
+                except (cPickle.UnpicklingError, TypeError, ValueError,
+                        EOFError):
+                    RELAY_DROPPED.inc(reason='malformed')
+        finally:
+            stream.close()
+
+    def receive(self, protocol, path, value, timestamp):
+        try:
+            value = float(value)
+            timestamp = float(timestamp)
+        except ValueError:
+            RELAY_DROPPED.inc(reason='malformed')
+            return
+        RELAY_DATAPOINTS.inc(protocol=protocol)
+        self.record(path, value, timestamp)
+        try:
+            self.queue.put_nowait(
+                '%s %r %d\n' % (path, value, timestamp)
+            )
+        except gevent.queue.Full:
+            RELAY_DROPPED.inc(reason='queue_full')
+
+    def record(self, path, value, timestamp):
+        if not path.startswith(self.prefix):
+            return
+        node, _, metric = path[len(self.prefix):].partition('.')
+        if not self.pattern.match(metric):
+            return
+        metrics = self.latest_values.setdefault(node, {})
+        latest = metrics.get(metric)
+        if latest is None:
+            RELAY_SERIES.inc()
+        elif latest[1] > timestamp:
+            # Late datapoint
+            return
+        metrics[metric] = (value, timestamp)
+
+    def latest(self, node_name, metric):
+        """Latest values of the node's series matching metric
+
+        Series with no value for max_age seconds are left out, and None
+        is returned when none is left, so that the caller falls back to
+        the time series db.
+        """
+        metrics = self.latest_values.get(node_name.replace('.', '_'), {})
+        oldest = time.time() - self.max_age
+        values = [
+            metrics[name][0]
+            for name in sorted(fnmatch.filter(metrics, metric))
+            if metrics[name][1] >= oldest
+        ]
+        return values or None
+
+    def send(self):
+        while True:
+            lines = [self.queue.get()]
+            while len(lines) < SEND_BATCH and not self.queue.empty():
+                lines.append(self.queue.get_nowait())
+            try:
+                if self.sock is None:
+                    self.sock = socket.create_connection(
+                        self.upstream,
+                        timeout=5
+                    )
+                self.sock.sendall(''.join(lines))
+            except (socket.error, socket.timeout) as ex:
+                RELAY_DROPPED.inc(len(lines), reason='upstream')
+                if self.sock is not None:
+                    self.sock.close()
+                    self.sock = None
+                Event(
+                    ExceptionMessage(
+                        priority="debug",
+                        publisher=NS.publisher_id,
+                        payload={"message": 'Failed to forward %s datapoints'
+                                            ' to carbon.' % len(lines),
+                                 "exception": ex
+                                 }
+                    )
+                )
+                gevent.sleep(1)
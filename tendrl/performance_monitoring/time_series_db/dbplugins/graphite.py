@@ -1,4 +1,5 @@
 import ast
+import fnmatch
 import gevent
 from gevent import socket
 import json
@@ -13,9 +14,40 @@ from tendrl.performance_monitoring import constants as \
     pm_consts
 from tendrl.performance_monitoring.exceptions \
     import TendrlPerformanceMonitoringException
+from tendrl.performance_monitoring import instrumentation
+from tendrl.performance_monitoring.time_series_db.json_stream \
+    import NullDatapointFilter
 from tendrl.performance_monitoring.time_series_db.manager \
     import TimeSeriesDBPlugin
 
+# Bytes of a render response read at once when streamed
+STREAM_CHUNK_SIZE = 65536
+# Entities in the braces of a bulk target, keeping the url short
+BULK_ENTITIES = 100
+# graphite functions of the aggregates of the entities' series
+AGGREGATE_FUNCTIONS = {
+    pm_consts.AGGREGATE_SUM: 'sumSeries',
+    pm_consts.AGGREGATE_AVERAGE: 'averageSeries',
+    pm_consts.AGGREGATE_MAX: 'maxSeries',
+    pm_consts.AGGREGATE_MIN: 'minSeries',
+}
+
+GRAPHITE_REQUESTS = instrumentation.counter(
+    'tendrl_pm_graphite_requests_total',
+    'Render requests made by GraphitePlugin.get_metric_stats',
+    ['status']
+)
+GRAPHITE_REQUEST_SECONDS = instrumentation.histogram(
+    'tendrl_pm_graphite_request_seconds',
+    'Latency of render requests made by GraphitePlugin.get_metric_stats'
+)
+
+
+def brace(names):
+    if len(names) == 1:
+        return names[0]
+    return '{%s}' % ','.join(names)
+
 
 class GraphitePlugin(TimeSeriesDBPlugin):
 
@@ -32,15 +64,35 @@ class GraphitePlugin(TimeSeriesDBPlugin):
         self.http = urllib3.PoolManager()
         self.prefix = 'collectd'
 
-    def get_metric_stats(self, entity_name, metric_name, time_interval=None):
+    def render_url(self, target, from_time=None, until_time=None):
+        # target is a target or a list of targets rendered at once
+        if isinstance(target, list):
+            target = '&target='.join(target)
+        url = 'http://%s:%s/render?target=%s&format=json' % (
+            self.host, str(self.port), target)
+        if from_time is not None:
+            url += '&from=%d' % from_time
+        if until_time is not None:
+            url += '&until=%d' % until_time
+        return url
+
+    def get_metric_stats(self, entity_name, metric_name, time_interval=None,
+                         from_time=None, until_time=None):
         metric_name = '%s.%s' % (entity_name.replace('.', '_'), metric_name)
         target = '%s.%s' % (self.prefix, metric_name)
         if time_interval == 'latest':
             target = "cactiStyle(%s)" % target
-        url = 'http://%s:%s/render?target=%s&format=json' % (
-            self.host, str(self.port), target)
+        url = self.render_url(target, from_time, until_time)
         try:
-            stats = self.http.request('GET', url, timeout=5)
+            try:
+                with GRAPHITE_REQUEST_SECONDS.time():
+                    stats = self.http.request('GET', url, timeout=5)
+            except Exception:
+                # Only failed requests count as errors, not failures in
+                # processing a response already counted below.
+                GRAPHITE_REQUESTS.inc(status='error')
+                raise
+            GRAPHITE_REQUESTS.inc(status=stats.status)
             if stats.status == 200:
                 # TODO(Anmol): remove nulls from graphite data before returning
                 # data. Explore the possibility of achieving this using some
@@ -68,6 +120,204 @@ class GraphitePlugin(TimeSeriesDBPlugin):
             )
             raise TendrlPerformanceMonitoringException(str(ex))
 
+    def bulk_targets(self, entity_names, metric_names):
+        # The fewest targets matching the metrics of all the entities:
+        # one per metric path but its last node, the entities and last
+        # nodes in braces, as graphite expands braces in a path node only
+        groups = {}
+        for metric_name in metric_names:
+            path, _, leaf = metric_name.rpartition('.')
+            groups.setdefault(path, []).append(leaf)
+        names = sorted(set(
+            entity_name.replace('.', '_') for entity_name in entity_names
+        ))
+        targets = []
+        for start in range(0, len(names), BULK_ENTITIES):
+            entities = names[start:start + BULK_ENTITIES]
+            for path, leaves in sorted(groups.items()):
+                nodes = [self.prefix, brace(entities)]
+                if path:
+                    nodes.append(path)
+                nodes.append(brace(sorted(set(leaves))))
+                targets.append('.'.join(nodes))
+        return targets
+
+    def fetch_series(self, url, description):
+        # The series of a render request, description naming the stats
+        # requested in the error reported
+        try:
+            try:
+                with GRAPHITE_REQUEST_SECONDS.time():
+                    stats = self.http.request('GET', url, timeout=5)
+            except Exception:
+                GRAPHITE_REQUESTS.inc(status='error')
+                raise
+            GRAPHITE_REQUESTS.inc(status=stats.status)
+            if stats.status != 200:
+                raise TendrlPerformanceMonitoringException(
+                    'Request status code: %s' % str(stats.status)
+                )
+            return json.loads(stats.data)
+        except (ValueError, Exception) as ex:
+            Event(
+                ExceptionMessage(
+                    priority="error",
+                    publisher=NS.publisher_id,
+                    payload={"message": 'Failed to fetch stats for %s '
+                                        'using url. %s' % (description, url),
+                             "exception": ex
+                             }
+                )
+            )
+            raise TendrlPerformanceMonitoringException(str(ex))
+
+    def get_bulk_metric_stats(self, entity_names, metric_names,
+                              from_time=None, until_time=None):
+        series = self.fetch_series(
+            self.render_url(
+                self.bulk_targets(entity_names, metric_names),
+                from_time,
+                until_time
+            ),
+            'metrics %s of %s' % (metric_names, entity_names)
+        )
+        # Series named prefix.<entity>.<metric>, back to the requested
+        # entity and metric, wildcards included
+        entities = dict(
+            (entity_name.replace('.', '_'), entity_name)
+            for entity_name in entity_names
+        )
+        result = dict(
+            ((entity_name, metric_name), [])
+            for entity_name in entity_names
+            for metric_name in metric_names
+        )
+        for item in series:
+            entity, _, metric = item['target'][
+                len(self.prefix) + 1:
+            ].partition('.')
+            if entity not in entities:
+                continue
+            item['datapoints'] = [
+                point for point in item['datapoints'] if point[0] is not None
+            ]
+            for metric_name in metric_names:
+                if fnmatch.fnmatchcase(metric, metric_name):
+                    result[(entities[entity], metric_name)].append(item)
+        return result
+
+    def aggregate_target(self, entity_names, metric_name, aggregate=None,
+                         top=None, fill=False):
+        # One series per entity, the sum of the entity's series matching
+        # metric_name, reduced to the aggregate of all the entities or to
+        # the top entities with the highest current values
+        targets = self.bulk_targets(entity_names, [metric_name])
+        if len(targets) == 1:
+            series = targets[0]
+        else:
+            series = 'group(%s)' % ','.join(targets)
+        if fill:
+            # Series whose last datapoint is not written yet keep their
+            # previous value rather than dropping out of the sums
+            series = 'keepLastValue(%s)' % series
+        series = "groupByNode(%s,%d,'sumSeries')" % (
+            series,
+            len(self.prefix.split('.'))
+        )
+        if aggregate is not None:
+            return "alias(%s(%s),'%s')" % (
+                AGGREGATE_FUNCTIONS[aggregate],
+                series,
+                aggregate
+            )
+        if top is not None:
+            return 'highestCurrent(%s,%d)' % (series, top)
+        return series
+
+    def get_aggregated_metric_stats(self, entity_names, metric_name,
+                                    aggregate=None, top=None, fill=False,
+                                    from_time=None, until_time=None):
+        if aggregate is not None and aggregate not in AGGREGATE_FUNCTIONS:
+            raise TendrlPerformanceMonitoringException(
+                'Unsupported aggregate %s' % aggregate
+            )
+        series = self.fetch_series(
+            self.render_url(
+                self.aggregate_target(
+                    entity_names,
+                    metric_name,
+                    aggregate,
+                    top,
+                    fill
+                ),
+                from_time,
+                until_time
+            ),
+            'metric %s of %s' % (metric_name, entity_names)
+        )
+        # groupByNode names the series by entity, back to the entity
+        # names requested
+        entities = dict(
+            (entity_name.replace('.', '_'), entity_name)
+            for entity_name in entity_names
+        )
+        for item in series:
+            item['target'] = entities.get(item['target'], item['target'])
+            item['datapoints'] = [
+                point for point in item['datapoints'] if point[0] is not None
+            ]
+        return series
+
+    def stream_metric_stats(self, entity_name, metric_name, from_time=None,
+                            until_time=None):
+        # The request is made, and fails, before the body is streamed
+        target = '%s.%s.%s' % (
+            self.prefix,
+            entity_name.replace('.', '_'),
+            metric_name
+        )
+        url = self.render_url(target, from_time, until_time)
+        try:
+            with GRAPHITE_REQUEST_SECONDS.time():
+                response = self.http.request(
+                    'GET',
+                    url,
+                    timeout=5,
+                    preload_content=False
+                )
+        except Exception as ex:
+            GRAPHITE_REQUESTS.inc(status='error')
+            Event(
+                ExceptionMessage(
+                    priority="error",
+                    publisher=NS.publisher_id,
+                    payload={"message": 'Failed to fetch stats for metric %s'
+                                        ' of %s using url. %s' %
+                                        (metric_name, entity_name, url),
+                             "exception": ex
+                             }
+                )
+            )
+            raise TendrlPerformanceMonitoringException(str(ex))
+        GRAPHITE_REQUESTS.inc(status=response.status)
+        if response.status != 200:
+            response.release_conn()
+            raise TendrlPerformanceMonitoringException(
+                'Request status code: %s' % str(response.status)
+            )
+        return self.stream_body(response)
+
+    def stream_body(self, response):
+        null_filter = NullDatapointFilter()
+        try:
+            for chunk in response.stream(STREAM_CHUNK_SIZE):
+                data = null_filter.feed(chunk)
+                if data:
+                    yield data
+            yield null_filter.close()
+        finally:
+            response.release_conn()
+
     def get_metrics(self, entity_name):
         url = 'http://%s:%s/metrics/index.json' % (self.host, str(self.port))
         try:
@@ -120,6 +370,12 @@ class GraphitePlugin(TimeSeriesDBPlugin):
                 pm_consts.USED: 'gauge-used',
                 pm_consts.TOTAL: 'gauge-total',
                 pm_consts.PERCENT_USED: 'percent-percent_bytes',
+            },
+            pm_consts.CLUSTER_NODE_UTILIZATION: {
+                pm_consts.PERCENTILE_50: 'percent-p50',
+                pm_consts.PERCENTILE_90: 'percent-p90',
+                pm_consts.PERCENTILE_99: 'percent-p99',
+                pm_consts.MAX: 'percent-max',
             }
         }.get(resource_name, {}).get(utilization_type)
 
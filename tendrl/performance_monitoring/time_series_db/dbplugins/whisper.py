@@ -0,0 +1,268 @@
+from collections import OrderedDict
+import glob
+import json
+import mmap
+import os
+import struct
+import time
+
+from tendrl.performance_monitoring import instrumentation
+from tendrl.performance_monitoring.time_series_db.dbplugins.graphite \
+    import GraphitePlugin
+
+# Whisper's header: aggregation type, max retention, x files factor and
+# archive count, then offset, seconds per point and points of each archive
+METADATA = struct.Struct('!2LfL')
+ARCHIVE_INFO = struct.Struct('!3L')
+POINT = struct.Struct('!Ld')
+# graphite-web's default render range
+DEFAULT_RANGE = 24 * 60 * 60
+# Whisper files kept mapped, least recently read are unmapped first
+MAX_OPEN_FILES = 1024
+
+WHISPER_READS = instrumentation.counter(
+    'tendrl_pm_whisper_reads_total',
+    'Stats read by WhisperPlugin from the local whisper files, or from '
+    'graphite-web when none matched',
+    ['source']
+)
+
+
+class WhisperFile(object):
+    """A whisper file mapped read only"""
+
+    def __init__(self, path):
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            stat = os.fstat(fd)
+            self.mmap = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+        finally:
+            os.close(fd)
+        # whisper-resize replaces the file
+        self.identity = (stat.st_ino, stat.st_size)
+        count = METADATA.unpack_from(self.mmap, 0)[3]
+        self.archives = [
+            ARCHIVE_INFO.unpack_from(
+                self.mmap,
+                METADATA.size + index * ARCHIVE_INFO.size
+            )
+            for index in range(count)
+        ]
+        self.max_retention = max(
+            step * points for _, step, points in self.archives
+        )
+
+    def fetch(self, from_time, until_time, now):
+        """[[value, timestamp], ...] from the archive covering from_time
+
+        Slots carbon has not written in the archive's current cycle are
+        None, as in whisper.fetch.
+        """
+        from_time = max(from_time, now - self.max_retention)
+        until_time = min(until_time, now)
+        for offset, step, points in self.archives:
+            if step * points >= now - from_time:
+                break
+        from_interval = int(from_time - from_time % step) + step
+        until_interval = int(until_time - until_time % step) + step
+        if from_interval == until_interval:
+            until_interval += step
+        count = (until_interval - from_interval) // step
+        base_interval = POINT.unpack_from(self.mmap, offset)[0]
+        if base_interval == 0:
+            # Nothing written yet
+            return [
+                [None, from_interval + index * step]
+                for index in range(count)
+            ]
+        archive_size = points * POINT.size
+        start = offset + (
+            (from_interval - base_interval) // step * POINT.size
+        ) % archive_size
+        end = offset + (
+            (until_interval - base_interval) // step * POINT.size
+        ) % archive_size
+        if start < end:
+            data = self.mmap[start:end]
+        else:
+            data = self.mmap[start:offset + archive_size] + \
+                self.mmap[offset:end]
+        unpacked = struct.unpack('!' + 'Ld' * (len(data) // POINT.size), data)
+        return [
+            [
+                unpacked[index * 2 + 1]
+                if unpacked[index * 2] == from_interval + index * step
+                else None,
+                from_interval + index * step
+            ]
+            for index in range(len(data) // POINT.size)
+        ]
+
+    def close(self):
+        self.mmap.close()
+
+
+class WhisperPlugin(GraphitePlugin):
+    """Reads the stats from carbon's whisper files when local
+
+    Used when this service runs on the carbon host. Targets are mapped to
+    the files below whisper_storage_dir, one mmap per file, and rendered
+    as graphite-web's render api would. Targets without a local file, and
+    brace expressions, are requested from graphite-web. Metrics are still
+    pushed to carbon.
+
+    The files lack the datapoints still in carbon's cache, which
+    graphite-web merges in from carbonlink. So 'latest' and the ranges
+    ending within the last live_window seconds, one collectd interval,
+    are requested from graphite-web too, and only older ranges are read
+    locally.
+    """
+
+    def intialize(self):
+        # Called while the class is defined, before WhisperPlugin is bound
+        GraphitePlugin.intialize(self)
+        self.storage_dir = NS.performance_monitoring.config.data.get(
+            'whisper_storage_dir',
+            '/var/lib/carbon/whisper'
+        )
+        self.live_window = int(
+            NS.performance_monitoring.config.data.get('interval', 600)
+        )
+        self.files = OrderedDict()
+
+    def open(self, path):
+        stat = os.stat(path)
+        whisper_file = self.files.pop(path, None)
+        if whisper_file is not None and \
+                whisper_file.identity != (stat.st_ino, stat.st_size):
+            whisper_file.close()
+            whisper_file = None
+        if whisper_file is None:
+            whisper_file = WhisperFile(path)
+            if len(self.files) >= MAX_OPEN_FILES:
+                self.files.popitem(last=False)[1].close()
+        self.files[path] = whisper_file
+        return whisper_file
+
+    def read_local(self, target, time_interval=None, from_time=None,
+                   until_time=None):
+        # None when no local file matches the target, or the range may
+        # have datapoints carbon has not flushed to the files yet
+        now = int(time.time())
+        if time_interval == 'latest' or until_time is None or \
+                until_time > now - self.live_window:
+            return None
+        if '{' in target:
+            return None
+        paths = sorted(glob.glob(os.path.join(
+            self.storage_dir,
+            target.replace('.', os.sep) + '.wsp'
+        )))
+        if not paths:
+            return None
+        result = []
+        for path in paths:
+            name = os.path.relpath(path, self.storage_dir)[:-4].replace(
+                os.sep,
+                '.'
+            )
+            try:
+                datapoints = self.open(path).fetch(
+                    now - DEFAULT_RANGE if from_time is None else from_time,
+                    until_time,
+                    now
+                )
+            except (EnvironmentError, struct.error, ValueError):
+                # Removed or truncated since it was listed
+                return None
+            result.append({
+                'target': name,
+                'datapoints': [
+                    point for point in datapoints if point[0] is not None
+                ],
+            })
+        return json.dumps(result)
+
+    def read_series(self, entity_name, metric_name, time_interval=None,
+                    from_time=None, until_time=None):
+        stats = self.read_local(
+            '%s.%s.%s' % (
+                self.prefix,
+                entity_name.replace('.', '_'),
+                metric_name
+            ),
+            time_interval,
+            from_time,
+            until_time
+        )
+        WHISPER_READS.inc(source='http' if stats is None else 'local')
+        return stats
+
+    def get_metric_stats(self, entity_name, metric_name, time_interval=None,
+                         from_time=None, until_time=None):
+        stats = self.read_series(
+            entity_name,
+            metric_name,
+            time_interval,
+            from_time,
+            until_time
+        )
+        if stats is None:
+            return super(WhisperPlugin, self).get_metric_stats(
+                entity_name,
+                metric_name,
+                time_interval,
+                from_time,
+                until_time
+            )
+        return stats
+
+    def get_bulk_metric_stats(self, entity_names, metric_names,
+                              from_time=None, until_time=None):
+        result = {}
+        remote = set()
+        for entity_name in entity_names:
+            for metric_name in metric_names:
+                stats = self.read_series(
+                    entity_name,
+                    metric_name,
+                    from_time=from_time,
+                    until_time=until_time
+                )
+                if stats is None:
+                    remote.add((entity_name, metric_name))
+                else:
+                    result[(entity_name, metric_name)] = json.loads(stats)
+        if remote:
+            fetched = super(WhisperPlugin, self).get_bulk_metric_stats(
+                set(entity_name for entity_name, _ in remote),
+                set(metric_name for _, metric_name in remote),
+                from_time,
+                until_time
+            )
+            for key in remote:
+                result[key] = fetched[key]
+        return result
+
+    def stream_metric_stats(self, entity_name, metric_name, from_time=None,
+                            until_time=None):
+        stats = self.read_series(
+            entity_name,
+            metric_name,
+            from_time=from_time,
+            until_time=until_time
+        )
+        if stats is None:
+            return super(WhisperPlugin, self).stream_metric_stats(
+                entity_name,
+                metric_name,
+                from_time,
+                until_time
+            )
+        return iter([stats])
+
+    def destroy(self):
+        super(WhisperPlugin, self).destroy()
+        for whisper_file in self.files.values():
+            whisper_file.close()
+        self.files.clear()
@@ -0,0 +1,89 @@
+import re
+
+# A datapoint, or any array of numbers, or a json token. Separators take
+# the white space around them.
+TOKEN = re.compile(
+    r'\[[^\[\]{}"]*\]'
+    r'|"(?:[^"\\]|\\.)*"'
+    r'|\s*,\s*'
+    r'|[\[\]{}:]'
+    r'|[^\[\]{},:"\s]+'
+    r'|\s+'
+)
+NULL_DATAPOINT = re.compile(r'\[\s*null\s*,')
+
+
+class NullDatapointFilter(object):
+    """Drops the [null, timestamp] datapoints from a render json stream
+
+    feed() takes the response in chunks of any size and returns what can
+    be sent on, the datapoints without a value removed, and close()
+    returns the rest. Array separators are written again as ', ' around
+    the dropped datapoints. Only a token cut by the end of a chunk, at
+    most one datapoint or string, is held between calls.
+    """
+
+    def __init__(self):
+        self.buffer = ''
+        # One flag per open array or object: whether an element of the
+        # array was written, always True for objects
+        self.stack = []
+
+    def feed(self, data):
+        self.buffer += data
+        return self.process(final=False)
+
+    def close(self):
+        return self.process(final=True)
+
+    def process(self, final):
+        output = []
+        buffer = self.buffer
+        position = 0
+        while position < len(buffer):
+            match = TOKEN.match(buffer, position)
+            if match is None:
+                if not final:
+                    break
+                # Not json; sent on as received
+                output.append(buffer[position:])
+                position = len(buffer)
+                break
+            token = match.group()
+            # A token the next chunk may go on with, or a datapoint
+            # without its closing bracket yet
+            cut = any((
+                match.end() == len(buffer),
+                token == '[' and buffer.find(']', position) == -1,
+            ))
+            if cut and not final:
+                break
+            position = match.end()
+            if len(token) > 1 and token[0] == '[' and \
+                    NULL_DATAPOINT.match(token):
+                continue
+            in_array = self.stack and self.stack[-1] is not None
+            if token.strip() == ',':
+                if not in_array:
+                    output.append(token)
+                continue
+            if token in ']}':
+                self.stack.pop()
+                output.append(token)
+                continue
+            if token.isspace() or token == ':':
+                if not in_array:
+                    output.append(token)
+                continue
+            if in_array:
+                if self.stack[-1]:
+                    output.append(', ')
+                self.stack[-1] = True
+            output.append(token)
+            if token == '[':
+                self.stack.append(False)
+            elif token == '{':
+                # Objects keep their separators
+                self.stack.append(None)
+        self.buffer = buffer[position:]
+        return ''.join(output)
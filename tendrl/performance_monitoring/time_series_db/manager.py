@@ -1,6 +1,7 @@
 from abc import abstractmethod
 import importlib
 import inspect
+import json
 import os
 import re
 import six
@@ -42,9 +43,51 @@ class TimeSeriesDBPlugin(object):
         raise NotImplementedError()
 
     @abstractmethod
-    def get_metric_stats(self, entity_name, metric_name):
+    def get_metric_stats(self, entity_name, metric_name, time_interval=None,
+                         from_time=None, until_time=None):
         raise NotImplementedError()
 
+    def stream_metric_stats(self, entity_name, metric_name, from_time=None,
+                            until_time=None):
+        # The whole stats as a single chunk, for the plugins not streaming
+        return iter([
+            self.get_metric_stats(
+                entity_name,
+                metric_name,
+                from_time=from_time,
+                until_time=until_time
+            )
+        ])
+
+    def get_bulk_metric_stats(self, entity_names, metric_names,
+                              from_time=None, until_time=None):
+        # {(entity_name, metric_name): [series, ...]}, one query per pair
+        # for the plugins not fetching them at once
+        return dict(
+            (
+                (entity_name, metric_name),
+                json.loads(self.get_metric_stats(
+                    entity_name,
+                    metric_name,
+                    from_time=from_time,
+                    until_time=until_time
+                ))
+            )
+            for entity_name in entity_names
+            for metric_name in metric_names
+        )
+
+    def get_aggregated_metric_stats(self, entity_names, metric_name,
+                                    aggregate=None, top=None, fill=False,
+                                    from_time=None, until_time=None):
+        # [series, ...], the sum of each entity's series matching
+        # metric_name as a series targeted at the entity name, or reduced
+        # to a series targeted at the aggregate or to the top entities.
+        # Computed by the time series db, for the plugins able to.
+        raise TendrlPerformanceMonitoringException(
+            '%s does not aggregate stats' % type(self).__name__
+        )
+
     @abstractmethod
     def get_metrics(self, entity_name):
         raise NotImplementedError()
@@ -83,6 +126,12 @@ class TimeSeriesDBManager(object):
             raise ex
         self.plugin = None
         self.set_plugin()
+        # RangeQueryCache the stats queries are served from, if enabled
+        self.cache = None
+        # Whether the stats are streamed to the client as the time series
+        # db returns them, when not served by the cache, which needs the
+        # whole response to merge it with its chunks
+        self.stream = False
 
     def load_plugins(self):
         try:
@@ -117,6 +166,36 @@ class TimeSeriesDBManager(object):
                     plugin).__name__.lower(), re.IGNORECASE):
                 self.plugin = plugin
 
+    def get_metric_stats(self, entity_name, metric_name, from_time=None,
+                         until_time=None):
+        plugin = self.get_plugin()
+        if self.cache is None and self.stream:
+            return plugin.stream_metric_stats(
+                entity_name,
+                metric_name,
+                from_time=from_time,
+                until_time=until_time
+            )
+        if self.cache is None:
+            return plugin.get_metric_stats(
+                entity_name,
+                metric_name,
+                from_time=from_time,
+                until_time=until_time
+            )
+        return self.cache.query(
+            lambda start, end: plugin.get_metric_stats(
+                entity_name,
+                metric_name,
+                from_time=start,
+                until_time=end
+            ),
+            entity_name,
+            metric_name,
+            from_time,
+            until_time
+        )
+
     def stop(self):
         self.plugin.destroy()
 
@@ -133,7 +212,9 @@ class TimeSeriesDBManager(object):
             pm_consts.SYSTEM_UTILIZATION: '$sds_type{0}utilization{0}'
             '$utilization_type',
             pm_consts.CLUSTER_UTILIZATION: 'cluster_$cluster_id{0}'
-            'cluster_utilization{0}$utilization_type'
+            'cluster_utilization{0}$utilization_type',
+            pm_consts.CLUSTER_NODE_UTILIZATION: 'cluster_$cluster_id{0}'
+            'node_utilization{0}$node_resource{0}$utilization_type'
         }
         if not pattern.get(resource_name):
             raise TendrlPerformanceMonitoringException(
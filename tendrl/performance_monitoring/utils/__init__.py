@@ -5,8 +5,14 @@ import pkgutil
 from tendrl.commons.objects.job import Job
 from tendrl.performance_monitoring.exceptions \
     import TendrlPerformanceMonitoringException
+from tendrl.performance_monitoring import instrumentation
 import uuid
 
+ETCD_READS = instrumentation.counter(
+    'tendrl_pm_etcd_reads_total',
+    'etcd reads issued by utils.read'
+)
+
 
 def list_modules_in_package_path(package_path, prefix):
     modules = []
@@ -63,6 +69,7 @@ def initiate_config_generation(node_det):
 # this function can return json for any etcd key
 def read(key):
     result = {}
+    ETCD_READS.inc()
     job = NS.etcd_orm.client.read(key)
     if hasattr(job, 'leaves'):
         for item in job.leaves: